@@ -0,0 +1,345 @@
+"""
+Opt-in per-request profiling for the homelab FastAPI services.
+
+install_profiling(app, "recipes") adds an ASGI middleware that runs chosen
+requests under a sampling profiler: requests carrying the PROFILE_TOKEN
+(`X-Profile-Token` header or `?profile=<token>`), plus a random
+PROFILE_SAMPLE_RATE fraction of all requests. With neither set nothing is
+installed at all; otherwise a request that is not picked costs one header
+lookup and a random number.
+
+While at least one capture is running, a background thread reads the
+stacks of the threads that serve requests (the event loop's and the
+threadpool workers') each PROFILE_INTERVAL_MS via sys._current_frames and
+counts the folded stacks; workers parked waiting for work are skipped. A
+capture ends with the response (streams included), or after
+PROFILE_MAX_SECONDS, and is written to PROFILE_DIR as `<id>.folded`
+(flamegraph.pl / speedscope input) and `<id>.json` (request, timings and
+the top functions by self and total time). Only the newest PROFILE_KEEP
+captures are kept.
+
+Stacks are per process, not per request: requests handled concurrently by
+the same worker show up in each other's captures (under their own thread
+names for threadpool work). Work done in child processes is not seen.
+
+With a token set, the middleware also answers (token required):
+  GET /debug/profiles              captures, newest first
+  GET /debug/profiles/{id}         folded stacks (text)
+  GET /debug/profiles/{id}?format=json   the capture's summary
+"""
+
+import hmac
+import json
+import os
+import random
+import re
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "profiles"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+
+DEBUG_PREFIX = "/debug/profiles"
+MAX_DEPTH = 128
+TOP_FUNCTIONS = 25
+
+# Threads that run request code besides the event loop: Starlette's threadpool, asyncio.to_thread, executors
+WORKER_THREAD_PREFIXES = ("AnyIO worker thread", "asyncio_", "ThreadPoolExecutor-")
+# Leaf frames of workers (and an event loop) waiting for something to do
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),  # concurrent.futures, waiting for work
+}
+
+_ID = re.compile(r"[0-9T]+-[0-9a-f]+")
+
+
+def _short_path(filename: str) -> str:
+    # Relative to the longest sys.path entry, so site-packages paths stay readable
+    best = ""
+    for entry in sys.path:
+        if entry and filename.startswith(entry.rstrip(os.sep) + os.sep) and len(entry) > len(best):
+            best = entry.rstrip(os.sep) + os.sep
+    return filename[len(best):]
+
+
+class _Capture:
+    def __init__(self, capture_id: str):
+        self.id = capture_id
+        self.loop_thread = threading.get_ident()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started = time.perf_counter()
+        self.active = True
+
+
+class _Sampler:
+    """One per process; its thread only runs while captures are active."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._captures: List[_Capture] = []
+        self._thread: Optional[threading.Thread] = None
+        self._labels: Dict[object, str] = {}
+
+    def start(self, capture: _Capture) -> None:
+        with self._lock:
+            self._captures.append(capture)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+
+    def stop(self, capture: _Capture) -> None:
+        with self._lock:
+            capture.active = False
+            if capture in self._captures:
+                self._captures.remove(capture)
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            name = getattr(code, "co_qualname", code.co_name)
+            label = f"{name} ({_short_path(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+            self._labels[code] = label
+        return label
+
+    def _sample(self, loops: set) -> Counter:
+        names = {
+            t.ident: t.name
+            for t in threading.enumerate()
+            if t.ident in loops or t.name.startswith(WORKER_THREAD_PREFIXES)
+        }
+        stacks: Counter = Counter()
+        for ident, frame in sys._current_frames().items():
+            if ident not in names:
+                continue
+            code = frame.f_code
+            if (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+                continue
+            labels = []
+            while frame is not None and len(labels) < MAX_DEPTH:
+                labels.append(self._label(frame.f_code))
+                frame = frame.f_back
+            labels.append(names[ident])
+            stacks[";".join(reversed(labels))] += 1
+        return stacks
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                now = time.perf_counter()
+                for c in [c for c in self._captures if now - c.started > PROFILE_MAX_SECONDS]:
+                    c.active = False
+                    self._captures.remove(c)
+                if not self._captures:
+                    self._thread = None
+                    return
+                captures = list(self._captures)
+            stacks = self._sample({c.loop_thread for c in captures})
+            for c in captures:
+                c.stacks.update(stacks)
+                c.samples += 1
+            time.sleep(self.interval)
+
+
+_sampler = _Sampler(PROFILE_INTERVAL_MS / 1000)
+
+
+def _top(stacks: Counter, interval_ms: float) -> Dict[str, list]:
+    """Functions by self time (leaf) and total time (anywhere on the stack)."""
+    own: Counter = Counter()
+    total: Counter = Counter()
+    for stack, n in stacks.items():
+        frames = stack.split(";")[1:]  # drop the thread name
+        if not frames:
+            continue
+        own[frames[-1]] += n
+        for f in set(frames):
+            total[f] += n
+    busy = sum(stacks.values()) or 1
+
+    def rows(counter: Counter) -> list:
+        return [
+            {"function": f, "ms": round(n * interval_ms, 1), "percent": round(100 * n / busy, 1)}
+            for f, n in counter.most_common(TOP_FUNCTIONS)
+        ]
+
+    return {"self": rows(own), "total": rows(total)}
+
+
+def _prune(directory: str, keep: int) -> None:
+    metas = sorted(f for f in os.listdir(directory) if f.endswith(".json"))
+    for name in metas[: max(len(metas) - keep, 0)]:
+        for path in (name, name[:-5] + ".folded"):
+            try:
+                os.remove(os.path.join(directory, path))
+            except FileNotFoundError:  # another worker pruned it first
+                pass
+
+
+def _save(capture: _Capture, meta: dict) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, capture.id)
+    with open(base + ".folded", "w") as f:
+        for stack, n in sorted(capture.stacks.items()):
+            f.write(f"{stack} {n}\n")
+    meta["busy_samples"] = sum(capture.stacks.values())
+    meta["top"] = _top(capture.stacks, PROFILE_INTERVAL_MS)
+    # The .json goes last: the listing only shows complete captures
+    with open(base + ".json.tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(base + ".json.tmp", base + ".json")
+    _prune(PROFILE_DIR, PROFILE_KEEP)
+
+
+def _list() -> List[dict]:
+    try:
+        names = sorted((f for f in os.listdir(PROFILE_DIR) if f.endswith(".json")), reverse=True)
+    except FileNotFoundError:
+        return []
+    out = []
+    for name in names:
+        try:
+            with open(os.path.join(PROFILE_DIR, name)) as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            continue
+        meta.pop("top", None)
+        out.append(meta)
+    return out
+
+
+def _read(capture_id: str, suffix: str) -> Optional[str]:
+    try:
+        with open(os.path.join(PROFILE_DIR, capture_id + suffix)) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp, service: str, token: str = "", sample_rate: float = 0.0):
+        self.app = app
+        self.service = service
+        self.token = token.encode()
+        self.sample_rate = sample_rate
+
+    def _authorized(self, headers: Dict[bytes, bytes], query: Dict[str, str]) -> bool:
+        if not self.token:
+            return False
+        given = headers.get(b"x-profile-token") or query.get("profile", "").encode()
+        return bool(given) and hmac.compare_digest(given, self.token)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"]
+        if path == DEBUG_PREFIX or path.startswith(DEBUG_PREFIX + "/"):
+            if self.token:
+                await self._debug(scope, receive, send)
+            else:
+                await self.app(scope, receive, send)
+            return
+
+        trigger = None
+        raw_query = scope.get("query_string", b"")
+        headers = None
+        if self.token and (b"profile=" in raw_query or any(k == b"x-profile-token" for k, _ in scope["headers"])):
+            headers = dict(scope["headers"])
+            if self._authorized(headers, dict(parse_qsl(raw_query.decode("latin-1")))):
+                trigger = "token"
+        if trigger is None and self.sample_rate > 0 and random.random() < self.sample_rate:
+            headers = headers or dict(scope["headers"])
+            # Event streams never finish; only profile them on request
+            if b"text/event-stream" not in headers.get(b"accept", b""):
+                trigger = "sampled"
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+        await self._profile(scope, receive, send, trigger)
+
+    async def _profile(self, scope: Scope, receive: Receive, send: Send, trigger: str) -> None:
+        capture = _Capture(f"{time.strftime('%Y%m%dT%H%M%S')}-{secrets.token_hex(4)}")
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (b"x-profile-id", capture.id.encode())]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                _sampler.stop(capture)
+
+        query = [(k, v) for k, v in parse_qsl(scope.get("query_string", b"").decode("latin-1")) if k != "profile"]
+        started = time.time()
+        _sampler.start(capture)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _sampler.stop(capture)
+            meta = {
+                "id": capture.id,
+                "service": self.service,
+                "pid": os.getpid(),
+                "started": round(started, 3),
+                "seconds": round(time.perf_counter() - capture.started, 4),
+                "method": scope["method"],
+                "path": scope["path"] + ("?" + urlencode(query) if query else ""),
+                "status": status,
+                "trigger": trigger,
+                "samples": capture.samples,
+                "interval_ms": PROFILE_INTERVAL_MS,
+            }
+            await run_in_threadpool(_save, capture, meta)
+
+    async def _debug(self, scope: Scope, receive: Receive, send: Send) -> None:
+        query = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+        if not self._authorized(dict(scope["headers"]), query):
+            response = JSONResponse({"detail": "Profiling token required"}, status_code=401)
+        elif scope["method"] != "GET":
+            response = JSONResponse({"detail": "Method Not Allowed"}, status_code=405)
+        else:
+            capture_id = scope["path"][len(DEBUG_PREFIX):].strip("/")
+            if not capture_id:
+                response = JSONResponse({"service": self.service, "captures": await run_in_threadpool(_list)})
+            elif not _ID.fullmatch(capture_id):
+                response = JSONResponse({"detail": "Capture not found"}, status_code=404)
+            else:
+                as_json = query.get("format") == "json"
+                body = await run_in_threadpool(_read, capture_id, ".json" if as_json else ".folded")
+                if body is None:
+                    response = JSONResponse({"detail": "Capture not found"}, status_code=404)
+                elif as_json:
+                    response = PlainTextResponse(body, media_type="application/json")
+                else:
+                    response = PlainTextResponse(body)
+        await response(scope, receive, send)
+
+
+def install_profiling(app, service: str) -> bool:
+    """Add ProfilingMiddleware when PROFILE_TOKEN or PROFILE_SAMPLE_RATE is set; returns whether it did."""
+    if not PROFILE_TOKEN and PROFILE_SAMPLE_RATE <= 0:
+        return False
+    app.add_middleware(ProfilingMiddleware, service=service, token=PROFILE_TOKEN, sample_rate=PROFILE_SAMPLE_RATE)
+    return True
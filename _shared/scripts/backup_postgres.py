@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Postgres backups for the homelab: parallel dumps, zstd streaming, checksums,
+retention and restore-verification. Standard library only; needs `docker`
+and `zstd` on the host.
+
+    backup_postgres.py backup [--db recipes] [--jobs 4] [--verify]
+    backup_postgres.py verify [RUN]          # checksums + test restore into a scratch DB
+    backup_postgres.py restore RUN DB [--target NAME] [--clean]
+    backup_postgres.py prune [--dry-run]
+    backup_postgres.py list
+
+Each run is a directory under _shared/backups/<timestamp>/ with one
+<db>.tar.zst per database (a pg_dump directory-format dump, tarred and
+compressed with zstd -T0 as it streams out of the container), globals.sql.zst
+(roles), SHA256SUMS and manifest.json.
+
+Settings come from _shared/.env (POSTGRES_USER) plus optional
+BACKUP_DIR, BACKUP_JOBS, BACKUP_ZSTD_LEVEL, BACKUP_KEEP_LAST,
+BACKUP_KEEP_DAILY, BACKUP_KEEP_WEEKLY, BACKUP_KEEP_MONTHLY, PG_CONTAINER.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+HERE = Path(__file__).resolve().parent
+SHARED = HERE.parent
+RUN_FORMAT = "%Y-%m-%d_%H-%M-%S"
+RUN_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}$")
+# Names restore may put into SQL
+DB_NAME = re.compile(r"^[A-Za-z0-9_]+$")
+CHUNK = 1 << 20
+
+
+class BackupError(RuntimeError):
+    pass
+
+
+def check_db_name(name: str) -> str:
+    if not DB_NAME.match(name or ""):
+        raise BackupError(f"Unsupported database name {name!r} (letters, digits and _ only)")
+    return name
+
+
+def load_env(path: Path) -> Dict[str, str]:
+    """KEY=VALUE lines from .env; real environment variables win."""
+    env: Dict[str, str] = {}
+    if path.exists():
+        for line in path.read_text(encoding="utf-8").splitlines():
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, _, value = line.partition("=")
+            env[key.strip()] = value.strip().strip("'\"")
+    env.update({k: v for k, v in os.environ.items() if k in env or k.startswith(("BACKUP_", "PG_", "POSTGRES_"))})
+    return env
+
+
+class Postgres:
+    """Runs the Postgres client tools inside the postgres container."""
+
+    def __init__(self, container: str, user: str):
+        self.container = container
+        self.user = user
+
+    def cmd(self, *args: str, stdin: bool = False) -> List[str]:
+        # No -t: a TTY would mangle binary streams
+        return ["docker", "exec", *(["-i"] if stdin else []), self.container, *args]
+
+    def run(self, *args: str) -> str:
+        proc = subprocess.run(self.cmd(*args), capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise BackupError(f"{' '.join(args[:2])} failed: {proc.stderr.strip()}")
+        return proc.stdout
+
+    def sql(self, db: str, query: str) -> str:
+        return self.run("psql", "-U", self.user, "-d", db, "-v", "ON_ERROR_STOP=1", "-Atc", query).strip()
+
+    def databases(self) -> List[str]:
+        out = self.sql("postgres", "SELECT datname FROM pg_database WHERE NOT datistemplate ORDER BY 1")
+        return [d for d in out.splitlines() if d and d != "postgres"]
+
+    def table_count(self, db: str) -> int:
+        return int(
+            self.sql(db, "SELECT count(*) FROM pg_tables WHERE schemaname NOT IN ('pg_catalog', 'information_schema')")
+        )
+
+
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def stream_compressed(src_cmd: List[str], dest: Path, level: int) -> Dict[str, object]:
+    """Pipe src_cmd's stdout through zstd -T0 into dest, hashing on the way."""
+    tmp = dest.with_name(dest.name + ".part")
+    src = subprocess.Popen(src_cmd, stdout=subprocess.PIPE)
+    z = subprocess.Popen(["zstd", "-T0", f"-{level}", "-q", "-c"], stdin=src.stdout, stdout=subprocess.PIPE)
+    src.stdout.close()  # zstd owns the pipe now; src gets SIGPIPE if zstd dies
+    h = hashlib.sha256()
+    size = 0
+    with open(tmp, "wb") as f:
+        for chunk in iter(lambda: z.stdout.read(CHUNK), b""):
+            f.write(chunk)
+            h.update(chunk)
+            size += len(chunk)
+    z_rc, src_rc = z.wait(), src.wait()
+    if src_rc != 0 or z_rc != 0:
+        tmp.unlink(missing_ok=True)
+        raise BackupError(f"{' '.join(src_cmd[-3:])} exited {src_rc}, zstd exited {z_rc}")
+    os.replace(tmp, dest)
+    return {"file": dest.name, "bytes": size, "sha256": h.hexdigest()}
+
+
+def runs(backup_dir: Path) -> List[Path]:
+    if not backup_dir.is_dir():
+        return []
+    return sorted(p for p in backup_dir.iterdir() if p.is_dir() and RUN_PATTERN.match(p.name))
+
+
+def read_manifest(run: Path) -> dict:
+    path = run / "manifest.json"
+    if not path.exists():
+        raise BackupError(f"{run.name}: no manifest.json (incomplete backup?)")
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def write_manifest(run: Path, manifest: dict) -> None:
+    tmp = run / "manifest.json.tmp"
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    os.replace(tmp, run / "manifest.json")
+
+
+def resolve_run(backup_dir: Path, name: Optional[str]) -> Path:
+    all_runs = [r for r in runs(backup_dir) if (r / "manifest.json").exists()]
+    if not all_runs:
+        raise BackupError(f"No backups in {backup_dir}")
+    if name in (None, "latest"):
+        return all_runs[-1]
+    run = backup_dir / name
+    if run not in all_runs:
+        raise BackupError(f"No backup named {name}")
+    return run
+
+
+# ---------------- backup ----------------
+def backup(pg: Postgres, backup_dir: Path, dbs: List[str], jobs: int, level: int) -> Path:
+    run = backup_dir / datetime.now().strftime(RUN_FORMAT)
+    run.mkdir(parents=True)
+    scratch = f"/tmp/pgbackup-{run.name}"
+    manifest = {"created": run.name, "jobs": jobs, "zstd_level": level, "databases": {}}
+
+    # Anything that fails from here on removes the run, so no run is left without a manifest
+    try:
+        manifest["server_version"] = pg.sql("postgres", "SHOW server_version")
+        t0 = time.perf_counter()
+        manifest["globals"] = stream_compressed(
+            pg.cmd("pg_dumpall", "-U", pg.user, "--globals-only"), run / "globals.sql.zst", level
+        )
+        manifest["globals"]["seconds"] = round(time.perf_counter() - t0, 3)
+
+        for db in dbs:
+            print(f"Dumping {db} ({jobs} jobs)...", flush=True)
+            t0 = time.perf_counter()
+            # Directory format is the only one pg_dump can write in parallel; it is left
+            # uncompressed (-Z 0) so zstd does the compressing, multi-threaded, as it streams out
+            pg.run("rm", "-rf", f"{scratch}/{db}")
+            pg.run("mkdir", "-p", scratch)
+            pg.run("pg_dump", "-U", pg.user, "-Fd", "-j", str(jobs), "-Z", "0", "-f", f"{scratch}/{db}", db)
+            dumped = time.perf_counter()
+            entry = stream_compressed(pg.cmd("tar", "-C", scratch, "-cf", "-", db), run / f"{db}.tar.zst", level)
+            pg.run("rm", "-rf", f"{scratch}/{db}")
+            entry.update(
+                {
+                    "tables": pg.table_count(db),
+                    "dump_seconds": round(dumped - t0, 3),
+                    "compress_seconds": round(time.perf_counter() - dumped, 3),
+                }
+            )
+            manifest["databases"][db] = entry
+            print(f"  {entry['file']}: {entry['bytes'] / 1e6:.1f} MB in {time.perf_counter() - t0:.1f}s", flush=True)
+    except BaseException:
+        pg.run("rm", "-rf", scratch)
+        shutil.rmtree(run, ignore_errors=True)
+        raise
+    pg.run("rm", "-rf", scratch)
+
+    artifacts = [manifest["globals"], *manifest["databases"].values()]
+    (run / "SHA256SUMS").write_text("".join(f"{a['sha256']}  {a['file']}\n" for a in artifacts), encoding="utf-8")
+    write_manifest(run, manifest)  # written last: a run without it is incomplete
+    return run
+
+
+# ---------------- verify / restore ----------------
+def check_checksums(run: Path) -> List[str]:
+    problems = []
+    sums = run / "SHA256SUMS"
+    if not sums.exists():
+        return [f"{run.name}: SHA256SUMS missing"]
+    for line in sums.read_text(encoding="utf-8").splitlines():
+        digest, _, name = line.partition("  ")
+        path = run / name
+        if not path.exists():
+            problems.append(f"{name}: missing")
+        elif sha256_file(path) != digest:
+            problems.append(f"{name}: checksum mismatch")
+    return problems
+
+
+def load_into(pg: Postgres, archive: Path, db: str, target: str, jobs: int, clean: bool = False) -> None:
+    """Stream <db>.tar.zst into the container and pg_restore it into target."""
+    scratch = f"/tmp/pgrestore-{target}-{os.getpid()}"
+    pg.run("mkdir", "-p", scratch)
+    try:
+        z = subprocess.Popen(["zstd", "-dcq", str(archive)], stdout=subprocess.PIPE)
+        untar = subprocess.run(pg.cmd("tar", "-C", scratch, "-xf", "-", stdin=True), stdin=z.stdout)
+        z.stdout.close()
+        if z.wait() != 0 or untar.returncode != 0:
+            raise BackupError(f"Could not unpack {archive.name}")
+        args = ["pg_restore", "-U", pg.user, "-d", target, "-j", str(jobs), "--no-owner", "--exit-on-error"]
+        if clean:
+            args += ["--clean", "--if-exists"]
+        pg.run(*args, f"{scratch}/{db}")
+    finally:
+        pg.run("rm", "-rf", scratch)
+
+
+def verify(pg: Postgres, run: Path, jobs: int) -> List[str]:
+    manifest = read_manifest(run)
+    problems = check_checksums(run)
+    if problems:
+        return problems
+    for db, entry in manifest["databases"].items():
+        scratch_db = f"verify_{db}_{os.getpid()}"[:63]
+        print(f"Test-restoring {db} into {scratch_db}...", flush=True)
+        pg.run("createdb", "-U", pg.user, scratch_db)
+        try:
+            load_into(pg, run / entry["file"], db, scratch_db, jobs)
+            tables = pg.table_count(scratch_db)
+            if tables != entry.get("tables", tables):
+                problems.append(f"{db}: restored {tables} tables, backup had {entry['tables']}")
+        except BackupError as e:
+            problems.append(f"{db}: {e}")
+        finally:
+            pg.run("dropdb", "-U", pg.user, "--if-exists", scratch_db)
+    manifest["verified"] = {"at": datetime.now().strftime(RUN_FORMAT), "ok": not problems, "problems": problems}
+    write_manifest(run, manifest)
+    return problems
+
+
+def restore(pg: Postgres, run: Path, db: str, target: Optional[str], jobs: int, clean: bool) -> None:
+    manifest = read_manifest(run)
+    entry = manifest["databases"].get(db)
+    if entry is None:
+        raise BackupError(f"{run.name} has no dump of {db} (has: {', '.join(manifest['databases'])})")
+    problems = [p for p in check_checksums(run) if p.startswith(entry["file"])]
+    if problems:
+        raise BackupError("; ".join(problems))
+    target = check_db_name(target or db)
+    exists = pg.sql("postgres", f"SELECT 1 FROM pg_database WHERE datname = '{target}'") == "1"
+    if exists and not clean:
+        raise BackupError(f"Database {target} exists; pass --clean to overwrite its objects or --target NAME")
+    if not exists:
+        pg.run("createdb", "-U", pg.user, target)
+    load_into(pg, run / entry["file"], db, target, jobs, clean=exists)
+
+
+# ---------------- retention ----------------
+def select_keep(names: List[str], last: int, daily: int, weekly: int, monthly: int) -> set:
+    """Grandfather-father-son: newest `last` runs plus the newest run of each recent day/week/month."""
+    stamps = sorted(((datetime.strptime(n, RUN_FORMAT), n) for n in names), reverse=True)
+    keep = {n for _, n in stamps[:last]}
+    for count, key in ((daily, "%Y-%m-%d"), (weekly, "%G-%V"), (monthly, "%Y-%m")):
+        seen: List[str] = []
+        for ts, n in stamps:
+            period = ts.strftime(key)
+            if period in seen:
+                continue
+            if len(seen) >= count:
+                break
+            seen.append(period)
+            keep.add(n)
+    return keep
+
+
+def prune(backup_dir: Path, env: Dict[str, str], dry_run: bool) -> List[Path]:
+    all_runs = runs(backup_dir)
+    complete = [r for r in all_runs if (r / "manifest.json").exists()]
+    keep = select_keep(
+        [r.name for r in complete],
+        last=int(env.get("BACKUP_KEEP_LAST", "3")),
+        daily=int(env.get("BACKUP_KEEP_DAILY", "7")),
+        weekly=int(env.get("BACKUP_KEEP_WEEKLY", "4")),
+        monthly=int(env.get("BACKUP_KEEP_MONTHLY", "6")),
+    )
+    removed = [r for r in complete if r.name not in keep]
+    # Leftovers of a backup that was killed; newer ones may still be being written
+    if complete:
+        removed += [r for r in all_runs if r not in complete and r.name < complete[-1].name]
+    for r in sorted(removed):
+        print(f"{'Would remove' if dry_run else 'Removing'} {r.name}{'' if r in complete else ' (incomplete)'}")
+        if not dry_run:
+            shutil.rmtree(r)
+    return removed
+
+
+def list_runs(backup_dir: Path) -> None:
+    for run in runs(backup_dir):
+        try:
+            m = read_manifest(run)
+        except BackupError:
+            print(f"{run.name}  (incomplete)")
+            continue
+        size = sum(e["bytes"] for e in m["databases"].values()) + m["globals"]["bytes"]
+        v = m.get("verified")
+        status = "unverified" if not v else ("verified" if v["ok"] else "VERIFY FAILED")
+        print(f"{run.name}  {size / 1e6:8.1f} MB  {status:<13}  {', '.join(m['databases'])}")
+
+
+def main(argv=None) -> int:
+    env = load_env(SHARED / ".env")
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--dir", default=env.get("BACKUP_DIR", str(SHARED / "backups")), help="backup directory")
+    ap.add_argument("--jobs", type=int, default=int(env.get("BACKUP_JOBS", "4")), help="pg_dump/pg_restore jobs")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    b = sub.add_parser("backup", help="dump databases (default: all)")
+    b.add_argument("--db", action="append", help="database to dump (repeatable)")
+    b.add_argument("--level", type=int, default=int(env.get("BACKUP_ZSTD_LEVEL", "6")), help="zstd level")
+    b.add_argument("--verify", action="store_true", help="test-restore the new backup")
+    b.add_argument("--no-prune", action="store_true", help="skip the retention policy")
+
+    v = sub.add_parser("verify", help="check checksums and test-restore into scratch databases")
+    v.add_argument("run", nargs="?", default="latest")
+
+    r = sub.add_parser("restore", help="restore one database from a backup")
+    r.add_argument("run")
+    r.add_argument("db")
+    r.add_argument("--target", help="restore into this database instead")
+    r.add_argument("--clean", action="store_true", help="drop existing objects in the target first")
+
+    p = sub.add_parser("prune", help="apply the retention policy")
+    p.add_argument("--dry-run", action="store_true")
+
+    sub.add_parser("list", help="list backups")
+    args = ap.parse_args(argv)
+
+    backup_dir = Path(args.dir)
+    if args.command == "list":
+        list_runs(backup_dir)
+        return 0
+    if args.command == "prune":
+        prune(backup_dir, env, args.dry_run)
+        return 0
+
+    for tool in ("docker", "zstd"):
+        if shutil.which(tool) is None:
+            print(f"{tool} not found on PATH", file=sys.stderr)
+            return 2
+    pg = Postgres(env.get("PG_CONTAINER", "postgres"), env.get("POSTGRES_USER", "postgres"))
+    jobs = max(1, args.jobs)
+
+    try:
+        if args.command == "backup":
+            run = backup(pg, backup_dir, args.db or pg.databases(), jobs, args.level)
+            print(f"Backup written to {run}")
+            if args.verify:
+                problems = verify(pg, run, jobs)
+                for problem in problems:
+                    print(f"FAIL {problem}", file=sys.stderr)
+                if problems:
+                    return 1
+                print("Verified.")
+            if not args.no_prune:
+                prune(backup_dir, env, dry_run=False)
+        elif args.command == "verify":
+            run = resolve_run(backup_dir, args.run)
+            problems = verify(pg, run, jobs)
+            for problem in problems:
+                print(f"FAIL {problem}", file=sys.stderr)
+            print(f"{run.name}: {'OK' if not problems else 'FAILED'}")
+            return 1 if problems else 0
+        elif args.command == "restore":
+            run = resolve_run(backup_dir, args.run)
+            restore(pg, run, args.db, args.target, jobs, args.clean)
+            print(f"Restored {args.db} from {run.name} into {args.target or args.db}")
+    except BackupError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,5 @@
 #!/usr/bin/env bash
+# Kept for existing cron entries; the work is done by backup_postgres.py.
 set -euo pipefail
 
-cd "$(dirname "$0")/.."
-
-# Load env vars from .env
-set -a
-source ./.env
-set +a
-
-TS="$(date +%Y-%m-%d_%H-%M-%S)"
-OUT="./backups/postgres_${POSTGRES_DB}_${TS}.sql.gz"
-
-echo "Backing up ${POSTGRES_DB} -> ${OUT}"
-
-docker exec -t postgres pg_dump -U "${POSTGRES_USER}" "${POSTGRES_DB}" | gzip > "${OUT}"
-
-echo "Done."
-ls -lh "${OUT}"
+exec python3 "$(dirname "$0")/backup_postgres.py" backup "$@"
@@ -1,23 +1,103 @@
+import asyncio
 import os
+import time
+from contextlib import asynccontextmanager
 from typing import Optional, Dict, Any, List
 
-import httpx
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Imported after load_dotenv: these modules read their HUE_* tuning at import time
+from bridge import Bridge
+from metrics import Registry
+from profiling import install_profiling
+from coalesce import Coalescer
+from dispatch import Dispatcher
+from scenes import SceneStore
+from state import StateCache, sse
+
 HUE_BRIDGE_IP = os.getenv("HUE_BRIDGE_IP")
 HUE_USERNAME = os.getenv("HUE_USERNAME")
+# Run against the bundled bridge simulator, in process (no hardware needed)
+HUE_SIMULATE = os.getenv("HUE_SIMULATE", "").lower() in ("1", "true", "yes")
+
+if HUE_SIMULATE:
+    import httpx
+    from simulator import create_simulator
+
+    HUE_USERNAME = HUE_USERNAME or "simulator"
+    HUE_BASE = f"http://hue-simulator/api/{HUE_USERNAME}"
+    simulator = create_simulator()
+    bridge = Bridge(HUE_BASE, transport=httpx.ASGITransport(app=simulator))
+else:
+    simulator = None
+    if not HUE_BRIDGE_IP or not HUE_USERNAME:
+        raise RuntimeError("Missing HUE_BRIDGE_IP or HUE_USERNAME in .env (or set HUE_SIMULATE=1)")
+    HUE_BASE = f"http://{HUE_BRIDGE_IP}/api/{HUE_USERNAME}"
+    bridge = Bridge(HUE_BASE)
+
+dispatcher = Dispatcher(bridge)
+coalescer = Coalescer(dispatcher)
+cache = StateCache(bridge)
+dispatcher.on_applied = cache.apply
+scenes = SceneStore()
+
+# ----------------------------
+# Metrics
+# ----------------------------
+registry = Registry()
+BRIDGE_SECONDS = registry.histogram(
+    "hue_bridge_request_seconds",
+    "Bridge call latency",
+    ("endpoint",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0),
+)
+BRIDGE_ERRORS = registry.counter(
+    "hue_bridge_errors_total",
+    "Failed bridge calls (status, busy, timeout, unreachable, fast_fail)",
+    ("endpoint", "reason"),
+)
+BRIDGE_TIMEOUT = registry.gauge("hue_bridge_timeout_seconds", "Current adaptive timeout", ("endpoint",))
+BRIDGE_P99 = registry.gauge("hue_bridge_latency_p99_seconds", "Recent p99 bridge latency", ("endpoint",))
+BRIDGE_DEGRADED = registry.gauge("hue_bridge_degraded", "1 while calls fail fast")
+LIGHTS_UNREACHABLE = registry.gauge("hue_lights_unreachable", "Lights the bridge reports as unreachable")
+CACHE_AGE = registry.gauge("hue_state_age_seconds", "Seconds since the last successful state poll")
+DISPATCH = registry.gauge("hue_commands", "Commands sent/failed by kind", ("kind", "stat"))
 
-if not HUE_BRIDGE_IP or not HUE_USERNAME:
-    raise RuntimeError("Missing HUE_BRIDGE_IP or HUE_USERNAME in .env")
 
-HUE_BASE = f"http://{HUE_BRIDGE_IP}/api/{HUE_USERNAME}"
+def _record_bridge_call(endpoint: str, seconds: float, outcome: str) -> None:
+    if outcome != "fast_fail":
+        BRIDGE_SECONDS.observe(seconds, endpoint)
+    if outcome != "ok":
+        BRIDGE_ERRORS.inc(endpoint, outcome)
 
-app = FastAPI(title="Hue Dashboard API")
+
+bridge.on_request = _record_bridge_call
+
+SSE_HEARTBEAT_SECONDS = 15
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One keep-alive client for the whole process instead of one per call
+    scenes.load()
+    await bridge.start()
+    cache.start()
+    try:
+        yield
+    finally:
+        await cache.close()
+        await coalescer.close()
+        await bridge.close()
+
+
+app = FastAPI(title="Hue Dashboard API", lifespan=lifespan)
+install_profiling(app, "hue")
 
 # ----------------------------
 # Models (MUST be before routes)
@@ -33,49 +113,100 @@ class AllState(BaseModel):
     on: bool
 
 
+class MultiLightState(BaseModel):
+    ids: List[str]
+    state: LightState
+
+
+class BatchTarget(BaseModel):
+    light_id: str
+    state: LightState
+
+
+class BatchRequest(BaseModel):
+    targets: List[BatchTarget]
+    transition_ms: Optional[int] = Field(default=None, ge=0, le=6_553_500)
+
+
+class SceneCapture(BaseModel):
+    ids: Optional[List[str]] = None  # default: every light
+    transition_ms: Optional[int] = Field(default=None, ge=0, le=6_553_500)
+
+
 # ----------------------------
 # Hue helpers
 # ----------------------------
-async def hue_get(path: str) -> Any:
-    async with httpx.AsyncClient(timeout=6.0) as client:
-        r = await client.get(f"{HUE_BASE}{path}")
-        if r.status_code != 200:
-            raise HTTPException(status_code=500, detail=r.text)
-        return r.json()
+def check_bridge() -> None:
+    # Fail fast while the bridge is degraded instead of queueing commands that will time out
+    if bridge.degraded:
+        retry = max(1, round(bridge.degraded_until - time.monotonic()))
+        raise HTTPException(
+            status_code=503, detail="Bridge is not responding", headers={"Retry-After": str(retry)}
+        )
+
+
+async def loaded_cache() -> StateCache:
+    # Only requests right after startup wait, for the poller's first pass
+    if not cache.loaded:
+        check_bridge()
+        if not await cache.wait_loaded(bridge.timeout):
+            raise HTTPException(
+                status_code=502, detail=f"Bridge state unavailable: {cache.last_error or 'not loaded yet'}"
+            )
+    return cache
 
 
-async def hue_put(path: str, payload: Dict[str, Any]) -> Any:
-    async with httpx.AsyncClient(timeout=6.0) as client:
-        r = await client.put(f"{HUE_BASE}{path}", json=payload)
-        if r.status_code != 200:
-            raise HTTPException(status_code=500, detail=r.text)
-        return r.json()
+def mark_freshness(response: Response) -> None:
+    # Cached reads keep working during bridge hiccups; tell the client how old they are
+    age = cache.age()
+    if age is not None:
+        response.headers["Age"] = str(int(age))
+    if bridge.degraded or cache.last_error:
+        response.headers["X-Hue-Stale"] = "1"
 
 
 # ----------------------------
 # API routes
 # ----------------------------
 @app.get("/api/lights")
-async def list_lights() -> List[Dict[str, Any]]:
-    lights = await hue_get("/lights")
-    out = []
-    for lid, l in lights.items():
-        st = l.get("state", {})
-        out.append(
-            {
-                "id": lid,
-                "name": l.get("name"),
-                "on": st.get("on"),
-                "bri": st.get("bri"),
-                "reachable": st.get("reachable"),
-            }
-        )
-    out.sort(key=lambda x: (x["name"] or "").lower())
-    return out
+async def list_lights(response: Response) -> List[Dict[str, Any]]:
+    lights = (await loaded_cache()).light_list()
+    mark_freshness(response)
+    return lights
+
+
+@app.get("/api/groups")
+async def list_groups(response: Response) -> List[Dict[str, Any]]:
+    groups = (await loaded_cache()).group_list()
+    mark_freshness(response)
+    return groups
 
 
-@app.put("/api/lights/{light_id}/state")
-async def set_light_state(light_id: str, state: LightState):
+@app.get("/api/events")
+async def events():
+    """Server-sent events: a snapshot on connect, then deltas as lights change."""
+    q = cache.subscribe()
+
+    async def stream():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(q.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield sse(event)
+        finally:
+            cache.unsubscribe(q)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def clean_state(state: LightState) -> Dict[str, Any]:
     payload: Dict[str, Any] = {}
 
     # allow-list + clamp ranges
@@ -90,20 +221,158 @@ async def set_light_state(light_id: str, state: LightState):
 
     if not payload:
         raise HTTPException(status_code=400, detail="No valid fields provided")
+    return payload
+
+
+async def run_batch(targets: Dict[str, Dict[str, Any]], transition_ms: Optional[int] = None) -> Dict[str, Any]:
+    """Plan {light_id: payload} into group actions + light commands and run them."""
+    check_bridge()
+    state = await loaded_cache()
+    unknown = [lid for lid in targets if lid not in state.lights]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Unknown lights: {', '.join(unknown)}")
+    if transition_ms is not None:
+        # The bridge counts transitions in 100 ms steps
+        targets = {lid: {**payload, "transitiontime": round(transition_ms / 100)} for lid, payload in targets.items()}
+
+    t0 = time.perf_counter()
+    groups = {gid: g.get("lights", []) for gid, g in state.groups.items()}
+    plan = dispatcher.plan(targets, list(state.lights.keys()), groups)
+    results = await dispatcher.execute(plan)
+    failed = [r for r in results if not r["ok"]]
+    return {
+        "ok": not failed,
+        "count": len(results),
+        "failed": len(failed),
+        "plan": plan.describe(),
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1),
+        "results": results,
+    }
 
-    return await hue_put(f"/lights/{light_id}/state", payload)
+
+@app.put("/api/lights/{light_id}/state", status_code=202)
+async def set_light_state(light_id: str, state: LightState, response: Response, wait: bool = False):
+    """
+    Queue a state update; updates for the same light merge and only the
+    newest state is sent. Answers 202 at once unless ?wait=true.
+    """
+    payload = clean_state(state)
+    check_bridge()
+    done = coalescer.submit(light_id, payload)
+    if not wait:
+        return {"queued": True, "id": light_id, "state": coalescer.pending(light_id) or payload}
+
+    result = await done
+    if not result["ok"]:
+        check_bridge()
+        raise HTTPException(status_code=502, detail=result["error"])
+    response.status_code = 200
+    return result
+
+
+@app.put("/api/lights")
+async def set_lights_state(req: MultiLightState):
+    payload = clean_state(req.state)
+    return await run_batch({lid: payload for lid in req.ids})
 
 
 @app.put("/api/all")
 async def set_all(state: AllState):
-    lights = await hue_get("/lights")
-    ids = list(lights.keys())
+    ids = list((await loaded_cache()).lights.keys())
+    # Plans to a single group 0 action
+    return await run_batch({lid: {"on": state.on} for lid in ids})
+
+
+@app.post("/api/batch")
+async def batch(req: BatchRequest):
+    targets: Dict[str, Dict[str, Any]] = {}
+    for t in req.targets:
+        # Repeated lights merge, later fields win
+        targets.setdefault(t.light_id, {}).update(clean_state(t.state))
+    if not targets:
+        raise HTTPException(status_code=400, detail="No targets")
+    return await run_batch(targets, req.transition_ms)
+
 
-    # Sequential avoids spamming the bridge
+@app.get("/api/scenes")
+async def list_scenes():
+    return scenes.list()
+
+
+@app.get("/api/scenes/{name}")
+async def get_scene(name: str):
+    scene = scenes.get(name)
+    if scene is None:
+        raise HTTPException(status_code=404, detail="Scene not found")
+    return scene
+
+
+@app.put("/api/scenes/{name}")
+async def put_scene(name: str, req: BatchRequest):
+    targets = [{"light_id": t.light_id, "state": clean_state(t.state)} for t in req.targets]
+    if not targets:
+        raise HTTPException(status_code=400, detail="No targets")
+    return scenes.put(name, targets, req.transition_ms)
+
+
+@app.post("/api/scenes/{name}/capture")
+async def capture_scene(name: str, req: SceneCapture):
+    """Save the lights' current state (from the cache) as a scene."""
+    state = await loaded_cache()
+    ids = req.ids if req.ids is not None else list(state.lights.keys())
+    targets = []
     for lid in ids:
-        await hue_put(f"/lights/{lid}/state", {"on": state.on})
+        st = state.lights.get(lid, {}).get("state")
+        if st is None:
+            raise HTTPException(status_code=404, detail=f"Unknown light: {lid}")
+        if st.get("on"):
+            picked = {k: st[k] for k in ("on", "bri", "hue", "sat") if st.get(k) is not None}
+        else:
+            picked = {"on": False}
+        targets.append({"light_id": lid, "state": picked})
+    return scenes.put(name, targets, req.transition_ms)
+
+
+@app.post("/api/scenes/{name}/apply")
+async def apply_scene(name: str):
+    scene = scenes.get(name)
+    if scene is None:
+        raise HTTPException(status_code=404, detail="Scene not found")
+    targets: Dict[str, Dict[str, Any]] = {}
+    for t in scene.get("targets", []):
+        targets.setdefault(str(t["light_id"]), {}).update(clean_state(LightState(**t["state"])))
+    return await run_batch(targets, scene.get("transition_ms"))
+
+
+@app.delete("/api/scenes/{name}")
+async def delete_scene(name: str):
+    if not scenes.delete(name):
+        raise HTTPException(status_code=404, detail="Scene not found")
+    return {"ok": True}
+
+
+@app.get("/api/bridge")
+async def bridge_stats():
+    return {
+        **bridge.stats(),
+        "dispatch": dispatcher.stats(),
+        "coalesce": coalescer.stats(),
+        "cache": cache.stats(),
+    }
+
 
-    return {"ok": True, "count": len(ids)}
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    for endpoint in bridge.stats()["endpoints"]:
+        BRIDGE_TIMEOUT.set(bridge.timeout_for(endpoint), endpoint)
+        BRIDGE_P99.set(bridge.p99(endpoint) or 0.0, endpoint)
+    BRIDGE_DEGRADED.set(1 if bridge.degraded else 0)
+    LIGHTS_UNREACHABLE.set(cache.unreachable())
+    CACHE_AGE.set(cache.age() or 0.0)
+    for stat in ("sent", "failed"):
+        for kind, value in dispatcher.stats()[stat].items():
+            DISPATCH.set(value, kind, stat)
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 
 # ----------------------------
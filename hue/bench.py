@@ -0,0 +1,191 @@
+"""
+Latency/throughput benchmark for the Hue service against the bridge simulator.
+
+Runs the whole service in process (HUE_SIMULATE=1, httpx ASGI transports, no
+network or hardware) and drives it with typical dashboard workloads:
+
+    single   sequential single-light updates, waiting for the bridge result
+    all      "all on" / "all off"
+    slider   a brightness drag on one light at ~60 updates/sec
+    scene    a batch setting every room to one of two states
+
+    python bench.py                   # report
+    python bench.py --json            # machine-readable, e.g. for CI
+    python bench.py --lights 30 --latency-ms 60
+
+Reports p50/p95/p99 request latency, requests/sec and how many commands the
+simulated bridge received. Exits non-zero if a request fails or the slider
+does not settle on its final value.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+# metrics.py lives in _shared/python (copied into the image at build time)
+SHARED_PYTHON = Path(__file__).resolve().parent.parent / "_shared" / "python"
+if SHARED_PYTHON.is_dir():
+    sys.path.append(str(SHARED_PYTHON))
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] * 1000
+
+    return {"p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "max_ms": ordered[-1] * 1000}
+
+
+class Run:
+    def __init__(self, client, simulator):
+        self.client = client
+        self.sim = simulator.state
+        self.failures: List[str] = []
+
+    def commands(self) -> int:
+        return self.sim.stats["light_commands"] + self.sim.stats["group_commands"]
+
+    async def timed(self, method: str, url: str, **kwargs):
+        t0 = time.perf_counter()
+        r = await self.client.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - t0
+        if r.status_code >= 400 or (r.headers.get("content-type", "").startswith("application/json") and r.json().get("ok") is False):
+            self.failures.append(f"{method} {url}: {r.status_code} {r.text[:200]}")
+        return elapsed
+
+    async def workload(self, fn) -> dict:
+        before = self.commands()
+        t0 = time.perf_counter()
+        samples, extra = await fn()
+        elapsed = time.perf_counter() - t0
+        return {
+            "requests": len(samples),
+            "seconds": elapsed,
+            "requests_per_second": len(samples) / elapsed if elapsed else 0.0,
+            "bridge_commands": self.commands() - before,
+            **percentiles(samples),
+            **extra,
+        }
+
+    async def single(self, n: int):
+        ids = list(self.sim.lights)
+        samples = []
+        for i in range(n):
+            lid = ids[i % len(ids)]
+            samples.append(
+                await self.timed("PUT", f"/api/lights/{lid}/state?wait=true", json={"on": True, "bri": 1 + i % 254})
+            )
+        return samples, {}
+
+    async def all_lights(self, n: int):
+        samples = []
+        for i in range(n):
+            samples.append(await self.timed("PUT", "/api/all", json={"on": i % 2 == 0}))
+        return samples, {}
+
+    async def slider(self, updates: int, hz: float = 60.0):
+        lid = next(iter(self.sim.lights))
+        samples = []
+        final = 0
+        for i in range(updates):
+            final = 1 + (i * 7) % 254
+            samples.append(await self.timed("PUT", f"/api/lights/{lid}/state", json={"on": True, "bri": final}))
+            await asyncio.sleep(1 / hz)
+        # How long after the user lets go until the bulb shows the last value
+        t0 = time.perf_counter()
+        while self.sim.lights[lid]["state"]["bri"] != final:
+            if time.perf_counter() - t0 > 10:
+                self.failures.append(f"slider: light {lid} never reached bri={final}")
+                break
+            await asyncio.sleep(0.005)
+        return samples, {"settle_ms": (time.perf_counter() - t0) * 1000}
+
+    async def scene(self, n: int, rooms: Dict[str, List[str]]):
+        samples = []
+        for i in range(n):
+            # Rooms alternate between a dim and a bright state, like a typical evening scene
+            targets = [
+                {"light_id": lid, "state": {"on": True, "bri": 80 + 100 * ((r + i) % 2), "hue": 8000}}
+                for r, members in enumerate(rooms.values())
+                for lid in members
+            ]
+            samples.append(await self.timed("POST", "/api/batch", json={"targets": targets, "transition_ms": 400}))
+        return samples, {}
+
+
+async def bench(args) -> dict:
+    import httpx
+
+    import app as hue
+
+    transport = httpx.ASGITransport(app=hue.app)
+    async with hue.app.router.lifespan_context(hue.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://hue", timeout=30) as client:
+            await hue.cache.wait_loaded(10)
+            run = Run(client, hue.simulator)
+            results = {}
+            results["single"] = await run.workload(lambda: run.single(args.single))
+            await asyncio.sleep(1)  # let the token buckets refill between workloads
+            results["all"] = await run.workload(lambda: run.all_lights(args.all))
+            await asyncio.sleep(1)
+            results["slider"] = await run.workload(lambda: run.slider(args.slider))
+            await asyncio.sleep(1)
+            rooms = {gid: g["lights"] for gid, g in hue.cache.groups.items()}
+            results["scene"] = await run.workload(lambda: run.scene(args.scene, rooms))
+            return {"workloads": results, "bridge": hue.bridge.stats(), "failures": run.failures}
+
+
+def print_report(result: dict) -> None:
+    for name, w in result["workloads"].items():
+        line = (
+            f"{name:<7} {w['requests']:4d} req  {w['requests_per_second']:7.1f} req/s  "
+            f"p50 {w.get('p50_ms', 0):7.1f}  p95 {w.get('p95_ms', 0):7.1f}  p99 {w.get('p99_ms', 0):7.1f} ms  "
+            f"bridge commands {w['bridge_commands']}"
+        )
+        if "settle_ms" in w:
+            line += f"  settle {w['settle_ms']:.0f} ms"
+        print(line)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--lights", type=int, default=20)
+    ap.add_argument("--latency-ms", type=float, default=30, help="simulated bridge latency per call")
+    ap.add_argument("--single", type=int, default=50, help="single-light updates")
+    ap.add_argument("--all", type=int, default=4, help="all on/off calls")
+    ap.add_argument("--slider", type=int, default=120, help="slider updates (sent at 60/sec)")
+    ap.add_argument("--scene", type=int, default=4, help="batch calls")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    # Configure the simulator and service before they are imported
+    os.environ.update(
+        {
+            "HUE_SIMULATE": "1",
+            "SIM_LIGHTS": str(args.lights),
+            "SIM_LATENCY_MS": str(args.latency_ms),
+            "SIM_JITTER_MS": str(args.latency_ms / 2),
+            "HUE_SCENES_PATH": os.path.join(tempfile.mkdtemp(prefix="hue-bench-"), "scenes.json"),
+        }
+    )
+    result = asyncio.run(bench(args))
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+        for f in result["failures"]:
+            print(f"FAIL {f}")
+    return 1 if result["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+import os
+import re
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+import httpx
+
+# The bridge is a small embedded box: a handful of sockets is all it serves well,
+# and it drops idle connections on its own after a while.
+HUE_MAX_CONNECTIONS = int(os.getenv("HUE_MAX_CONNECTIONS", "4"))
+HUE_KEEPALIVE_SECONDS = float(os.getenv("HUE_KEEPALIVE_SECONDS", "20"))
+HUE_TIMEOUT = float(os.getenv("HUE_TIMEOUT", "6"))
+HUE_CONNECT_TIMEOUT = float(os.getenv("HUE_CONNECT_TIMEOUT", "2"))
+
+# Adaptive timeouts: a multiple of the recent p99 per endpoint, between MIN and HUE_TIMEOUT
+HUE_MIN_TIMEOUT = float(os.getenv("HUE_MIN_TIMEOUT", "0.5"))
+HUE_TIMEOUT_P99_FACTOR = float(os.getenv("HUE_TIMEOUT_P99_FACTOR", "3"))
+HUE_LATENCY_WINDOW = int(os.getenv("HUE_LATENCY_WINDOW", "200"))
+MIN_SAMPLES = 20
+
+# After this many timeouts/connection failures in a row the bridge counts as degraded:
+# calls fail fast (reads are served from the cache) and only the poller probes it
+HUE_TRIP_AFTER = int(os.getenv("HUE_TRIP_AFTER", "3"))
+HUE_DEGRADED_SECONDS = float(os.getenv("HUE_DEGRADED_SECONDS", "10"))
+
+_ENDPOINTS = (
+    (re.compile(r"^/lights/[^/]+/state$"), "light_state"),
+    (re.compile(r"^/groups/[^/]+/action$"), "group_action"),
+    (re.compile(r"^/lights/?$"), "lights"),
+    (re.compile(r"^/groups/?$"), "groups"),
+    (re.compile(r"^/lights/[^/]+$"), "light"),
+    (re.compile(r"^/groups/[^/]+$"), "group"),
+)
+
+
+def endpoint_of(path: str) -> str:
+    """Low-cardinality label for a bridge path (/lights/7/state -> light_state)."""
+    for pattern, name in _ENDPOINTS:
+        if pattern.match(path):
+            return name
+    return "other"
+
+
+class BridgeError(RuntimeError):
+    def __init__(self, status: int, detail: Any):
+        super().__init__(f"Bridge returned {status}")
+        self.status = status
+        self.detail = detail
+
+
+class BridgeUnavailable(BridgeError):
+    """Raised without calling the bridge while it is marked degraded."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(503, f"Bridge degraded, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class Bridge:
+    """
+    One keep-alive HTTP client for all calls to the Hue bridge.
+
+    Created at startup and closed at shutdown, so slider updates reuse an
+    open socket instead of paying a TCP handshake per call. Counts new
+    connections vs requests to show how often a socket was reused.
+
+    Each endpoint gets a timeout derived from its recent p99 latency, and
+    repeated timeouts/connection failures mark the bridge degraded so
+    callers fail fast instead of each waiting out the full timeout.
+    """
+
+    def __init__(
+        self,
+        base: str,
+        max_connections: int = HUE_MAX_CONNECTIONS,
+        keepalive_seconds: float = HUE_KEEPALIVE_SECONDS,
+        timeout: float = HUE_TIMEOUT,
+        connect_timeout: float = HUE_CONNECT_TIMEOUT,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base = base.rstrip("/")
+        self.max_connections = max(1, max_connections)
+        self.keepalive_seconds = keepalive_seconds
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+        self.requests = 0
+        self.connections_opened = 0
+        self.errors = 0
+        self.fast_failed = 0
+
+        self._latency: Dict[str, Deque[float]] = {}
+        self._consecutive_failures = 0
+        self.degraded_until = 0.0
+        # Called as on_request(endpoint, seconds, outcome) after every bridge call;
+        # outcome is "ok", "status", "busy", "timeout" or "unreachable"
+        self.on_request: Optional[Callable[[str, float, str], None]] = None
+
+    async def start(self) -> None:
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+                keepalive_expiry=self.keepalive_seconds,
+            ),
+            transport=self._transport,
+        )
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _trace(self, event: str, info: dict) -> None:
+        if event == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    def p99(self, endpoint: str) -> Optional[float]:
+        window = self._latency.get(endpoint)
+        if not window or len(window) < MIN_SAMPLES:
+            return None
+        ordered = sorted(window)
+        return ordered[int(0.99 * (len(ordered) - 1))]
+
+    def timeout_for(self, endpoint: str) -> float:
+        p99 = self.p99(endpoint)
+        if p99 is None:
+            return self.timeout
+        return max(HUE_MIN_TIMEOUT, min(self.timeout, p99 * HUE_TIMEOUT_P99_FACTOR))
+
+    @property
+    def degraded(self) -> bool:
+        return time.monotonic() < self.degraded_until
+
+    def _record(self, endpoint: str, seconds: float, outcome: str) -> None:
+        # Timeouts go into the window at the timeout value, so a slower bridge widens its own timeout
+        if outcome in ("ok", "status", "busy", "timeout"):
+            self._latency.setdefault(endpoint, deque(maxlen=HUE_LATENCY_WINDOW)).append(seconds)
+        if outcome in ("timeout", "unreachable"):
+            self._consecutive_failures += 1
+            if self._consecutive_failures >= HUE_TRIP_AFTER:
+                self.degraded_until = time.monotonic() + HUE_DEGRADED_SECONDS
+        else:
+            self._consecutive_failures = 0
+            self.degraded_until = 0.0
+        if outcome != "ok":
+            self.errors += 1
+        if self.on_request is not None:
+            self.on_request(endpoint, seconds, outcome)
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        payload: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        probe: bool = False,
+    ) -> Any:
+        """
+        Call the bridge. While degraded this raises BridgeUnavailable at once,
+        unless probe=True (the state poller's calls, which detect recovery).
+        """
+        if self._client is None:
+            raise RuntimeError("Bridge client is not started")
+        endpoint = endpoint_of(path)
+        if not probe and self.degraded:
+            self.fast_failed += 1
+            if self.on_request is not None:
+                self.on_request(endpoint, 0.0, "fast_fail")
+            raise BridgeUnavailable(self.degraded_until - time.monotonic())
+
+        total = timeout or self.timeout_for(endpoint)
+        self.requests += 1
+        t0 = time.perf_counter()
+        try:
+            r = await self._client.request(
+                method,
+                f"{self.base}{path}",
+                json=payload,
+                timeout=httpx.Timeout(total, connect=min(self.connect_timeout, total)),
+                extensions={"trace": self._trace},
+            )
+        except httpx.TimeoutException:
+            self._record(endpoint, time.perf_counter() - t0, "timeout")
+            raise
+        except httpx.TransportError:
+            self._record(endpoint, time.perf_counter() - t0, "unreachable")
+            raise
+        elapsed = time.perf_counter() - t0
+        if r.status_code != 200:
+            self._record(endpoint, elapsed, "busy" if r.status_code == 503 else "status")
+            raise BridgeError(r.status_code, r.text)
+        self._record(endpoint, elapsed, "ok")
+        return r.json()
+
+    async def get(self, path: str, timeout: Optional[float] = None, probe: bool = False) -> Any:
+        return await self.request("GET", path, timeout=timeout, probe=probe)
+
+    async def put(self, path: str, payload: Dict[str, Any], timeout: Optional[float] = None) -> Any:
+        return await self.request("PUT", path, payload, timeout=timeout)
+
+    def stats(self) -> dict:
+        reused = max(0, self.requests - self.connections_opened)
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "reused": reused,
+            "reuse_ratio": round(reused / self.requests, 4) if self.requests else 0.0,
+            "errors": self.errors,
+            "fast_failed": self.fast_failed,
+            "degraded": self.degraded,
+            "max_connections": self.max_connections,
+            "keepalive_seconds": self.keepalive_seconds,
+            "timeout": self.timeout,
+            "endpoints": {
+                ep: {
+                    "samples": len(window),
+                    "p99_ms": round((self.p99(ep) or 0.0) * 1000, 1),
+                    "timeout": round(self.timeout_for(ep), 3),
+                }
+                for ep, window in sorted(self._latency.items())
+            },
+        }
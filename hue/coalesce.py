@@ -0,0 +1,79 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from dispatch import Dispatcher
+
+
+class Coalescer:
+    """
+    Latest-wins queue of state updates, one slot per light.
+
+    submit() merges the update into the light's pending state (later fields
+    override earlier ones) and returns at once. A per-light sender waits for
+    a token from the dispatcher, then sends whatever is pending at that
+    moment, so a slider drag turns into a few commands carrying the newest
+    value instead of a backlog the bridge replays for seconds.
+    """
+
+    def __init__(self, dispatcher: Dispatcher):
+        self.dispatcher = dispatcher
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._senders: Dict[str, asyncio.Task] = {}
+        self.last_results: Dict[str, Dict[str, Any]] = {}
+
+        self.submitted = 0
+        self.merged = 0
+        self.sent = 0
+
+    def submit(self, light_id: str, payload: Dict[str, Any]) -> asyncio.Future:
+        """Queue payload for light_id; the future resolves with the command result."""
+        self.submitted += 1
+        if light_id in self._pending:
+            self.merged += 1
+            self._pending[light_id].update(payload)
+        else:
+            self._pending[light_id] = dict(payload)
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(light_id, []).append(fut)
+        if light_id not in self._senders:
+            self._senders[light_id] = asyncio.create_task(self._send(light_id))
+        return fut
+
+    def pending(self, light_id: str) -> Optional[Dict[str, Any]]:
+        return self._pending.get(light_id)
+
+    async def _send(self, light_id: str) -> None:
+        try:
+            while light_id in self._pending:
+                await self.dispatcher.light_bucket.acquire()
+                # Take the newest state only once the bridge has capacity for it
+                payload = self._pending.pop(light_id)
+                waiters = self._waiters.pop(light_id, [])
+                self.sent += 1
+                result = await self.dispatcher.light_now(light_id, payload)
+                self.last_results[light_id] = {**result, "state": payload}
+                for fut in waiters:
+                    if not fut.done():
+                        fut.set_result(result)
+        finally:
+            self._senders.pop(light_id, None)
+
+    async def close(self) -> None:
+        for task in list(self._senders.values()):
+            task.cancel()
+        await asyncio.gather(*self._senders.values(), return_exceptions=True)
+        for waiters in self._waiters.values():
+            for fut in waiters:
+                fut.cancel()
+        self._pending.clear()
+        self._waiters.clear()
+
+    def stats(self) -> dict:
+        return {
+            "submitted": self.submitted,
+            "merged": self.merged,
+            "sent": self.sent,
+            "pending": len(self._pending),
+            "failing": sorted(lid for lid, r in self.last_results.items() if not r["ok"]),
+        }
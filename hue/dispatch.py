@@ -0,0 +1,149 @@
+import asyncio
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from bridge import Bridge, BridgeError
+from plan import Plan, plan_batch
+
+# Philips' guidance: roughly 10 light commands/sec and 1 group command/sec per bridge
+HUE_LIGHT_RATE = float(os.getenv("HUE_LIGHT_RATE", "10"))
+HUE_GROUP_RATE = float(os.getenv("HUE_GROUP_RATE", "1"))
+
+
+class TokenBucket:
+    """Async token bucket; acquire() waits (FIFO) until a command may be sent."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = max(0.01, rate)
+        self.capacity = burst if burst is not None else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.waited_seconds = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def level(self) -> float:
+        """Tokens available right now (what a burst could use without waiting)."""
+        self._refill()
+        return self.tokens
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+                self.waited_seconds += wait
+                await asyncio.sleep(wait)
+
+
+def command_result(target: str, response: Any) -> Dict[str, Any]:
+    # The bridge answers 200 with a list of {"success": ...} / {"error": ...} items
+    errors = []
+    if isinstance(response, list):
+        for item in response:
+            if isinstance(item, dict) and "error" in item:
+                errors.append(str((item["error"] or {}).get("description") or item["error"]))
+    return {"id": target, "ok": not errors, "error": "; ".join(errors) or None}
+
+
+def _error_result(target: str, e: Exception) -> Dict[str, Any]:
+    if isinstance(e, BridgeError):
+        return {"id": target, "ok": False, "error": f"bridge {e.status}: {e.detail}"}
+    return {"id": target, "ok": False, "error": repr(e)}
+
+
+class Dispatcher:
+    """
+    Sends light and group commands at the bridge's sustainable rate.
+
+    Per-light commands run concurrently but each waits for a token from the
+    light bucket; group actions use the (much slower) group bucket. Every
+    command yields a result dict, so one unreachable bulb never aborts the rest.
+    """
+
+    def __init__(self, bridge: Bridge, light_rate: float = HUE_LIGHT_RATE, group_rate: float = HUE_GROUP_RATE):
+        self.bridge = bridge
+        self.light_bucket = TokenBucket(light_rate)
+        self.group_bucket = TokenBucket(group_rate)
+        self.sent = {"light": 0, "group": 0}
+        self.failed = {"light": 0, "group": 0}
+        # Called as on_applied(kind, target, payload) for every accepted command
+        self.on_applied: Optional[Callable[[str, str, Dict[str, Any]], None]] = None
+
+    async def _send(self, kind: str, bucket: TokenBucket, target: str, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        await bucket.acquire()
+        return await self._put(kind, target, path, payload)
+
+    async def _put(self, kind: str, target: str, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        self.sent[kind] += 1
+        try:
+            result = command_result(target, await self.bridge.put(path, payload))
+        except (BridgeError, httpx.HTTPError) as e:
+            result = _error_result(target, e)
+        if not result["ok"]:
+            self.failed[kind] += 1
+        elif self.on_applied is not None:
+            self.on_applied(kind, target, payload)
+        return result
+
+    async def light(self, light_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._send("light", self.light_bucket, light_id, f"/lights/{light_id}/state", payload)
+
+    async def light_now(self, light_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Send without waiting for a token; for callers that already acquired one."""
+        return await self._put("light", light_id, f"/lights/{light_id}/state", payload)
+
+    async def group(self, group_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._send("group", self.group_bucket, group_id, f"/groups/{group_id}/action", payload)
+
+    async def lights(self, commands: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Send {light_id: payload} concurrently; results in the order given."""
+        return list(await asyncio.gather(*(self.light(lid, payload) for lid, payload in commands.items())))
+
+    def plan(self, targets: Dict[str, Dict[str, Any]], all_ids: List[str], groups: Dict[str, List[str]]) -> Plan:
+        return plan_batch(
+            targets,
+            all_ids,
+            groups,
+            light_rate=self.light_bucket.rate,
+            group_rate=self.group_bucket.rate,
+            light_burst=self.light_bucket.level(),
+            group_burst=self.group_bucket.level(),
+        )
+
+    async def _group_or_lights(self, gid: str, payload: Dict[str, Any], ids: List[str]) -> List[Dict[str, Any]]:
+        result = await self.group(gid, payload)
+        if result["ok"]:
+            return [{"id": lid, "ok": True, "error": None} for lid in ids]
+        # A failed group action is retried light by light, so each light gets its own result
+        return await self.lights({lid: payload for lid in ids})
+
+    async def execute(self, plan: Plan) -> List[Dict[str, Any]]:
+        """Run group actions and per-light commands concurrently; one result per light."""
+        parts = await asyncio.gather(
+            *(self._group_or_lights(gid, payload, ids) for gid, payload, ids in plan.groups),
+            self.lights(plan.lights),
+        )
+        return sorted((r for part in parts for r in part), key=lambda r: r["id"])
+
+    def stats(self) -> dict:
+        return {
+            "light_rate": self.light_bucket.rate,
+            "group_rate": self.group_bucket.rate,
+            "sent": dict(self.sent),
+            "failed": dict(self.failed),
+            "throttled_seconds": {
+                "light": round(self.light_bucket.waited_seconds, 3),
+                "group": round(self.group_bucket.waited_seconds, 3),
+            },
+        }
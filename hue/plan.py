@@ -0,0 +1,90 @@
+import json
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+
+class Plan:
+    """Bridge calls for a batch: group actions plus leftover per-light commands."""
+
+    def __init__(self):
+        self.groups: List[Tuple[str, Dict[str, Any], List[str]]] = []  # (group id, payload, light ids)
+        self.lights: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def calls(self) -> int:
+        return len(self.groups) + len(self.lights)
+
+    def describe(self) -> dict:
+        return {
+            "calls": self.calls,
+            "group_calls": [{"group": gid, "lights": ids} for gid, _, ids in self.groups],
+            "light_calls": sorted(self.lights),
+        }
+
+
+def estimate_seconds(light_calls: int, group_calls: int, light_rate: float, group_rate: float,
+                     light_burst: float, group_burst: float) -> float:
+    # Both buckets drain in parallel; the slower one decides when the batch is done
+    return max(
+        max(0.0, light_calls - light_burst) / light_rate,
+        max(0.0, group_calls - group_burst) / group_rate,
+    )
+
+
+def plan_batch(
+    targets: Dict[str, Dict[str, Any]],
+    all_ids: List[str],
+    groups: Dict[str, List[str]],
+    light_rate: float,
+    group_rate: float,
+    light_burst: Optional[float] = None,
+    group_burst: Optional[float] = None,
+) -> Plan:
+    """
+    Turn {light_id: payload} into the fewest, fastest bridge calls.
+
+    Lights that get an identical payload are candidates for a group action:
+    group 0 when it is every light, otherwise any bridge group whose members
+    all share that payload. Group actions are only used while they shorten
+    the estimated time, since the bridge allows far fewer of them per second.
+    """
+    light_burst = light_rate if light_burst is None else light_burst
+    group_burst = 1.0 if group_burst is None else group_burst
+
+    by_state: Dict[str, Tuple[Dict[str, Any], Set[str]]] = {}
+    for lid, payload in targets.items():
+        key = json.dumps(payload, sort_keys=True)
+        by_state.setdefault(key, (payload, set()))[1].add(lid)
+
+    everyone = set(all_ids)
+    candidates: List[Tuple[str, str, Set[str]]] = []
+    for key, (_, lids) in by_state.items():
+        if everyone and lids >= everyone:
+            candidates.append(("0", key, set(everyone)))
+        for gid, members in groups.items():
+            m = set(members)
+            if len(m) > 1 and m <= lids and m != everyone:
+                candidates.append((gid, key, m))
+    # Biggest groups first: each one saves the most light commands
+    candidates.sort(key=lambda c: len(c[2]), reverse=True)
+
+    plan = Plan()
+    uncovered = {key: set(lids) for key, (_, lids) in by_state.items()}
+    n_lights = len(targets)
+    for gid, key, members in candidates:
+        if not members <= uncovered[key]:
+            continue
+        current = estimate_seconds(n_lights, len(plan.groups), light_rate, group_rate, light_burst, group_burst)
+        after = estimate_seconds(
+            n_lights - len(members), len(plan.groups) + 1, light_rate, group_rate, light_burst, group_burst
+        )
+        # Ties go to the group action: fewer calls for the same wall time
+        if after > current:
+            continue
+        plan.groups.append((gid, by_state[key][0], sorted(members)))
+        uncovered[key] -= members
+        n_lights -= len(members)
+
+    for key, lids in uncovered.items():
+        for lid in lids:
+            plan.lights[lid] = by_state[key][0]
+    return plan
@@ -0,0 +1,58 @@
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+HUE_SCENES_PATH = os.getenv("HUE_SCENES_PATH", "/app/data/scenes.json")
+
+
+class SceneStore:
+    """
+    Named scenes kept on local disk (not on the bridge), one JSON file.
+
+    A scene is {"targets": [{"light_id", "state"}], "transition_ms", "updated_at"}.
+    """
+
+    def __init__(self, path: Optional[str] = HUE_SCENES_PATH):
+        self.path = path
+        self.scenes: Dict[str, Dict[str, Any]] = {}
+
+    def load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            return
+        if isinstance(data, dict):
+            self.scenes = {k: v for k, v in data.items() if isinstance(v, dict)}
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.scenes, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        return self.scenes.get(name)
+
+    def put(self, name: str, targets: List[Dict[str, Any]], transition_ms: Optional[int]) -> Dict[str, Any]:
+        self.scenes[name] = {"targets": targets, "transition_ms": transition_ms, "updated_at": time.time()}
+        self.save()
+        return self.scenes[name]
+
+    def delete(self, name: str) -> bool:
+        if self.scenes.pop(name, None) is None:
+            return False
+        self.save()
+        return True
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [
+            {"name": name, "lights": len(scene.get("targets", [])), "transition_ms": scene.get("transition_ms")}
+            for name, scene in sorted(self.scenes.items(), key=lambda x: x[0].lower())
+        ]
@@ -0,0 +1,185 @@
+"""
+Philips Hue bridge simulator (v1 REST API subset) for local runs and benchmarks.
+
+Emulates /api/<user>/lights, /groups and state PUTs with per-call latency and
+the bridge's command throughput: light commands are serialised at ~10/sec
+and group actions at ~1/sec, so a flood of commands queues up (and is
+eventually refused with 503) the way a real bridge lags behind.
+
+    uvicorn simulator:app --port 8080       # then HUE_BRIDGE_IP=127.0.0.1:8080
+    HUE_SIMULATE=1 uvicorn app:app          # or run it inside the Hue service
+
+Tuning: SIM_LIGHTS, SIM_ROOM_SIZE, SIM_LATENCY_MS, SIM_JITTER_MS,
+SIM_LIGHT_RATE, SIM_GROUP_RATE, SIM_MAX_QUEUE_SECONDS, SIM_USERNAME.
+"""
+
+import asyncio
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+STATE_KEYS = ("on", "bri", "hue", "sat", "ct", "xy", "alert", "effect")
+
+
+class _Radio:
+    """Commands leave one after another at a fixed rate; returns queueing delay."""
+
+    def __init__(self, rate: float, max_queue_seconds: float):
+        self.interval = 1.0 / max(0.01, rate)
+        self.max_queue_seconds = max_queue_seconds
+        self.next_free = 0.0
+
+    def reserve(self) -> Optional[float]:
+        now = time.monotonic()
+        start = max(now, self.next_free)
+        delay = start - now
+        if delay > self.max_queue_seconds:
+            return None
+        self.next_free = start + self.interval
+        return delay
+
+
+def _error(type_: int, address: str, description: str) -> List[dict]:
+    return [{"error": {"type": type_, "address": address, "description": description}}]
+
+
+def create_simulator(
+    lights: int = int(os.getenv("SIM_LIGHTS", "20")),
+    room_size: int = int(os.getenv("SIM_ROOM_SIZE", "4")),
+    latency_ms: float = float(os.getenv("SIM_LATENCY_MS", "30")),
+    jitter_ms: float = float(os.getenv("SIM_JITTER_MS", "15")),
+    light_rate: float = float(os.getenv("SIM_LIGHT_RATE", "10")),
+    group_rate: float = float(os.getenv("SIM_GROUP_RATE", "1")),
+    max_queue_seconds: float = float(os.getenv("SIM_MAX_QUEUE_SECONDS", "5")),
+    username: Optional[str] = os.getenv("SIM_USERNAME") or None,
+    seed: Optional[int] = None,
+) -> FastAPI:
+    sim = FastAPI(title="Hue bridge simulator")
+    rng = random.Random(seed)
+    light_radio = _Radio(light_rate, max_queue_seconds)
+    group_radio = _Radio(group_rate, max_queue_seconds)
+
+    state: Dict[str, Dict[str, Any]] = {}
+    for i in range(1, lights + 1):
+        state[str(i)] = {
+            "name": f"Sim light {i}",
+            "type": "Extended color light",
+            "state": {
+                "on": False, "bri": 200, "hue": 8000, "sat": 140, "ct": 366, "xy": [0.45, 0.41],
+                "alert": "none", "effect": "none", "colormode": "hs", "reachable": True,
+            },
+        }
+    ids = list(state)
+    groups: Dict[str, Dict[str, Any]] = {}
+    for n, start in enumerate(range(0, len(ids), max(1, room_size)), start=1):
+        groups[str(n)] = {"name": f"Room {n}", "type": "Room", "lights": ids[start : start + room_size]}
+
+    stats = {"gets": 0, "light_commands": 0, "group_commands": 0, "rejected": 0, "max_queue_seconds": 0.0}
+    sim.state.stats = stats
+    sim.state.lights = state
+
+    def authorized(user: str) -> bool:
+        return username is None or user == username
+
+    async def latency(extra: float = 0.0) -> None:
+        await asyncio.sleep((latency_ms + rng.uniform(0, jitter_ms)) / 1000 + extra)
+
+    def group_view(gid: str, g: Dict[str, Any]) -> Dict[str, Any]:
+        on = [state[lid]["state"]["on"] for lid in g["lights"]]
+        return {**g, "state": {"any_on": any(on), "all_on": bool(on) and all(on)}}
+
+    def apply(lid: str, body: Dict[str, Any]) -> List[dict]:
+        out = []
+        st = state[lid]["state"]
+        for k, v in body.items():
+            if k == "transitiontime":
+                continue
+            if k not in STATE_KEYS:
+                out += _error(6, f"/lights/{lid}/state/{k}", f"parameter, {k}, not available")
+                continue
+            st[k] = v
+            if k in ("hue", "sat"):
+                st["colormode"] = "hs"
+            out.append({"success": {f"/lights/{lid}/state/{k}": v}})
+        return out
+
+    async def command(radio: _Radio, kind: str) -> Optional[JSONResponse]:
+        delay = radio.reserve()
+        if delay is None:
+            stats["rejected"] += 1
+            return JSONResponse(status_code=503, content={"error": "bridge busy"})
+        stats[f"{kind}_commands"] += 1
+        stats["max_queue_seconds"] = max(stats["max_queue_seconds"], delay)
+        await latency(delay)
+        return None
+
+    @sim.get("/api/{user}/lights")
+    async def get_lights(user: str):
+        if not authorized(user):
+            return _error(1, "/lights", "unauthorized user")
+        stats["gets"] += 1
+        await latency(len(state) * 0.0005)  # the full document takes a bit longer
+        return state
+
+    @sim.get("/api/{user}/lights/{lid}")
+    async def get_light(user: str, lid: str):
+        if not authorized(user):
+            return _error(1, f"/lights/{lid}", "unauthorized user")
+        stats["gets"] += 1
+        await latency()
+        if lid not in state:
+            return _error(3, f"/lights/{lid}", f"resource, /lights/{lid}, not available")
+        return state[lid]
+
+    @sim.get("/api/{user}/groups")
+    async def get_groups(user: str):
+        if not authorized(user):
+            return _error(1, "/groups", "unauthorized user")
+        stats["gets"] += 1
+        await latency()
+        return {gid: group_view(gid, g) for gid, g in groups.items()}
+
+    @sim.put("/api/{user}/lights/{lid}/state")
+    async def put_light(user: str, lid: str, request: Request):
+        if not authorized(user):
+            return _error(1, f"/lights/{lid}/state", "unauthorized user")
+        body = await request.json()
+        busy = await command(light_radio, "light")
+        if busy is not None:
+            return busy
+        if lid not in state:
+            return _error(3, f"/lights/{lid}/state", f"resource, /lights/{lid}/state, not available")
+        return apply(lid, body)
+
+    @sim.put("/api/{user}/groups/{gid}/action")
+    async def put_group(user: str, gid: str, request: Request):
+        if not authorized(user):
+            return _error(1, f"/groups/{gid}/action", "unauthorized user")
+        body = await request.json()
+        busy = await command(group_radio, "group")
+        if busy is not None:
+            return busy
+        if gid == "0":
+            members = ids
+        elif gid in groups:
+            members = groups[gid]["lights"]
+        else:
+            return _error(3, f"/groups/{gid}/action", f"resource, /groups/{gid}/action, not available")
+        for lid in members:
+            apply(lid, body)
+        return [
+            {"success": {f"/groups/{gid}/action/{k}": v}} for k, v in body.items() if k in STATE_KEYS
+        ]
+
+    @sim.get("/sim/stats")
+    async def sim_stats():
+        return stats
+
+    return sim
+
+
+app = create_simulator()
@@ -0,0 +1,223 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Set
+
+import httpx
+
+from bridge import Bridge, BridgeError
+
+# Poll fast while a dashboard is listening for updates, slowly otherwise
+HUE_POLL_SECONDS = float(os.getenv("HUE_POLL_SECONDS", "2"))
+HUE_POLL_IDLE_SECONDS = float(os.getenv("HUE_POLL_IDLE_SECONDS", "10"))
+SUBSCRIBER_QUEUE = 100
+
+
+def light_summary(lid: str, light: Dict[str, Any]) -> Dict[str, Any]:
+    st = light.get("state", {})
+    return {
+        "id": lid,
+        "name": light.get("name"),
+        "on": st.get("on"),
+        "bri": st.get("bri"),
+        "hue": st.get("hue"),
+        "sat": st.get("sat"),
+        "reachable": st.get("reachable"),
+    }
+
+
+def group_summary(gid: str, group: Dict[str, Any]) -> Dict[str, Any]:
+    st = group.get("state", {})
+    return {
+        "id": gid,
+        "name": group.get("name"),
+        "type": group.get("type"),
+        "lights": list(group.get("lights", [])),
+        "any_on": st.get("any_on"),
+        "all_on": st.get("all_on"),
+    }
+
+
+def _diff(old: Dict[str, dict], new: Dict[str, dict]):
+    changed = [v for k, v in new.items() if old.get(k) != v]
+    removed = [k for k in old if k not in new]
+    return changed, removed
+
+
+class StateCache:
+    """
+    In-memory copy of the bridge's lights and groups.
+
+    One background poller keeps it fresh and successful commands are applied
+    to it right away, so reads never touch the bridge. Changes are pushed to
+    subscribers (the SSE endpoint) as deltas of the summarised objects.
+    """
+
+    def __init__(self, bridge: Bridge, interval: float = HUE_POLL_SECONDS, idle_interval: float = HUE_POLL_IDLE_SECONDS):
+        self.bridge = bridge
+        self.interval = interval
+        self.idle_interval = max(interval, idle_interval)
+        self.lights: Dict[str, dict] = {}
+        self.groups: Dict[str, dict] = {}
+        self.version = 0
+        self.updated_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.polls = 0
+
+        self._light_list: List[dict] = []
+        self._loaded = asyncio.Event()
+        self._wake = asyncio.Event()
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    # ---------- lifecycle ----------
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except (BridgeError, httpx.HTTPError, ValueError) as e:
+                self.last_error = repr(e)
+            interval = self.interval if self._subscribers else self.idle_interval
+            try:
+                # Sleep until the next poll, or until someone asks for a refresh
+                await asyncio.wait_for(self._wake.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def poke(self) -> None:
+        """Ask the poller to refresh now (e.g. after a command with unknown effects)."""
+        self._wake.set()
+
+    async def wait_loaded(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._loaded.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded.is_set()
+
+    # ---------- updates ----------
+    async def refresh(self) -> None:
+        # probe: the poller keeps checking a degraded bridge so it notices recovery
+        lights, groups = await asyncio.gather(
+            self.bridge.get("/lights", probe=True), self.bridge.get("/groups", probe=True)
+        )
+        if not isinstance(lights, dict) or not isinstance(groups, dict):
+            raise ValueError("Unexpected bridge response")
+        self.polls += 1
+        self.last_error = None
+        self._replace(lights, groups)
+        self._loaded.set()
+
+    def _replace(self, lights: Dict[str, dict], groups: Dict[str, dict]) -> None:
+        old_l = {k: light_summary(k, v) for k, v in self.lights.items()}
+        old_g = {k: group_summary(k, v) for k, v in self.groups.items()}
+        self.lights, self.groups = lights, groups
+        new_l = {k: light_summary(k, v) for k, v in lights.items()}
+        new_g = {k: group_summary(k, v) for k, v in groups.items()}
+        self.updated_at = time.time()
+        self._publish(_diff(old_l, new_l), _diff(old_g, new_g))
+
+    def apply(self, kind: str, target: str, payload: Dict[str, Any]) -> None:
+        """Record a command the bridge accepted, without waiting for the next poll."""
+        if kind == "group":
+            ids = list(self.lights) if target == "0" else list(self.groups.get(target, {}).get("lights", []))
+        else:
+            ids = [target]
+        before = {lid: light_summary(lid, self.lights[lid]) for lid in ids if lid in self.lights}
+        state = {k: v for k, v in payload.items() if k != "transitiontime"}
+        for lid in before:
+            self.lights[lid].setdefault("state", {}).update(state)
+        after = {lid: light_summary(lid, self.lights[lid]) for lid in before}
+        self._publish(_diff(before, after), ([], []))
+
+    def _publish(self, lights_delta, groups_delta) -> None:
+        (lights, removed_lights), (groups, removed_groups) = lights_delta, groups_delta
+        if not (lights or removed_lights or groups or removed_groups):
+            return
+        self.version += 1
+        self._light_list = sorted(
+            (light_summary(k, v) for k, v in self.lights.items()),
+            key=lambda x: (x["name"] or "").lower(),
+        )
+        event = {
+            "type": "delta",
+            "version": self.version,
+            "lights": lights,
+            "removed_lights": removed_lights,
+            "groups": groups,
+            "removed_groups": removed_groups,
+        }
+        for q in list(self._subscribers):
+            if q.full():
+                # Slow client: drop its backlog and let it resync from a snapshot
+                while not q.empty():
+                    q.get_nowait()
+                q.put_nowait(self.snapshot())
+            else:
+                q.put_nowait(event)
+
+    # ---------- reads ----------
+    def light_list(self) -> List[dict]:
+        return self._light_list
+
+    def group_list(self) -> List[dict]:
+        out = [group_summary(k, v) for k, v in self.groups.items()]
+        out.sort(key=lambda x: (x["name"] or "").lower())
+        return out
+
+    def snapshot(self) -> dict:
+        return {
+            "type": "snapshot",
+            "version": self.version,
+            "lights": self.light_list(),
+            "groups": self.group_list(),
+        }
+
+    # ---------- push ----------
+    def subscribe(self) -> asyncio.Queue:
+        q: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE)
+        q.put_nowait(self.snapshot())
+        self._subscribers.add(q)
+        self.poke()  # a dashboard just opened: fetch fresh state now
+        return q
+
+    def unsubscribe(self, q: asyncio.Queue) -> None:
+        self._subscribers.discard(q)
+
+    def age(self) -> Optional[float]:
+        return time.time() - self.updated_at if self.updated_at else None
+
+    def unreachable(self) -> int:
+        return sum(1 for light in self.lights.values() if light.get("state", {}).get("reachable") is False)
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "version": self.version,
+            "lights": len(self.lights),
+            "groups": len(self.groups),
+            "polls": self.polls,
+            "age_seconds": round(self.age(), 3) if self.updated_at else None,
+            "unreachable_lights": self.unreachable(),
+            "subscribers": len(self._subscribers),
+            "last_error": self.last_error,
+        }
+
+
+def sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
@@ -1,15 +1,18 @@
 import os
 import json
 import re
+import time
 from datetime import datetime
 from typing import List, Optional
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field, HttpUrl
 import requests
 from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 load_dotenv()
@@ -32,6 +35,11 @@ DATABASE_URL = (
 
 engine = create_engine(DATABASE_URL, pool_pre_ping=True)
 
+from views import ViewCache, create_view_versions  # noqa: E402
+
+# Cached read views; correct across uvicorn workers (see views.py)
+views = ViewCache(engine)
+
 
 class Base(DeclarativeBase):
     pass
@@ -50,6 +58,7 @@ class Recipe(Base):
     steps: Mapped[str]  # newline-separated
     tags: Mapped[Optional[str]]  # comma-separated
     nutrition_json: Mapped[Optional[str]]
+    source_url: Mapped[Optional[str]]  # set for imported recipes; unique
     created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
 
@@ -80,6 +89,9 @@ class NutritionFacts(BaseModel):
     sodium_mg: Optional[float] = None
     cholesterol_mg: Optional[float] = None
 
+    # computed from the ingredient lines (nutrition.py) rather than entered or scraped
+    estimated: Optional[bool] = None
+
 
 class RecipeCreate(BaseModel):
     title: str = Field(min_length=1, max_length=200)
@@ -93,6 +105,11 @@ class RecipeCreate(BaseModel):
     nutrition: Optional[NutritionFacts] = None
 
 
+class RecipeImport(RecipeCreate):
+    # Imports are keyed by their page URL: importing the same URL again updates the recipe
+    source_url: Optional[str] = Field(default=None, max_length=2000)
+
+
 class RecipeUpdate(BaseModel):
     title: Optional[str] = Field(default=None, min_length=1, max_length=200)
     description: Optional[str] = None
@@ -117,6 +134,7 @@ class RecipeOut(BaseModel):
     steps: List[str]
     tags: List[str]
     nutrition: Optional[NutritionFacts] = None
+    source_url: Optional[str] = None
     created_at: datetime
     updated_at: datetime
 
@@ -146,25 +164,135 @@ def to_out(r: Recipe) -> RecipeOut:
         steps=[x for x in (r.steps or "").split("\n") if x.strip()],
         tags=[t.strip() for t in (r.tags or "").split(",") if t.strip()],
         nutrition=_parse_nutrition(getattr(r, "nutrition_json", None)),
+        source_url=getattr(r, "source_url", None),
         created_at=r.created_at,
         updated_at=r.updated_at,
     )
 
 
+# Text matched by /api/recipes/suggest; the trigram index is on this exact expression
+SUGGEST_DOC = "LOWER(title || ' ' || COALESCE(tags, ''))"
+SUGGEST_MAX_LIMIT = 50
+# Whether the trigram index exists (see add_suggest_index); looked up on first use
+suggest_trgm: Optional[bool] = None
+
+
+def add_source_url(conn) -> None:
+    """Schema migration 2: page URL of imported recipes, the key of re-imports."""
+    conn.execute(
+        text("ALTER TABLE recipes ADD COLUMN IF NOT EXISTS source_url TEXT")
+    )
+    conn.execute(
+        text(
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_recipes_source_url
+            ON recipes(source_url) WHERE source_url IS NOT NULL
+            """
+        )
+    )
+
+
+def create_crawl_pages(conn) -> None:
+    """Schema migration 6: sitemap lastmod of every page a site import has saved."""
+    conn.execute(
+        text(
+            """
+            CREATE TABLE IF NOT EXISTS crawl_pages (
+              url TEXT PRIMARY KEY,
+              site TEXT NOT NULL,
+              lastmod TEXT,
+              recipe BOOLEAN NOT NULL,
+              crawled_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+            """
+        )
+    )
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_crawl_pages_site ON crawl_pages(site)"))
+
+
+def add_suggest_index(conn) -> None:
+    """
+    Schema migration 4: pg_trgm and the index behind /api/recipes/suggest.
+    Where the extension can't be created (not installed, or not allowed
+    for this role) it is skipped and suggest falls back to LIKE.
+    """
+    try:
+        with conn.begin_nested():
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            conn.execute(
+                text(
+                    f"""
+                    CREATE INDEX IF NOT EXISTS idx_recipes_suggest_trgm
+                    ON recipes USING gin (({SUGGEST_DOC}) gin_trgm_ops)
+                    """
+                )
+            )
+    except DBAPIError:
+        pass
+
+
 app = FastAPI(title="Home Recipes")
 
-from meal_planner import ensure_meal_planner_schema, register_meal_planner_routes  # noqa: E402
+from profiling import install_profiling  # noqa: E402
+
+install_profiling(app, "recipes")
+
+from meal_planner import MealOut, RecipeListItem, create_meals_table, register_meal_planner_routes  # noqa: E402
+from meal_partitions import maintain_if_due, partition_meals  # noqa: E402
+from migrations import Migration, migrate  # noqa: E402
+from sync import create_sync_tables, record_deletion, register_sync_routes  # noqa: E402
+from nutrition import estimate, estimate_many, register_nutrition_routes  # noqa: E402
+from streaming import stream_rows, wants_stream  # noqa: E402
+
+
+def recipe_from_row(row) -> RecipeOut:
+    return to_out(Recipe(**{c: row.get(c) for c in Recipe.__table__.columns.keys()}))
+
+
+register_meal_planner_routes(app, engine, views)
+register_sync_routes(app, engine, recipe_from_row, lambda row: MealOut(**dict(row)))
+register_nutrition_routes(app, engine, views)
+
+
+def _nutrition_json(nutrition: Optional[NutritionFacts], ingredients: str, servings: Optional[int]) -> Optional[str]:
+    """Nutrition as given, or else estimated from the (newline-separated) ingredients."""
+    if nutrition:
+        payload = nutrition.model_dump(exclude_none=True)
+        if payload:
+            return json.dumps(payload)
+    facts = estimate(ingredients.split("\n"), servings)
+    return json.dumps(facts) if facts else None
+
+def create_base_tables(conn) -> None:
+    """Schema migration 1: recipes and meals as first shipped."""
+    Base.metadata.create_all(conn)
+    create_meals_table(conn)
+
+
+# Append only; see migrations.py
+MIGRATIONS = [
+    Migration(1, "recipes and meals tables", create_base_tables),
+    Migration(2, "recipes.source_url for site imports", add_source_url),
+    Migration(3, "change tracking for /api/sync", create_sync_tables),
+    Migration(4, "trigram index for recipe suggestions", add_suggest_index),
+    Migration(5, "meals partitioned by month, meals_archive", partition_meals),
+    Migration(6, "crawl_pages for incremental site imports", create_crawl_pages),
+    Migration(7, "view_versions for cache checks across workers", create_view_versions),
+]
 
-register_meal_planner_routes(app, engine)
 
 @app.on_event("startup")
 def startup():
-    # Create table if not exists (simple v1)
-    Base.metadata.create_all(engine)
-    ensure_meal_planner_schema(engine)
-    # Sanity check connectivity
-    with engine.connect() as conn:
-        conn.execute(text("SELECT 1"))
+    # One version check when the schema is current (this also checks connectivity)
+    if migrate(engine, MIGRATIONS):
+        # Give the rows of a just-partitioned table their months right away
+        maintain_if_due(engine, views)
+    views.start()
+
+
+@app.on_event("shutdown")
+def shutdown():
+    views.stop()
 
 
 # ---------------- API ----------------
@@ -172,8 +300,10 @@ def startup():
 
 @app.get("/api/recipes", response_model=list[RecipeOut])
 def list_recipes(
+    request: Request,
     q: Optional[str] = Query(default=None, description="Search title/description/tags"),
     tag: Optional[str] = Query(default=None, description="Filter by single tag"),
+    stream: Optional[bool] = Query(default=None, description="NDJSON, one recipe per line (or Accept: application/x-ndjson)"),
 ):
     where = []
     params = {}
@@ -192,31 +322,99 @@ def list_recipes(
         sql += " WHERE " + " AND ".join(where)
     sql += " ORDER BY updated_at DESC"
 
+    if wants_stream(request, stream):
+        return stream_rows(engine, sql, params, lambda row: recipe_from_row(row).model_dump_json())
+
+    def load() -> list[RecipeOut]:
+        with engine.connect() as conn:
+            rows = conn.execute(text(sql), params).mappings().all()
+
+        out: list[RecipeOut] = []
+        for row in rows:
+            r = Recipe(
+                id=row["id"],
+                title=row["title"],
+                description=row["description"],
+                servings=row["servings"],
+                prep_minutes=row["prep_minutes"],
+                cook_minutes=row["cook_minutes"],
+                ingredients=row["ingredients"],
+                steps=row["steps"],
+                tags=row["tags"],
+                nutrition_json=row.get("nutrition_json"),
+                source_url=row.get("source_url"),
+                created_at=row["created_at"],
+                updated_at=row["updated_at"],
+            )
+            out.append(to_out(r))
+        return out
+
+    return views.get(("recipes",), ("list_recipes", q, tag), load)
+
+
+def _suggest_uses_trgm() -> bool:
+    global suggest_trgm
+    if suggest_trgm is None:
+        with engine.connect() as conn:
+            suggest_trgm = conn.execute(text("SELECT to_regclass('idx_recipes_suggest_trgm') IS NOT NULL")).scalar()
+    return suggest_trgm
+
+
+def _like_escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# Declared before /api/recipes/{recipe_id}, which would otherwise take the path
+@app.get("/api/recipes/suggest", response_model=list[RecipeListItem])
+def suggest_recipes(
+    q: str = Query(default="", max_length=100, description="What was typed so far"),
+    limit: int = Query(default=10, ge=1, le=SUGGEST_MAX_LIMIT),
+):
+    """
+    Typeahead for recipe pickers: ids and titles only, best match first.
+    Titles starting with the query come first, then by trigram word
+    similarity, which also catches typos ("chiken"). Not cached: every
+    keystroke is a new key, and the indexed query is cheaper than a view.
+    """
+    q = " ".join(q.lower().split())
+    if not q:
+        return []
+    params = {
+        "q": q,
+        "prefix": _like_escape(q) + "%",
+        "contains": "%" + _like_escape(q) + "%",
+        "limit": limit,
+    }
+    if _suggest_uses_trgm():
+        sql = f"""
+            SELECT id, title FROM recipes
+            WHERE :q <% {SUGGEST_DOC} OR {SUGGEST_DOC} LIKE :contains
+            ORDER BY LOWER(title) LIKE :prefix DESC,
+                     word_similarity(:q, LOWER(title)) DESC,
+                     word_similarity(:q, {SUGGEST_DOC}) DESC,
+                     title
+            LIMIT :limit
+        """
+    else:
+        sql = f"""
+            SELECT id, title FROM recipes
+            WHERE {SUGGEST_DOC} LIKE :contains
+            ORDER BY LOWER(title) LIKE :prefix DESC,
+                     LOWER(title) LIKE :contains DESC,
+                     title
+            LIMIT :limit
+        """
     with engine.connect() as conn:
         rows = conn.execute(text(sql), params).mappings().all()
-
-    out: list[RecipeOut] = []
-    for row in rows:
-        r = Recipe(
-            id=row["id"],
-            title=row["title"],
-            description=row["description"],
-            servings=row["servings"],
-            prep_minutes=row["prep_minutes"],
-            cook_minutes=row["cook_minutes"],
-            ingredients=row["ingredients"],
-            steps=row["steps"],
-            tags=row["tags"],
-            nutrition_json=row.get("nutrition_json"),
-            created_at=row["created_at"],
-            updated_at=row["updated_at"],
-        )
-        out.append(to_out(r))
-    return out
+    return [RecipeListItem(**dict(r)) for r in rows]
 
 
 @app.get("/api/recipes/{recipe_id}", response_model=RecipeOut)
 def get_recipe(recipe_id: int):
+    return views.get(("recipes",), ("recipe", recipe_id), lambda: _load_recipe(recipe_id))
+
+
+def _load_recipe(recipe_id: int) -> RecipeOut:
     with engine.connect() as conn:
         row = (
             conn.execute(
@@ -239,6 +437,7 @@ def get_recipe(recipe_id: int):
         steps=row["steps"],
         tags=row["tags"],
         nutrition_json=row.get("nutrition_json"),
+        source_url=row.get("source_url"),
         created_at=row["created_at"],
         updated_at=row["updated_at"],
     )
@@ -252,12 +451,9 @@ def create_recipe(body: RecipeCreate):
     steps = "\n".join([s.strip() for s in body.steps if s.strip()])
     tags = ",".join(sorted({t.strip().lower() for t in body.tags if t.strip()}))
 
-    nutrition_json = None
-    if body.nutrition:
-        payload = body.nutrition.model_dump(exclude_none=True)
-        nutrition_json = json.dumps(payload) if payload else None
+    nutrition_json = _nutrition_json(body.nutrition, ingredients, body.servings)
 
-    with engine.begin() as conn:
+    with views.write("recipes") as conn:
         row = (
             conn.execute(
                 text(
@@ -298,6 +494,7 @@ def create_recipe(body: RecipeCreate):
         steps=row["steps"],
         tags=row["tags"],
         nutrition_json=row.get("nutrition_json"),
+        source_url=row.get("source_url"),
         created_at=row["created_at"],
         updated_at=row["updated_at"],
     )
@@ -336,13 +533,22 @@ def update_recipe(recipe_id: int, body: RecipeUpdate):
         tags = ",".join(sorted({t.strip().lower() for t in body.tags if t.strip()}))
 
     nutrition_json = existing.get("nutrition_json")
+    current = _parse_nutrition(nutrition_json)
+    estimated = current is None or bool(current.estimated)
     if body.nutrition is not None:
-        payload = body.nutrition.model_dump(exclude_none=True)
-        nutrition_json = json.dumps(payload) if payload else None
+        payload = body.nutrition.model_dump(exclude_none=True, exclude={"estimated"})
+        # The form sends back the values it was shown: an unedited estimate stays an estimate
+        if not (current and current.estimated and payload == current.model_dump(exclude_none=True, exclude={"estimated"})):
+            nutrition_json = json.dumps(body.nutrition.model_dump(exclude_none=True)) if payload else None
+            estimated = not payload or bool(body.nutrition.estimated)
+    if estimated and (
+        nutrition_json is None or ingredients != existing["ingredients"] or servings != existing["servings"]
+    ):
+        nutrition_json = _nutrition_json(None, ingredients, servings)
 
     now = datetime.utcnow()
 
-    with engine.begin() as conn:
+    with views.write("recipes") as conn:
         row = (
             conn.execute(
                 text(
@@ -357,7 +563,8 @@ def update_recipe(recipe_id: int, body: RecipeUpdate):
                 steps=:steps,
                 tags=:tags,
                 nutrition_json=:nutrition_json,
-                updated_at=:updated_at
+                updated_at=:updated_at,
+                change_seq=nextval('change_seq')
             WHERE id=:id
             RETURNING *
           """
@@ -391,6 +598,7 @@ def update_recipe(recipe_id: int, body: RecipeUpdate):
         steps=row["steps"],
         tags=row["tags"],
         nutrition_json=row.get("nutrition_json"),
+        source_url=row.get("source_url"),
         created_at=row["created_at"],
         updated_at=row["updated_at"],
     )
@@ -399,13 +607,136 @@ def update_recipe(recipe_id: int, body: RecipeUpdate):
 
 @app.delete("/api/recipes/{recipe_id}")
 def delete_recipe(recipe_id: int):
-    with engine.begin() as conn:
+    with views.write("recipes") as conn:
         res = conn.execute(text("DELETE FROM recipes WHERE id=:id"), {"id": recipe_id})
+        if res.rowcount:
+            record_deletion(conn, "recipe", recipe_id)
     if res.rowcount == 0:
         raise HTTPException(status_code=404, detail="Recipe not found")
     return {"ok": True}
 
 
+_IMPORT_COLUMNS = (
+    "title",
+    "description",
+    "servings",
+    "prep_minutes",
+    "cook_minutes",
+    "ingredients",
+    "steps",
+    "tags",
+    "nutrition_json",
+    "source_url",
+    "created_at",
+    "updated_at",
+)
+
+
+def _import_row(body: RecipeImport, now: datetime) -> dict:
+    nutrition_json = None
+    if body.nutrition:
+        payload = body.nutrition.model_dump(exclude_none=True)
+        nutrition_json = json.dumps(payload) if payload else None
+    return {
+        "title": body.title,
+        "description": body.description,
+        "servings": body.servings,
+        "prep_minutes": body.prep_minutes,
+        "cook_minutes": body.cook_minutes,
+        "ingredients": "\n".join([i.strip() for i in body.ingredients if i.strip()]),
+        "steps": "\n".join([s.strip() for s in body.steps if s.strip()]),
+        "tags": ",".join(sorted({t.strip().lower() for t in body.tags if t.strip()})),
+        "nutrition_json": nutrition_json,
+        "source_url": body.source_url,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def _import_rows(items: List[RecipeImport]) -> list[dict]:
+    """
+    Rows for _upsert_recipes, one per source_url (the last wins); recipes
+    without nutrition get an estimate. Call this before views.write: the
+    estimates are CPU work that would otherwise hold up every writer.
+    """
+    now = datetime.utcnow()
+    rows: list[dict] = []
+    by_url: dict[str, int] = {}
+    for item in items:
+        row = _import_row(item, now)
+        # ON CONFLICT cannot touch the same row twice in one statement: last one wins
+        if row["source_url"] and row["source_url"] in by_url:
+            rows[by_url[row["source_url"]]] = row
+            continue
+        if row["source_url"]:
+            by_url[row["source_url"]] = len(rows)
+        rows.append(row)
+
+    missing = [row for row in rows if row["nutrition_json"] is None]
+    estimates = estimate_many([(row["ingredients"].split("\n"), row["servings"]) for row in missing])
+    for row, facts in zip(missing, estimates):
+        row["nutrition_json"] = json.dumps(facts) if facts else None
+    return rows
+
+
+def _upsert_recipes(conn, rows: list[dict]) -> dict:
+    """
+    Insert many recipes (from _import_rows) in one statement. Rows whose
+    source_url already exists are updated in place (created_at is kept,
+    and so is existing nutrition unless the new row has some; an estimate
+    only replaces another estimate).
+    """
+    if not rows:
+        return {"inserted": 0, "updated": 0, "ids": []}
+
+    values = []
+    params = {}
+    for i, row in enumerate(rows):
+        values.append("(" + ", ".join(f":{c}_{i}" for c in _IMPORT_COLUMNS) + ")")
+        params.update({f"{c}_{i}": row[c] for c in _IMPORT_COLUMNS})
+
+    result = conn.execute(
+        text(
+            f"""
+            INSERT INTO recipes ({", ".join(_IMPORT_COLUMNS)})
+            VALUES {", ".join(values)}
+            ON CONFLICT (source_url) WHERE source_url IS NOT NULL DO UPDATE
+            SET title = EXCLUDED.title,
+                description = COALESCE(EXCLUDED.description, recipes.description),
+                servings = EXCLUDED.servings,
+                prep_minutes = EXCLUDED.prep_minutes,
+                cook_minutes = EXCLUDED.cook_minutes,
+                ingredients = EXCLUDED.ingredients,
+                steps = EXCLUDED.steps,
+                tags = EXCLUDED.tags,
+                nutrition_json = CASE
+                  WHEN EXCLUDED.nutrition_json IS NULL THEN recipes.nutrition_json
+                  WHEN (EXCLUDED.nutrition_json::jsonb ->> 'estimated') = 'true'
+                   AND recipes.nutrition_json IS NOT NULL
+                   AND (recipes.nutrition_json::jsonb ->> 'estimated') IS NULL THEN recipes.nutrition_json
+                  ELSE EXCLUDED.nutrition_json
+                END,
+                updated_at = EXCLUDED.updated_at,
+                change_seq = nextval('change_seq')
+            RETURNING id, (xmax = 0) AS inserted
+            """
+        ),
+        params,
+    ).mappings().all()
+
+    inserted = sum(1 for r in result if r["inserted"])
+    return {"inserted": inserted, "updated": len(result) - inserted, "ids": [r["id"] for r in result]}
+
+
+@app.post("/api/recipes/bulk")
+def bulk_import_recipes(items: List[RecipeImport]):
+    if len(items) > 500:
+        raise HTTPException(status_code=400, detail="At most 500 recipes per request")
+    rows = _import_rows(items)
+    with views.write("recipes") as conn:
+        return _upsert_recipes(conn, rows)
+
+
 # ---------------- Scraper proxy ----------------
 class ScrapeRequest(BaseModel):
     url: HttpUrl
@@ -503,8 +834,33 @@ def _nutrition_from_scraper(nut: object) -> Optional[NutritionFacts]:
     return NutritionFacts(**payload) if payload else None
 
 
+def _scrape_out(data: object) -> ScrapeOut:
+    """Map the scraper's RecipeData JSON onto the fields the recipe form uses."""
+    if not isinstance(data, dict):
+        return ScrapeOut()
+    ingredients = data.get("ingredients")
+    steps = data.get("instructions") or []
+
+    prep = data.get("prep_time_minutes")
+    cook = data.get("cook_time_minutes")
+    total = data.get("total_time_minutes")
+    if cook is None and isinstance(total, int):
+        cook = total
+
+    return ScrapeOut(
+        title=data.get("title"),
+        servings=_parse_first_int(data.get("yields")),
+        prep_minutes=prep if isinstance(prep, int) else None,
+        cook_minutes=cook if isinstance(cook, int) else None,
+        ingredients=ingredients if isinstance(ingredients, list) else [],
+        steps=steps if isinstance(steps, list) else [],
+        nutrition=_nutrition_from_scraper(data.get("nutrition")),
+    )
+
+
 @app.post("/api/scrape", response_model=ScrapeOut)
-def scrape_url(req: ScrapeRequest):
+def scrape_url(req: ScrapeRequest, response: Response):
+    t0 = time.perf_counter()
     try:
         r = requests.post(
             f"{RECIPE_SCRAPER_URL}/api/scrape",
@@ -520,28 +876,182 @@ def scrape_url(req: ScrapeRequest):
             detail = r.json()
         except Exception:
             detail = r.text
-        raise HTTPException(status_code=502, detail={"status": r.status_code, "error": detail})
+        headers = {}
+        upstream = r.headers.get("Server-Timing")
+        if upstream:
+            headers["Server-Timing"] = upstream
+        if r.status_code == 429:
+            # Parse pool saturated: tell the client to retry rather than reporting the scraper broken
+            retry = r.headers.get("Retry-After")
+            if retry:
+                headers["Retry-After"] = retry
+            raise HTTPException(
+                status_code=429,
+                detail=f"Scraper is busy, retry in {retry}s" if retry else "Scraper is busy, retry shortly",
+                headers=headers or None,
+            )
+        raise HTTPException(
+            status_code=502,
+            detail={"status": r.status_code, "error": detail},
+            headers=headers or None,
+        )
 
-    data = r.json() if r.content else {}
-    ingredients = data.get("ingredients") if isinstance(data, dict) else None
-    steps = (data.get("instructions") if isinstance(data, dict) else None) or []
+    out = _scrape_out(r.json() if r.content else {})
 
-    prep = data.get("prep_time_minutes") if isinstance(data, dict) else None
-    cook = data.get("cook_time_minutes") if isinstance(data, dict) else None
-    total = data.get("total_time_minutes") if isinstance(data, dict) else None
-    if cook is None and isinstance(total, int):
-        cook = total
+    # Forward the scraper's per-stage timings and add the proxy round trip
+    timing = f"proxy;dur={(time.perf_counter() - t0) * 1000:.1f}"
+    upstream = r.headers.get("Server-Timing")
+    response.headers["Server-Timing"] = f"{upstream}, {timing}" if upstream else timing
+    return out
 
-    out = ScrapeOut(
-        title=(data.get("title") if isinstance(data, dict) else None),
-        servings=_parse_first_int(data.get("yields")) if isinstance(data, dict) else None,
-        prep_minutes=prep if isinstance(prep, int) else None,
-        cook_minutes=cook if isinstance(cook, int) else None,
-        ingredients=ingredients if isinstance(ingredients, list) else [],
-        steps=steps if isinstance(steps, list) else [],
-        nutrition=_nutrition_from_scraper(data.get("nutrition")) if isinstance(data, dict) else None,
+
+# ---------------- Site import (crawl) ----------------
+CRAWL_BATCH = int(os.getenv("CRAWL_BATCH", "25"))
+
+
+class CrawlRequest(BaseModel):
+    url: HttpUrl  # site root, sitemap or recipe index page
+    include: Optional[str] = None  # regex; only matching page URLs are imported
+    exclude: Optional[str] = None
+    limit: Optional[int] = Field(default=None, ge=1)
+    full: bool = False  # refetch pages even if their sitemap lastmod is unchanged
+    tags: list[str] = []  # added to every imported recipe
+
+
+def _import_from_scrape(data: dict, source_url: str, tags: list[str]) -> Optional[RecipeImport]:
+    out = _scrape_out(data)
+    if not (out.title or "").strip():
+        return None
+    return RecipeImport(
+        title=out.title.strip()[:200],
+        servings=out.servings if out.servings and out.servings > 0 else None,
+        prep_minutes=out.prep_minutes if out.prep_minutes and out.prep_minutes >= 0 else None,
+        cook_minutes=out.cook_minutes if out.cook_minutes and out.cook_minutes >= 0 else None,
+        ingredients=out.ingredients,
+        steps=out.steps,
+        tags=tags,
+        nutrition=out.nutrition,
+        source_url=source_url,
     )
-    return out
+
+
+def _record_crawl_pages(conn, site: str, pages: dict) -> None:
+    """Remember {url: (lastmod, has recipe)} as imported, so re-crawls skip them while unchanged."""
+    if not pages:
+        return
+    conn.execute(
+        text(
+            """
+            INSERT INTO crawl_pages (url, site, lastmod, recipe, crawled_at)
+            VALUES (:url, :site, :lastmod, :recipe, NOW())
+            ON CONFLICT (url) DO UPDATE
+            SET site = EXCLUDED.site, lastmod = EXCLUDED.lastmod, recipe = EXCLUDED.recipe,
+                crawled_at = EXCLUDED.crawled_at
+            """
+        ),
+        [{"url": u, "site": site, "lastmod": lm, "recipe": has} for u, (lm, has) in pages.items()],
+    )
+
+
+@app.post("/api/crawl")
+def crawl_site(req: CrawlRequest):
+    """
+    Import every recipe on a site. The scraper discovers pages (sitemap or
+    index), streams parsed recipes back as NDJSON, and they are upserted in
+    batches by source_url; progress is streamed to the client the same way.
+
+    Pages are recorded in crawl_pages (with their sitemap lastmod) in the
+    same transaction that saves their recipes, and sent to the scraper as
+    `known` next time so unchanged ones are skipped. Pages that never got
+    saved (client gone, failed batch, invalid recipe) are fetched again.
+    """
+    for name in ("include", "exclude"):
+        try:
+            re.compile(getattr(req, name) or "")
+        except re.error as e:
+            raise HTTPException(status_code=400, detail=f"Invalid {name} pattern: {e}")
+
+    site = (req.url.host or "").lower()
+    known: dict = {}
+    if not req.full:
+        with engine.connect() as conn:
+            known = dict(
+                conn.execute(text("SELECT url, lastmod FROM crawl_pages WHERE site = :s"), {"s": site}).all()
+            )
+    try:
+        r = requests.post(
+            f"{RECIPE_SCRAPER_URL}/api/crawl",
+            json={**req.model_dump(mode="json", exclude={"tags"}), "known": known},
+            stream=True,
+            timeout=(10, 300),
+        )
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Scraper request failed: {e}")
+    if not r.ok:
+        r.close()
+        raise HTTPException(status_code=502, detail={"status": r.status_code, "error": r.text})
+
+    def events():
+        totals = {"inserted": 0, "updated": 0, "invalid": 0}
+        batch: List[RecipeImport] = []
+        pages: dict = {}  # delivered since the last flush: {url: (lastmod, has recipe)}
+
+        def flush():
+            if not batch:
+                # Only pages without recipes: nothing the views show changes
+                with engine.begin() as conn:
+                    _record_crawl_pages(conn, site, pages)
+                pages.clear()
+                return
+            rows = _import_rows(batch)
+            with views.write("recipes") as conn:
+                saved = _upsert_recipes(conn, rows)
+                _record_crawl_pages(conn, site, pages)
+            batch.clear()
+            pages.clear()
+            totals["inserted"] += saved["inserted"]
+            totals["updated"] += saved["updated"]
+            # Running totals, so the last event seen is always the current state
+            yield json.dumps({"type": "saved", "batch": len(saved["ids"]), **totals}) + "\n"
+
+        try:
+            for line in r.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                kind = event.get("type")
+                if kind == "recipe":
+                    item = _import_from_scrape(event.get("recipe"), event.get("url"), req.tags)
+                    if item is None:
+                        # Not recorded, so the page is looked at again next time
+                        totals["invalid"] += 1
+                        continue
+                    batch.append(item)
+                    pages[event["url"]] = (event.get("lastmod"), True)
+                else:
+                    if kind == "skipped":
+                        pages[event["url"]] = (event.get("lastmod"), False)
+                    elif kind == "summary":
+                        if batch or pages:
+                            yield from flush()
+                        event.update(totals)
+                    yield json.dumps(event) + "\n"
+                if len(batch) >= CRAWL_BATCH or len(pages) >= CRAWL_BATCH:
+                    yield from flush()
+            if batch or pages:
+                yield from flush()
+        except Exception as e:
+            yield json.dumps({"type": "error", "error": str(e), **totals}) + "\n"
+        finally:
+            r.close()
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.get("/api/cache")
+def cache_stats():
+    # Per worker: each request may land on a different process
+    return views.stats()
 
 
 # ---------------- Frontend ----------------
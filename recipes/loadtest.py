@@ -0,0 +1,224 @@
+"""
+Load test for a running recipes app: throughput, latency and stale reads.
+
+Reader threads mix the hot read endpoints (recipe list, recipe detail,
+planner picker, this week's meals, nutrition report) while one writer keeps
+renaming a probe recipe. Every read of the probe is checked against the
+writes that had already returned when the read started; with several
+workers, a stale cached view in any one of them shows up as a stale read.
+
+    python loadtest.py --url http://localhost:9100 --seconds 30 --concurrency 16
+    python loadtest.py --json
+
+Run it from another machine if possible: on the Pi itself the client
+competes with the workers for the same cores. The probe recipe is deleted
+at the end. Exits non-zero on errors or stale reads.
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+import requests
+
+PROBE_PREFIX = "loadtest probe #"
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] * 1000
+
+    return {"p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "max_ms": ordered[-1] * 1000}
+
+
+def probe_version(title: str) -> int:
+    return int(title[len(PROBE_PREFIX):]) if title.startswith(PROBE_PREFIX) else -1
+
+
+class LoadTest:
+    def __init__(self, url: str, seconds: float, concurrency: int, write_interval: float):
+        self.url = url.rstrip("/")
+        self.seconds = seconds
+        self.concurrency = concurrency
+        self.write_interval = write_interval
+        self.lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: List[str] = []
+        # (version, time the write returned) and (time the read started, version seen)
+        self.writes: List[Tuple[int, float]] = []
+        self.probe_reads: List[Tuple[float, int]] = []
+        self.probe_id = 0
+        self.stop = threading.Event()
+
+    def record(self, name: str, elapsed: float) -> None:
+        with self.lock:
+            self.samples.setdefault(name, []).append(elapsed)
+
+    def error(self, msg: str) -> None:
+        with self.lock:
+            if len(self.errors) < 50:
+                self.errors.append(msg)
+
+    def request(self, session: requests.Session, name: str, method: str, path: str, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            r = session.request(method, self.url + path, timeout=30, **kwargs)
+        except requests.RequestException as e:
+            self.error(f"{name}: {e}")
+            return None, t0
+        self.record(name, time.perf_counter() - t0)
+        if r.status_code >= 400:
+            self.error(f"{name}: HTTP {r.status_code} {r.text[:200]}")
+            return None, t0
+        return r.json(), t0
+
+    # ---------- workers ----------
+    def reader(self) -> None:
+        session = requests.Session()
+        rng = random.Random()
+        start = date.today()
+        week = {"start": start.isoformat(), "end": (start + timedelta(days=6)).isoformat()}
+        while not self.stop.is_set():
+            roll = rng.random()
+            if roll < 0.35:
+                data, t0 = self.request(session, "recipe", "GET", f"/api/recipes/{self.probe_id}")
+                if data is not None:
+                    with self.lock:
+                        self.probe_reads.append((t0, probe_version(data["title"])))
+            elif roll < 0.6:
+                data, t0 = self.request(session, "list", "GET", "/api/recipes")
+                if data is not None:
+                    seen = next((probe_version(r["title"]) for r in data if r["id"] == self.probe_id), -1)
+                    with self.lock:
+                        self.probe_reads.append((t0, seen))
+            elif roll < 0.75:
+                self.request(session, "picker", "GET", "/api/listRecipes")
+            elif roll < 0.9:
+                self.request(session, "meals", "GET", "/api/meals", params=week)
+            else:
+                self.request(session, "nutrition", "GET", "/api/meals/nutritionReport", params=week)
+
+    def writer(self) -> None:
+        session = requests.Session()
+        version = 0
+        while not self.stop.wait(self.write_interval):
+            version += 1
+            data, _ = self.request(
+                session, "write", "PUT", f"/api/recipes/{self.probe_id}", json={"title": f"{PROBE_PREFIX}{version}"}
+            )
+            if data is not None:
+                with self.lock:
+                    self.writes.append((version, time.perf_counter()))
+
+    # ---------- run ----------
+    def run(self) -> dict:
+        session = requests.Session()
+        created, _ = self.request(
+            session, "setup", "POST", "/api/recipes", json={"title": f"{PROBE_PREFIX}0", "tags": ["loadtest"]}
+        )
+        if created is None:
+            raise SystemExit(f"Could not create the probe recipe: {self.errors}")
+        self.probe_id = created["id"]
+        self.writes.append((0, time.perf_counter()))
+        self.samples.clear()
+
+        threads = [threading.Thread(target=self.reader, daemon=True) for _ in range(self.concurrency)]
+        threads.append(threading.Thread(target=self.writer, daemon=True))
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        time.sleep(self.seconds)
+        self.stop.set()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+
+        # A new connection each time, so the requests spread over the workers
+        cache = [
+            self.request(requests.Session(), "cache", "GET", "/api/cache", headers={"Connection": "close"})[0]
+            for _ in range(4 * self.concurrency)
+        ]
+        session.delete(f"{self.url}/api/recipes/{self.probe_id}", timeout=30)
+        return self.report(elapsed, [c for c in cache if c])
+
+    def stale_reads(self) -> List[dict]:
+        writes = sorted(self.writes, key=lambda w: w[1])
+        stale = []
+        for started, seen in self.probe_reads:
+            # Newest write that had returned before this read was sent
+            expected = max((v for v, done in writes if done <= started), default=0)
+            if seen < expected:
+                stale.append({"expected": expected, "seen": seen})
+        return stale
+
+    def report(self, elapsed: float, cache: List[dict]) -> dict:
+        reads = sum(len(v) for k, v in self.samples.items() if k not in ("write", "cache"))
+        workers = {c["pid"]: c for c in cache}
+        return {
+            "seconds": elapsed,
+            "concurrency": self.concurrency,
+            "reads_per_second": reads / elapsed if elapsed else 0.0,
+            "endpoints": {
+                name: {"requests": len(v), **percentiles(v)} for name, v in sorted(self.samples.items()) if name != "cache"
+            },
+            "writes": len(self.writes) - 1,
+            "probe_reads": len(self.probe_reads),
+            "stale_reads": self.stale_reads(),
+            "workers_seen": len(workers),
+            "cache": list(workers.values()),
+            "errors": self.errors,
+        }
+
+
+def print_report(result: dict) -> None:
+    print(
+        f"{result['reads_per_second']:.1f} reads/s over {result['seconds']:.1f}s "
+        f"with {result['concurrency']} clients, {result['workers_seen']} worker(s) answered"
+    )
+    for name, e in result["endpoints"].items():
+        print(
+            f"  {name:<10} {e['requests']:6d} req  p50 {e.get('p50_ms', 0):7.1f}  "
+            f"p95 {e.get('p95_ms', 0):7.1f}  p99 {e.get('p99_ms', 0):7.1f} ms"
+        )
+    for c in result["cache"]:
+        total = c["hits"] + c["misses"] + c["bypassed"]
+        rate = c["hits"] / total * 100 if total else 0.0
+        print(
+            f"  worker {c['pid']}: hit rate {rate:.0f}%, {c['invalidations']} invalidations, "
+            f"{c['notifications']} notifications, listening={c['listening']}"
+        )
+    print(f"  {result['writes']} writes, {result['probe_reads']} probe reads, {len(result['stale_reads'])} stale")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--url", default="http://localhost:9100")
+    ap.add_argument("--seconds", type=float, default=30)
+    ap.add_argument("--concurrency", type=int, default=16, help="reader threads")
+    ap.add_argument("--write-interval", type=float, default=0.2, help="seconds between probe renames")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    result = LoadTest(args.url, args.seconds, args.concurrency, args.write_interval).run()
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+        for stale in result["stale_reads"][:10]:
+            print(f"STALE expected version {stale['expected']}, got {stale['seen']}")
+        for e in result["errors"]:
+            print(f"FAIL {e}")
+    return 1 if result["errors"] or result["stale_reads"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import os
+import re
+import threading
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import text
+
+# Monthly partitions kept ready past the current month
+MEALS_PARTITION_AHEAD_MONTHS = int(os.getenv("MEALS_PARTITION_AHEAD_MONTHS", "6"))
+# Months older than this many months before the current one move to meals_archive; 0 keeps everything live
+MEALS_ARCHIVE_AFTER_MONTHS = int(os.getenv("MEALS_ARCHIVE_AFTER_MONTHS", "0"))
+
+# Live meals plus archived months, limited to [:start, :end]; for the nutrition reports
+MEALS_WITH_ARCHIVE = """(
+    SELECT id, day, person, servings, recipe_id FROM meals
+    WHERE day >= :start AND day <= :end
+    UNION ALL
+    SELECT a.id, a.day, a.person, a.servings, a.recipe_id
+    FROM meals_archive,
+         jsonb_to_recordset(meals_archive.meals)
+           AS a(id INTEGER, day DATE, person TEXT, servings DOUBLE PRECISION, recipe_id INTEGER)
+    WHERE meals_archive.month >= date_trunc('month', CAST(:start AS date)) AND meals_archive.month <= :end
+)"""
+
+_maintained: Optional[date] = None
+_maintain_lock = threading.Lock()
+
+
+def _month(d: date) -> date:
+    return d.replace(day=1)
+
+
+def _add_months(m: date, n: int) -> date:
+    y, mo = divmod(m.year * 12 + m.month - 1 + n, 12)
+    return date(y, mo + 1, 1)
+
+
+def _partition_name(m: date) -> str:
+    return f"meals_{m:%Y_%m}"
+
+
+def _partition_month(name: str) -> Optional[date]:
+    match = re.fullmatch(r"meals_(\d{4})_(\d{2})", name)
+    return date(int(match[1]), int(match[2]), 1) if match else None
+
+
+def partition_meals(conn) -> None:
+    """
+    Schema migration 5: turn the flat `meals` table into a table
+    partitioned by month.
+
+    The old table is renamed and attached as the DEFAULT partition of a
+    new `meals` with the same columns, defaults and id sequence. Its rows
+    move into monthly partitions afterwards, one short transaction per
+    month (see maintain_meal_partitions). The old indexes are renamed out
+    of the way and adopted by the parent's, created below, but the primary
+    key has to become (id, day): attaching builds that unique index over
+    every existing row while the table is locked (ACCESS EXCLUSIVE) for the
+    whole migration, so meal reads and writes wait for about as long as
+    building one index on `meals` takes (~0.4 s per million rows).
+    """
+    kind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass('meals')")
+    ).scalar()
+    if kind == "r":
+        conn.execute(text("ALTER TABLE meals RENAME TO meals_default"))
+        # The parent's key has to include day; attaching builds that one in its place
+        conn.execute(text("ALTER TABLE meals_default DROP CONSTRAINT meals_pkey"))
+        old_indexes = conn.execute(
+            text("SELECT indexname FROM pg_indexes WHERE tablename = 'meals_default' AND indexname LIKE 'idx_meals_%'")
+        ).scalars().all()
+        for name in old_indexes:
+            conn.execute(text(f"ALTER INDEX {name} RENAME TO {name.replace('idx_meals_', 'meals_default_', 1)}"))
+        conn.execute(text("CREATE TABLE meals (LIKE meals_default INCLUDING DEFAULTS) PARTITION BY RANGE (day)"))
+        conn.execute(text("ALTER TABLE meals ADD PRIMARY KEY (id, day)"))
+        conn.execute(text("ALTER SEQUENCE meals_id_seq OWNED BY meals.id"))
+        conn.execute(text("ALTER TABLE meals ATTACH PARTITION meals_default DEFAULT"))
+    else:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS meals_default PARTITION OF meals DEFAULT"))
+    for name, columns in (
+        ("idx_meals_day", "day"),
+        ("idx_meals_person_day", "person, day"),
+        ("idx_meals_recipe_id", "recipe_id"),
+        ("idx_meals_change_seq", "change_seq"),
+        ("idx_meals_updated_at", "updated_at"),
+    ):
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON meals({columns})"))
+
+    conn.execute(
+        text(
+            """
+            CREATE TABLE IF NOT EXISTS meals_archive (
+              month DATE PRIMARY KEY,
+              meals JSONB NOT NULL,
+              archived_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+            """
+        )
+    )
+    # lz4 is faster than the default pglz; not every server is built with it
+    has_lz4 = conn.execute(
+        text("SELECT 'lz4' = ANY(enumvals) FROM pg_settings WHERE name = 'default_toast_compression'")
+    ).scalar()
+    if has_lz4:
+        conn.execute(text("ALTER TABLE meals_archive ALTER COLUMN meals SET COMPRESSION lz4"))
+
+
+def _create_partition(conn, m: date, columns: str) -> int:
+    """Partition for month `m`, taking over its rows from the default partition."""
+    name = _partition_name(m)
+    if conn.execute(text("SELECT to_regclass(:n)"), {"n": name}).scalar():
+        return 0
+    lo, hi = m.isoformat(), _add_months(m, 1).isoformat()
+    conn.execute(text(f"CREATE TABLE {name} (LIKE meals INCLUDING DEFAULTS)"))
+    moved = conn.execute(
+        text(
+            f"""
+            WITH moved AS (
+              DELETE FROM meals_default WHERE day >= :lo AND day < :hi RETURNING {columns}
+            )
+            INSERT INTO {name} ({columns}) SELECT {columns} FROM moved
+            """
+        ),
+        {"lo": lo, "hi": hi},
+    ).rowcount
+    # Builds the parent's indexes on the new table
+    conn.execute(text(f"ALTER TABLE meals ATTACH PARTITION {name} FOR VALUES FROM ('{lo}') TO ('{hi}')"))
+    return moved
+
+
+def _archive_partition(conn, m: date) -> int:
+    """Detach month `m` and keep its rows, as one compressed JSONB array, in meals_archive."""
+    name = _partition_name(m)
+    if not conn.execute(text("SELECT to_regclass(:n)"), {"n": name}).scalar():
+        return 0
+    conn.execute(text(f"ALTER TABLE meals DETACH PARTITION {name}"))
+    archived = conn.execute(
+        text(
+            f"""
+            INSERT INTO meals_archive (month, meals)
+            SELECT :m, jsonb_agg(to_jsonb(p) ORDER BY p.day, p.id) FROM {name} p
+            HAVING COUNT(*) > 0
+            ON CONFLICT (month) DO UPDATE
+              SET meals = meals_archive.meals || EXCLUDED.meals, archived_at = NOW()
+            """
+        ),
+        {"m": m},
+    ).rowcount
+    conn.execute(text(f"DROP TABLE {name}"))
+    return archived
+
+
+def maintain_meal_partitions(engine, views, today: Optional[date] = None) -> dict:
+    """
+    Create the monthly partitions from the current month to
+    MEALS_PARTITION_AHEAD_MONTHS ahead, give rows that ended up in the
+    default partition (converted tables, days far out) partitions of their
+    own, and archive months past MEALS_ARCHIVE_AFTER_MONTHS.
+
+    Each month is its own meal write transaction (views.write), so writers
+    wait at most one month's move and nothing deadlocks with them; it also
+    re-checks what another worker may have done in the meantime.
+    """
+    current = _month(today or date.today())
+    with engine.connect() as conn:
+        existing = set(
+            conn.execute(
+                text(
+                    """
+                    SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                    WHERE i.inhparent = 'meals'::regclass AND c.relname <> 'meals_default'
+                    """
+                )
+            ).scalars()
+        )
+        archived = set(conn.execute(text("SELECT month FROM meals_archive")).scalars())
+        strays = set(
+            conn.execute(text("SELECT DISTINCT date_trunc('month', day)::date FROM meals_default")).scalars()
+        )
+        columns = ", ".join(
+            conn.execute(
+                text(
+                    """
+                    SELECT quote_ident(attname) FROM pg_attribute
+                    WHERE attrelid = 'meals'::regclass AND attnum > 0 AND NOT attisdropped
+                    ORDER BY attnum
+                    """
+                )
+            ).scalars()
+        )
+
+    wanted = {_add_months(current, i) for i in range(MEALS_PARTITION_AHEAD_MONTHS + 1)}
+    # Meals added to an archived month stay in the default partition, still live
+    wanted |= strays - archived
+    stats = {"created": 0, "moved": 0, "archived": 0}
+    for m in sorted(wanted):
+        if _partition_name(m) in existing:
+            continue
+        with views.write("meals") as conn:
+            stats["moved"] += _create_partition(conn, m, columns)
+        existing.add(_partition_name(m))
+        stats["created"] += 1
+
+    if MEALS_ARCHIVE_AFTER_MONTHS > 0:
+        cutoff = _add_months(current, -MEALS_ARCHIVE_AFTER_MONTHS)
+        for m in sorted(filter(None, map(_partition_month, existing))):
+            if m < cutoff:
+                with views.write("meals") as conn:
+                    stats["archived"] += _archive_partition(conn, m)
+    return stats
+
+
+def maintain_if_due(engine, views) -> None:
+    """Run maintain_meal_partitions once per month per worker (called before meal writes)."""
+    global _maintained
+    current = _month(date.today())
+    if _maintained == current:
+        return
+    with _maintain_lock:
+        if _maintained != current:
+            maintain_meal_partitions(engine, views, current)
+            _maintained = current
@@ -1,60 +1,73 @@
 from __future__ import annotations
 
+import time
 from datetime import date, datetime, timedelta
 from typing import Optional
 
-from fastapi import FastAPI, HTTPException, Query
+import numpy as np
+from fastapi import FastAPI, HTTPException, Query, Request
 from pydantic import BaseModel, Field
 from sqlalchemy import text
 
-
-DEFAULT_PERSON = "Household"
+from meal_partitions import MEALS_WITH_ARCHIVE, maintain_if_due
+from plan_generator import search_plan
+from streaming import stream_rows, wants_stream
+from sync import record_deletion
 
 
-def ensure_meal_planner_schema(engine) -> None:
-    with engine.begin() as conn:
-        conn.execute(
-            text(
-                """
-                CREATE TABLE IF NOT EXISTS meals (
-                  id SERIAL PRIMARY KEY,
-                  day DATE NOT NULL,
-                  slot TEXT NOT NULL,
-                  person TEXT NOT NULL DEFAULT 'Household',
-                  servings DOUBLE PRECISION NOT NULL DEFAULT 1,
-                  recipe_id INTEGER NOT NULL,
-                  notes TEXT,
-                  created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-                  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
-                )
-                """
+DEFAULT_PERSON = "Household"
+# Nutrients the planner can aim for (the report's), and those where only going over matters
+PLAN_NUTRIENTS = ("calories", "protein_g", "carbs_g", "fat_g", "fiber_g", "sugar_g", "sodium_mg")
+PLAN_CEILINGS = ("sugar_g", "sodium_mg")
+PLAN_MAX_DAYS = 31
+PLAN_MAX_PERSONS = 8
+PLAN_MAX_SLOTS = 8
+
+
+def create_meals_table(conn) -> None:
+    """Schema migration 1 (with the recipes table): meals as first shipped, later partitioned by month."""
+    conn.execute(
+        text(
+            """
+            CREATE TABLE IF NOT EXISTS meals (
+              id SERIAL PRIMARY KEY,
+              day DATE NOT NULL,
+              slot TEXT NOT NULL,
+              person TEXT NOT NULL DEFAULT 'Household',
+              servings DOUBLE PRECISION NOT NULL DEFAULT 1,
+              recipe_id INTEGER NOT NULL,
+              notes TEXT,
+              created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+              updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
             )
+            """
         )
-        conn.execute(
-            text(
-                """
-                ALTER TABLE meals
-                ADD COLUMN IF NOT EXISTS person TEXT NOT NULL DEFAULT 'Household'
-                """
-            )
+    )
+    conn.execute(
+        text(
+            """
+            ALTER TABLE meals
+            ADD COLUMN IF NOT EXISTS person TEXT NOT NULL DEFAULT 'Household'
+            """
         )
-        conn.execute(
-            text(
-                """
-                ALTER TABLE meals
-                ADD COLUMN IF NOT EXISTS servings DOUBLE PRECISION NOT NULL DEFAULT 1
-                """
-            )
+    )
+    conn.execute(
+        text(
+            """
+            ALTER TABLE meals
+            ADD COLUMN IF NOT EXISTS servings DOUBLE PRECISION NOT NULL DEFAULT 1
+            """
         )
-        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_meals_day ON meals(day)"))
-        conn.execute(
-            text(
-                "CREATE INDEX IF NOT EXISTS idx_meals_person_day ON meals(person, day)"
-            )
-        )
-        conn.execute(
-            text("CREATE INDEX IF NOT EXISTS idx_meals_recipe_id ON meals(recipe_id)")
+    )
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_meals_day ON meals(day)"))
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS idx_meals_person_day ON meals(person, day)"
         )
+    )
+    conn.execute(
+        text("CREATE INDEX IF NOT EXISTS idx_meals_recipe_id ON meals(recipe_id)")
+    )
 
 
 class MealCreate(BaseModel):
@@ -85,6 +98,8 @@ class MealOut(BaseModel):
     notes: Optional[str] = None
     created_at: datetime
     updated_at: datetime
+    # Filled in by GET /api/meals only
+    recipe_title: Optional[str] = None
 
 class RecipeListItem(BaseModel):
     id: int
@@ -116,6 +131,47 @@ class NutritionReport(BaseModel):
     end: date
     totals: NutritionTotals
 
+class PlanTargets(BaseModel):
+    # per person and day; sugar and sodium are ceilings
+    calories: Optional[float] = Field(default=None, gt=0)
+    protein_g: Optional[float] = Field(default=None, gt=0)
+    carbs_g: Optional[float] = Field(default=None, gt=0)
+    fat_g: Optional[float] = Field(default=None, gt=0)
+    fiber_g: Optional[float] = Field(default=None, gt=0)
+    sugar_g: Optional[float] = Field(default=None, gt=0)
+    sodium_mg: Optional[float] = Field(default=None, gt=0)
+
+class PlanGenerate(BaseModel):
+    start: date
+    end: date
+    persons: list[str] = [DEFAULT_PERSON]
+    slots: list[str] = ["breakfast", "lunch", "dinner"]
+    targets: PlanTargets
+    person_targets: dict[str, PlanTargets] = {}  # overrides `targets` for these persons
+    servings: float = Field(default=1, gt=0)  # per planned meal
+    no_repeat_days: int = Field(default=3, ge=0, le=28)  # 1 = not twice on the same day
+    # Candidates per slot by tag. Without an entry, recipes tagged with the slot's name
+    # ("breakfast") are used if there are any, otherwise all recipes with nutrition
+    slot_tags: dict[str, list[str]] = {}
+    replace: bool = False  # delete the meals already in these cells instead of planning around them
+    dry_run: bool = False
+    seed: Optional[int] = None
+
+class PlannedDay(BaseModel):
+    day: date
+    person: str
+    totals: dict[str, float]
+    targets: dict[str, float]
+
+class PlanOut(BaseModel):
+    meals: list[MealOut]  # id 0 when dry_run
+    days: list[PlannedDay]
+    candidates: int
+    unfilled: int  # free cells no recipe fits
+    repeats: int  # cells where the variety rule could not be kept
+    cost: float
+    seconds: float
+
 def _normalize_slot(slot: str) -> str:
     slot = (slot or "").strip().lower()
     slot = " ".join(slot.split())
@@ -153,24 +209,29 @@ def _ensure_recipe_exists(engine, recipe_id: int) -> None:
         raise HTTPException(status_code=400, detail="Recipe does not exist")
 
 
-def register_meal_planner_routes(app: FastAPI, engine) -> None:
+def register_meal_planner_routes(app: FastAPI, engine, views) -> None:
     @app.get("/api/listRecipes", response_model=list[RecipeListItem])
     def list_recipes():
-        with engine.connect() as conn:
-            rows = (
-                conn.execute(
-                    text("SELECT id, title FROM recipes ORDER BY title ASC")
+        def load():
+            with engine.connect() as conn:
+                rows = (
+                    conn.execute(
+                        text("SELECT id, title FROM recipes ORDER BY title ASC")
+                    )
+                    .mappings()
+                    .all()
                 )
-                .mappings()
-                .all()
-            )
-        return [RecipeListItem(**dict(r)) for r in rows]
+            return [RecipeListItem(**dict(r)) for r in rows]
+
+        return views.get(("recipes",), ("recipe_titles",), load)
     
     @app.get("/api/meals", response_model=list[MealOut])
     def list_meals(
+        request: Request,
         start: Optional[date] = Query(default=None),
         end: Optional[date] = Query(default=None),
         person: Optional[str] = Query(default=None),
+        stream: Optional[bool] = Query(default=None, description="NDJSON, one meal per line (or Accept: application/x-ndjson)"),
     ):
         if start is None and end is None:
             start = date.today()
@@ -181,25 +242,32 @@ def register_meal_planner_routes(app: FastAPI, engine) -> None:
         where = []
         params = {}
         if start is not None:
-            where.append("day >= :start")
+            where.append("m.day >= :start")
             params["start"] = start
         if end is not None:
-            where.append("day <= :end")
+            where.append("m.day <= :end")
             params["end"] = end
         if person:
             person = _normalize_person(person)
             if person != DEFAULT_PERSON:
-                where.append("person = :person")
+                where.append("m.person = :person")
                 params["person"] = person
 
-        sql = "SELECT * FROM meals"
+        # Titles come along, so the planner doesn't fetch each recipe
+        sql = "SELECT m.*, r.title AS recipe_title FROM meals m LEFT JOIN recipes r ON r.id = m.recipe_id"
         if where:
             sql += " WHERE " + " AND ".join(where)
-        sql += " ORDER BY day ASC, slot ASC, id ASC"
+        sql += " ORDER BY m.day ASC, m.slot ASC, m.id ASC"
 
-        with engine.connect() as conn:
-            rows = conn.execute(text(sql), params).mappings().all()
-        return [MealOut(**dict(r)) for r in rows]
+        if wants_stream(request, stream):
+            return stream_rows(engine, sql, params, lambda row: MealOut(**dict(row)).model_dump_json())
+
+        def load():
+            with engine.connect() as conn:
+                rows = conn.execute(text(sql), params).mappings().all()
+            return [MealOut(**dict(r)) for r in rows]
+
+        return views.get(("meals", "recipes"), ("meals", start, end, params.get("person")), load)
 
     @app.post("/api/meals", response_model=MealOut)
     def create_meal(body: MealCreate):
@@ -207,8 +275,9 @@ def register_meal_planner_routes(app: FastAPI, engine) -> None:
         person = _normalize_person(body.person)
         servings = _normalize_servings(body.servings)
         _ensure_recipe_exists(engine, body.recipe_id)
+        maintain_if_due(engine, views)
 
-        with engine.begin() as conn:
+        with views.write("meals") as conn:
             row = (
                 conn.execute(
                     text(
@@ -264,8 +333,9 @@ def register_meal_planner_routes(app: FastAPI, engine) -> None:
 
         if recipe_id != existing["recipe_id"]:
             _ensure_recipe_exists(engine, recipe_id)
+        maintain_if_due(engine, views)
 
-        with engine.begin() as conn:
+        with views.write("meals") as conn:
             row = (
                 conn.execute(
                     text(
@@ -277,7 +347,8 @@ def register_meal_planner_routes(app: FastAPI, engine) -> None:
                             servings = :servings,
                             recipe_id = :recipe_id,
                             notes = :notes,
-                            updated_at = NOW()
+                            updated_at = NOW(),
+                            change_seq = nextval('change_seq')
                         WHERE id = :id
                         RETURNING *
                         """
@@ -299,16 +370,19 @@ def register_meal_planner_routes(app: FastAPI, engine) -> None:
 
     @app.get("/api/people", response_model=list[str])
     def list_people():
-        with engine.connect() as conn:
-            rows = (
-                conn.execute(
-                    text(
-                        "SELECT DISTINCT person FROM meals WHERE person IS NOT NULL ORDER BY person ASC"
+        def load():
+            with engine.connect() as conn:
+                return (
+                    conn.execute(
+                        text(
+                            "SELECT DISTINCT person FROM meals WHERE person IS NOT NULL ORDER BY person ASC"
+                        )
                     )
+                    .mappings()
+                    .all()
                 )
-                .mappings()
-                .all()
-            )
+
+        rows = views.get(("meals",), ("people",), load)
         people = [r["person"] for r in rows if r.get("person")]
         if not people:
             return [DEFAULT_PERSON]
@@ -318,8 +392,10 @@ def register_meal_planner_routes(app: FastAPI, engine) -> None:
 
     @app.delete("/api/meals/{meal_id}")
     def delete_meal(meal_id: int):
-        with engine.begin() as conn:
+        with views.write("meals") as conn:
             res = conn.execute(text("DELETE FROM meals WHERE id = :id"), {"id": meal_id})
+            if res.rowcount:
+                record_deletion(conn, "meal", meal_id)
         if res.rowcount == 0:
             raise HTTPException(status_code=404, detail="Meal not found")
         return {"ok": True}
@@ -354,17 +430,20 @@ def register_meal_planner_routes(app: FastAPI, engine) -> None:
         COALESCE(SUM(COALESCE((r.nutrition_json::jsonb ->> 'sugar_g')::double precision, 0) * COALESCE(m.servings, 1)), 0) AS sugar_g,
         COALESCE(SUM(COALESCE((r.nutrition_json::jsonb ->> 'sodium_mg')::double precision, 0) * COALESCE(m.servings, 1)), 0) AS sodium_mg
 
-        FROM meals m
+        FROM {MEALS_WITH_ARCHIVE} m
         JOIN recipes r ON m.recipe_id = r.id
         WHERE m.day >= :start AND m.day <= :end {person_filter}
         GROUP BY m.day
         ORDER BY m.day ASC
         """
 
-        with engine.connect() as conn:
-            rows = conn.execute(text(sql), params).mappings().all()
+        def load():
+            with engine.connect() as conn:
+                rows = conn.execute(text(sql), params).mappings().all()
+            return [NutritionDayTotals(**dict(r)) for r in rows]
 
-        return [NutritionDayTotals(**dict(r)) for r in rows]
+        # Depends on recipe nutrition as well as the meals
+        return views.get(("meals", "recipes"), ("nutrition_daily", start, end, params.get("person")), load)
 
     
     @app.get("/api/meals/nutritionReport", response_model=NutritionReport)
@@ -396,13 +475,197 @@ def register_meal_planner_routes(app: FastAPI, engine) -> None:
         COALESCE(SUM(COALESCE((r.nutrition_json::jsonb ->> 'sugar_g')::double precision, 0) * COALESCE(m.servings, 1)), 0) AS sugar_g,
         COALESCE(SUM(COALESCE((r.nutrition_json::jsonb ->> 'sodium_mg')::double precision, 0) * COALESCE(m.servings, 1)), 0) AS sodium_mg
 
-        FROM meals m
+        FROM {MEALS_WITH_ARCHIVE} m
         JOIN recipes r ON m.recipe_id = r.id
         WHERE m.day >= :start AND m.day <= :end {person_filter}
         """
 
+        def load():
+            with engine.connect() as conn:
+                row = conn.execute(text(sql), params).mappings().first()
+            return NutritionReport(start=start, end=end, totals=NutritionTotals(**dict(row)))
+
+        return views.get(("meals", "recipes"), ("nutrition", start, end, params.get("person")), load)
+
+    def load_plan_candidates():
+        columns = ",\n".join(
+            f"COALESCE((nutrition_json::jsonb ->> '{n}')::double precision, 0) AS {n}" for n in PLAN_NUTRIENTS
+        )
         with engine.connect() as conn:
-            row = conn.execute(text(sql), params).mappings().first()
+            rows = conn.execute(
+                text(
+                    f"""
+                    SELECT id, tags, {columns}
+                    FROM recipes
+                    WHERE nutrition_json IS NOT NULL
+                      AND COALESCE((nutrition_json::jsonb ->> 'calories')::double precision, 0) > 0
+                    ORDER BY id
+                    """
+                )
+            ).all()
+        ids = np.array([r[0] for r in rows], dtype=np.int64)
+        tags = [frozenset(t.strip() for t in (r[1] or "").split(",") if t.strip()) for r in rows]
+        per_serving = np.array([r[2:] for r in rows], dtype=float).reshape(len(rows), len(PLAN_NUTRIENTS))
+        return ids, tags, per_serving
+
+    @app.post("/api/planner/generate", response_model=PlanOut)
+    def generate_plan(body: PlanGenerate):
+        """
+        Fill the free (person, day, slot) cells of a date range with recipes
+        whose nutrition brings each day close to the targets, and save them
+        in one insert (unless dry_run). Meals already planned stay and count
+        towards their day, unless replace is set.
+        """
+        t0 = time.perf_counter()
+        if body.end < body.start:
+            raise HTTPException(status_code=400, detail="end must be >= start")
+        n_days = (body.end - body.start).days + 1
+        if n_days > PLAN_MAX_DAYS:
+            raise HTTPException(status_code=400, detail=f"At most {PLAN_MAX_DAYS} days per plan")
+        persons = list(dict.fromkeys(_normalize_person(p) for p in body.persons))
+        slots = list(dict.fromkeys(_normalize_slot(s) for s in body.slots))
+        if not persons or not slots:
+            raise HTTPException(status_code=400, detail="persons and slots are required")
+        if len(persons) > PLAN_MAX_PERSONS or len(slots) > PLAN_MAX_SLOTS:
+            raise HTTPException(
+                status_code=400, detail=f"At most {PLAN_MAX_PERSONS} persons and {PLAN_MAX_SLOTS} slots"
+            )
+        person_targets = {_normalize_person(k): v for k, v in body.person_targets.items()}
+        targets = np.array(
+            [
+                [getattr(person_targets.get(p, body.targets), n) or np.nan for n in PLAN_NUTRIENTS]
+                for p in persons
+            ]
+        )
+        if np.isnan(targets).all():
+            raise HTTPException(status_code=400, detail="Give at least one target")
+
+        # Loaded once per worker until a recipe changes
+        ids, tags, per_serving = views.get(("recipes",), ("plan_candidates",), load_plan_candidates)
+        if not len(ids):
+            raise HTTPException(status_code=400, detail="No recipes with nutrition to plan from")
+        index = {int(rid): i for i, rid in enumerate(ids)}
+
+        allowed = np.zeros((len(slots), len(ids)), dtype=bool)
+        for s, slot in enumerate(slots):
+            wanted = {t.strip().lower() for t in body.slot_tags.get(slot, []) if t.strip()}
+            if not wanted and any(slot in t for t in tags):
+                wanted = {slot}
+            allowed[s] = [bool(t & wanted) for t in tags] if wanted else True
+
+        # Meals already planned around the range matter for variety, inside it for the totals too
+        pad = max(body.no_repeat_days - 1, 0)
+        first = body.start - timedelta(days=pad)
+        with engine.connect() as conn:
+            existing = conn.execute(
+                text(
+                    f"""
+                    SELECT m.day, m.slot, m.person, m.servings, m.recipe_id,
+                           {", ".join(f"COALESCE((r.nutrition_json::jsonb ->> '{n}')::double precision, 0) AS {n}" for n in PLAN_NUTRIENTS)}
+                    FROM meals m
+                    LEFT JOIN recipes r ON r.id = m.recipe_id
+                    WHERE m.day >= :first AND m.day <= :last AND m.person = ANY(:persons)
+                    """
+                ),
+                {"first": first, "last": body.end + timedelta(days=pad), "persons": persons},
+            ).mappings().all()
+
+        free = np.ones((len(persons), n_days, len(slots)), dtype=bool)
+        base = np.zeros((len(persons), n_days, len(PLAN_NUTRIENTS)))
+        used = np.zeros((len(persons), n_days + 2 * pad, len(ids)), dtype=np.int32)
+        p_index = {p: i for i, p in enumerate(persons)}
+        s_index = {s: i for i, s in enumerate(slots)}
+        for m in existing:
+            p, d = p_index[m["person"]], (m["day"] - body.start).days
+            in_range = 0 <= d < n_days
+            if body.replace and in_range and m["slot"] in s_index:
+                continue  # about to be deleted
+            if m["recipe_id"] in index:
+                used[p, d + pad, index[m["recipe_id"]]] += 1
+            if in_range:
+                base[p, d] += np.array([m[n] for n in PLAN_NUTRIENTS]) * m["servings"]
+                if m["slot"] in s_index:
+                    free[p, d, s_index[m["slot"]]] = False
+
+        assign, cost, repeats = search_plan(
+            per_serving * body.servings,
+            targets,
+            np.array([n in PLAN_CEILINGS for n in PLAN_NUTRIENTS]),
+            allowed,
+            free,
+            base,
+            used,
+            body.no_repeat_days,
+            seed=body.seed,
+        )
 
-        totals = NutritionTotals(**dict(row))
-        return NutritionReport(start=start, end=end, totals=totals)
+        planned = [
+            {
+                "day": body.start + timedelta(days=int(d)),
+                "slot": slots[s],
+                "person": persons[p],
+                "servings": body.servings,
+                "recipe_id": int(ids[assign[p, d, s]]),
+            }
+            for p, d, s in np.argwhere(assign >= 0)
+        ]
+        if body.dry_run:
+            now = datetime.utcnow()
+            meals = [MealOut(id=0, created_at=now, updated_at=now, **m) for m in planned]
+        else:
+            maintain_if_due(engine, views)
+            with views.write("meals") as conn:
+                if body.replace:
+                    deleted = conn.execute(
+                        text(
+                            """
+                            DELETE FROM meals
+                            WHERE day >= :start AND day <= :end AND person = ANY(:persons) AND slot = ANY(:slots)
+                            RETURNING id
+                            """
+                        ),
+                        {"start": body.start, "end": body.end, "persons": persons, "slots": slots},
+                    ).scalars().all()
+                    for meal_id in deleted:
+                        record_deletion(conn, "meal", meal_id)
+                rows = []
+                if planned:
+                    params = {}
+                    values = []
+                    for i, m in enumerate(planned):
+                        values.append(f"(:day_{i}, :slot_{i}, :person_{i}, :servings_{i}, :recipe_id_{i})")
+                        params.update({f"{k}_{i}": v for k, v in m.items()})
+                    rows = conn.execute(
+                        text(
+                            f"""
+                            INSERT INTO meals (day, slot, person, servings, recipe_id)
+                            VALUES {", ".join(values)}
+                            RETURNING *
+                            """
+                        ),
+                        params,
+                    ).mappings().all()
+            meals = sorted((MealOut(**dict(r)) for r in rows), key=lambda m: (m.day, m.person, m.slot))
+
+        totals = base.copy()
+        for p, d, s in np.argwhere(assign >= 0):
+            totals[p, d] += per_serving[assign[p, d, s]] * body.servings
+        days = [
+            PlannedDay(
+                day=body.start + timedelta(days=d),
+                person=person,
+                totals={n: round(float(v), 1) for n, v in zip(PLAN_NUTRIENTS, totals[p, d])},
+                targets={n: float(v) for n, v in zip(PLAN_NUTRIENTS, targets[p]) if not np.isnan(v)},
+            )
+            for p, person in enumerate(persons)
+            for d in range(n_days)
+        ]
+        return PlanOut(
+            meals=meals,
+            days=days,
+            candidates=len(ids),
+            unfilled=int(free.sum() - (assign >= 0).sum()),
+            repeats=repeats,
+            cost=round(cost, 4),
+            seconds=round(time.perf_counter() - t0, 3),
+        )
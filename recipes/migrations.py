@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import time
+from typing import Callable, NamedTuple, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
+
+# Serialises migrations when several workers start at once
+SCHEMA_LOCK_KEY = 0x7265636970  # "recip"
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable  # (conn) -> None, runs inside the migration's transaction
+
+
+def schema_version(engine) -> int:
+    """Highest applied migration; 0 before the first run (or on databases from before versioning)."""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+    except ProgrammingError:  # no schema_version table yet
+        return 0
+
+
+def migrate(engine, migrations: Sequence[Migration]) -> list[int]:
+    """
+    Bring the schema up to the last of `migrations`; returns the versions applied.
+
+    When it is current this is one query and takes no locks, so restarts
+    and workers booting together don't queue behind DDL. Otherwise the
+    pending migrations run under an advisory lock, in order, each in its
+    own transaction together with its schema_version row: a failed one
+    leaves the versions before it applied and is retried on the next boot.
+    Workers that waited for the lock re-read the version and find nothing
+    left to do.
+
+    Migrations must never be edited or renumbered once released; add a new
+    one instead. Those up to 5 were written as idempotent steps because
+    databases from before versioning have (some of) them already.
+    """
+    latest = max(m.version for m in migrations)
+    if schema_version(engine) >= latest:
+        return []
+
+    applied = []
+    with engine.connect() as lock_conn:
+        lock_conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": SCHEMA_LOCK_KEY})
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    text(
+                        """
+                        CREATE TABLE IF NOT EXISTS schema_version (
+                          version INTEGER PRIMARY KEY,
+                          name TEXT NOT NULL,
+                          applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                          seconds DOUBLE PRECISION NOT NULL
+                        )
+                        """
+                    )
+                )
+            current = schema_version(engine)
+            for m in sorted(migrations, key=lambda m: m.version):
+                if m.version <= current:
+                    continue
+                t0 = time.perf_counter()
+                with engine.begin() as conn:
+                    m.apply(conn)
+                    conn.execute(
+                        text("INSERT INTO schema_version (version, name, seconds) VALUES (:v, :n, :s)"),
+                        {"v": m.version, "n": m.name, "s": round(time.perf_counter() - t0, 3)},
+                    )
+                applied.append(m.version)
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": SCHEMA_LOCK_KEY})
+    return applied
@@ -0,0 +1,533 @@
+"""
+Nutrition estimates from ingredient lines, for recipes that come without a
+nutrition block.
+
+Each line ("1 1/2 cups all-purpose flour, sifted") is parsed into a quantity,
+a unit and a food, which is matched against the bundled table in
+data/nutrients.csv (per-100 g values in the style of USDA SR Legacy, one row
+per food with its aliases and the weight of one piece, one cup and one can).
+Quantities become grams, and a batch of recipes is evaluated as one matrix
+product: (recipes x foods, grams) @ (foods x nutrients, per gram).
+
+Everything runs offline. Parsing is cached per line, so a backfill of
+thousands of recipes takes seconds.
+
+    python nutrition.py "2 cups flour" "3 eggs" "1 cup milk" --servings 4
+    python nutrition.py --bench 5000
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import re
+import sys
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from fastapi import FastAPI, Query
+from pydantic import BaseModel
+from sqlalchemy import text
+
+HERE = Path(__file__).resolve().parent
+NUTRIENTS_CSV = os.getenv("NUTRIENTS_CSV", str(HERE / "data" / "nutrients.csv"))
+# Estimates that account for fewer of a recipe's ingredient lines than this are not stored
+NUTRITION_MIN_COVERAGE = float(os.getenv("NUTRITION_MIN_COVERAGE", "0.6"))
+# Recipes per matrix product
+BATCH = 4096
+BACKFILL_CHUNK = 1000
+
+# Table columns, named as in NutritionFacts
+NUTRIENTS = (
+    "calories",
+    "protein_g",
+    "fat_g",
+    "saturated_fat_g",
+    "carbs_g",
+    "sugar_g",
+    "fiber_g",
+    "sodium_mg",
+    "cholesterol_mg",
+    "potassium_mg",
+    "calcium_mg",
+    "iron_mg",
+    "vitamin_c_mg",
+)
+
+ML_PER_CUP = 236.6
+DEFAULT_CAN_G = 400.0
+
+# unit -> (kind, amount)
+#   g:     grams per unit
+#   ml:    millilitres per unit (grams via the food's density)
+#   can:   the food's can weight
+#   box:   a container of `amount` grams unless its size is given ("1 (8 oz) package")
+#   each:  the food's piece weight; `amount` when the food has none
+#   count: `amount` pieces
+UNITS: Dict[str, Tuple[str, Optional[float]]] = {}
+for _names, _unit in (
+    (("g", "gr", "gram", "grams", "gramme", "grammes"), ("g", 1.0)),
+    (("kg", "kgs", "kilo", "kilos", "kilogram", "kilograms"), ("g", 1000.0)),
+    (("mg", "milligram", "milligrams"), ("g", 0.001)),
+    (("oz", "ounce", "ounces"), ("g", 28.35)),
+    (("lb", "lbs", "pound", "pounds"), ("g", 453.6)),
+    (("ml", "mls", "milliliter", "milliliters", "millilitre", "millilitres", "cc"), ("ml", 1.0)),
+    (("cl", "centiliter", "centilitre"), ("ml", 10.0)),
+    (("dl", "deciliter", "decilitre"), ("ml", 100.0)),
+    (("l", "liter", "liters", "litre", "litres"), ("ml", 1000.0)),
+    (("tsp", "tsps", "teaspoon", "teaspoons"), ("ml", 4.93)),
+    (("tbsp", "tbsps", "tbs", "tbl", "tbls", "tablespoon", "tablespoons"), ("ml", 14.79)),
+    (("c", "cup", "cups"), ("ml", ML_PER_CUP)),
+    (("pint", "pints", "pt"), ("ml", 473.2)),
+    (("quart", "quarts", "qt"), ("ml", 946.4)),
+    (("gallon", "gallons", "gal"), ("ml", 3785.0)),
+    (("carton", "cartons"), ("ml", 946.4)),
+    (("can", "cans", "tin", "tins"), ("can", None)),
+    (("jar", "jars"), ("box", 400.0)),
+    (("package", "packages", "pkg", "pkgs", "pack", "packs", "bag", "bags", "box", "boxes"), ("box", 250.0)),
+    (("packet", "packets", "envelope", "envelopes", "sachet", "sachets"), ("box", 7.0)),
+    (("stick", "sticks"), ("g", 113.0)),
+    (("pinch", "pinches"), ("g", 0.36)),
+    (("dash", "dashes"), ("g", 0.6)),
+    (("handful", "handfuls"), ("g", 30.0)),
+    (("bunch", "bunches"), ("g", 60.0)),
+    (("knob", "knobs"), ("g", 15.0)),
+    (("sprig", "sprigs"), ("g", 1.0)),
+    (("clove", "cloves"), ("each", 3.0)),
+    (("slice", "slices"), ("each", 25.0)),
+    (("stalk", "stalks", "rib", "ribs"), ("each", 40.0)),
+    (("block", "blocks"), ("each", 225.0)),
+    (("piece", "pieces", "pc", "pcs", "fillet", "fillets", "filet", "filets"), ("each", None)),
+    (("link", "links", "ear", "ears", "spear", "spears", "leaf", "leaves"), ("each", None)),
+    (("dozen",), ("count", 12.0)),
+):
+    for _name in _names:
+        UNITS[_name] = _unit
+# A head of garlic is not one clove: at least this much
+HEAD_MIN_G = 40.0
+HEADS = {"head", "heads", "bulb", "bulbs"}
+
+SIZES = {"small": 0.75, "medium": 1.0, "large": 1.25, "big": 1.25, "extra-large": 1.5, "jumbo": 1.6}
+# Skipped between the quantity and the unit
+FILLER = {"heaping", "heaped", "rounded", "level", "scant", "generous", "good", "about", "approx", "approximately"}
+NUMBER_WORDS = {
+    "a": 1.0, "an": 1.0, "one": 1.0, "two": 2.0, "three": 3.0, "four": 4.0, "five": 5.0, "six": 6.0,
+    "seven": 7.0, "eight": 8.0, "nine": 9.0, "ten": 10.0, "eleven": 11.0, "twelve": 12.0, "half": 0.5,
+}
+STOPWORDS = {"of", "a", "an", "the", "and", "or", "for", "to", "with", "into", "in", "about", "plus"}
+FRACTIONS = {
+    "½": " 1/2", "⅓": " 1/3", "⅔": " 2/3", "¼": " 1/4", "¾": " 3/4", "⅕": " 1/5", "⅙": " 1/6",
+    "⅚": " 5/6", "⅛": " 1/8", "⅜": " 3/8", "⅝": " 5/8", "⅞": " 7/8", "⁄": "/",
+}
+
+_NUM = r"(?:\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?|\.\d+)"
+_QTY = re.compile(rf"^({_NUM})(?:\s*(?:-|–|to|or)\s*({_NUM}))?\s*")
+_SIZE = r"(\d+(?:\.\d+)?)\s*-?\s*(g|grams?|kg|oz|ounces?|lbs?|pounds?|ml|millilit(?:er|re)s?)\.?"
+_PAREN = re.compile(r"\(([^)]*)\)")
+_PAREN_SIZE = re.compile(rf"{_SIZE}(?![a-z])")
+# "2 14.5-ounce cans", "1 400g tin"
+_CONTAINER = re.compile(
+    rf"{_SIZE}\s+(?=(?:cans?|tins?|jars?|packages?|pkgs?|packs?|bags?|box|boxes|cartons?|blocks?)\b)"
+)
+# "juice of 1 lemon" -> "1 lemon juice"
+_JUICE_OF = re.compile(r"^(juice|zest)\s+(?:and\s+(?:juice|zest)\s+)?of\s+(\S+)\s+(.*)$")
+_WORD = re.compile(r"[a-z0-9%àâçéèêëîïôûùüÿñæœ]+")
+
+
+def _number(s: str) -> float:
+    s = s.strip()
+    if " " in s:
+        whole, frac = s.split(None, 1)
+        return float(whole) + _number(frac)
+    if "/" in s:
+        num, den = s.split("/", 1)
+        return float(num) / float(den) if float(den) else 0.0
+    return float(s)
+
+
+def _singular(w: str) -> str:
+    # Only has to agree with itself: aliases and lines go through the same rules
+    if len(w) <= 3 or w.endswith(("ss", "us", "is")):
+        return w
+    if w.endswith("ies"):
+        return w[:-3] + "y"
+    if w.endswith(("oes", "ches", "shes", "xes")):
+        return w[:-2]
+    if w.endswith("s"):
+        return w[:-1]
+    return w
+
+
+def _tokens(s: str) -> Tuple[str, ...]:
+    words = _WORD.findall(s.lower().replace("'", "").replace("’", ""))
+    return tuple(_singular(w) for w in words if w not in STOPWORDS and not w.isdigit())
+
+
+def _size_amount(amount: str, unit: str) -> Tuple[float, bool]:
+    """A stated size as (grams, False), or (millilitres, True) for a volume."""
+    unit = unit.rstrip(".")
+    if unit.startswith(("ml", "millilit")):
+        return float(amount), True
+    if unit.startswith("gram"):
+        unit = "g"
+    return float(amount) * UNITS[unit][1], False
+
+
+class NutrientTable:
+    """The foods of data/nutrients.csv as arrays, plus an alias index for matching."""
+
+    def __init__(self, path: str = NUTRIENTS_CSV):
+        names: List[str] = []
+        each: List[float] = []
+        per_cup: List[float] = []
+        per_can: List[float] = []
+        values: List[List[float]] = []
+        self.index: Dict[Tuple[str, ...], int] = {}
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                i = len(names)
+                names.append(row["name"])
+                each.append(float(row["grams_each"] or "nan"))
+                per_cup.append(float(row["grams_per_cup"] or "nan"))
+                per_can.append(float(row["grams_per_can"] or "nan"))
+                values.append([float(row[n] or 0) for n in NUTRIENTS])
+                for alias in [row["name"]] + [a for a in row["aliases"].split("|") if a.strip()]:
+                    # The first row to claim an alias keeps it
+                    self.index.setdefault(_tokens(alias), i)
+        self.names = names
+        self.grams_each = np.array(each)
+        self.grams_per_cup = np.array(per_cup)
+        self.grams_per_can = np.array(per_can)
+        # foods x nutrients, per gram
+        self.per_gram = np.array(values) / 100.0
+        self.longest_alias = max(len(k) for k in self.index)
+
+    def match(self, s: str) -> int:
+        """Index of the food named in s (the longest alias wins, then the earliest), or -1."""
+        words = _tokens(s)
+        for n in range(min(self.longest_alias, len(words)), 0, -1):
+            for start in range(len(words) - n + 1):
+                i = self.index.get(words[start : start + n])
+                if i is not None:
+                    return i
+        return -1
+
+    def density(self, food: int) -> float:
+        """Grams per millilitre; water's when the table has no cup weight."""
+        per_cup = self.grams_per_cup[food]
+        return 1.0 if np.isnan(per_cup) else float(per_cup) / ML_PER_CUP
+
+
+TABLE = NutrientTable()
+
+
+@lru_cache(maxsize=65536)
+def parse_line(line: str) -> Optional[Tuple[int, Optional[float]]]:
+    """
+    (food index or -1, grams or None when the amount can't be worked out)
+    for one ingredient line, or None for lines that aren't ingredients
+    ("For the sauce:"). A food without a quantity ("salt to taste") counts
+    as 0 g.
+    """
+    s = line.strip().lower()
+    for k, v in FRACTIONS.items():
+        s = s.replace(k, v)
+    s = s.lstrip("-*•·▢ \t").strip()
+    if not s or s.endswith(":") or not re.search(r"[a-z]", s):
+        return None
+    m = _JUICE_OF.match(s)
+    if m:
+        s = f"{m.group(2)} {m.group(3)} {m.group(1)}"
+
+    # A stated size ("1 (15 oz) can", "2 14-ounce cans", "1 cup (120 g)") beats any conversion
+    stated: Optional[Tuple[float, bool]] = None
+    m = _CONTAINER.search(s)
+    if m:
+        stated = _size_amount(m.group(1), m.group(2))
+        s = s[: m.start()] + s[m.end() :]
+    else:
+        for p in _PAREN.finditer(s):
+            pm = _PAREN_SIZE.search(p.group(1))
+            if pm:
+                stated = _size_amount(pm.group(1), pm.group(2))
+                break
+    s = _PAREN.sub(" ", s).strip()
+
+    qty: Optional[float] = None
+    m = _QTY.match(s)
+    if m:
+        qty = _number(m.group(1))
+        if m.group(2):
+            qty = (qty + _number(m.group(2))) / 2
+        s = s[m.end() :]
+    words = s.split()
+    if qty is None and words and words[0] in NUMBER_WORDS:
+        qty = NUMBER_WORDS[words.pop(0)]
+
+    size = 1.0
+    unit: Optional[str] = None
+    while words:
+        w = words[0].rstrip(".,")
+        if w in FILLER:
+            words.pop(0)
+        elif w in SIZES:
+            size = SIZES[w]
+            words.pop(0)
+        elif w == "extra" and len(words) > 1 and words[1].startswith("large"):
+            size = SIZES["extra-large"]
+            del words[:2]
+        elif unit is None and w in ("fl", "fluid") and len(words) > 1 and words[1].rstrip(".") in ("oz", "ounce", "ounces"):
+            unit = "fl oz"
+            del words[:2]
+        elif unit is None and (w in UNITS or w in HEADS) and (qty is not None or len(w) > 1):
+            unit = w
+            words.pop(0)
+            if qty is None:
+                qty = 1.0
+        else:
+            break
+    if words and words[0] == "of":
+        words.pop(0)
+    rest = " ".join(words)
+
+    # The text before the first comma first ("1 cup water, or chicken broth")
+    food = TABLE.match(rest.split(",", 1)[0])
+    if food < 0:
+        food = TABLE.match(rest)
+    if food < 0:
+        return (-1, None)
+
+    if unit == "fl oz":
+        kind, per = "ml", 29.57
+    elif unit in HEADS:
+        kind, per = "each", HEAD_MIN_G
+    elif unit:
+        kind, per = UNITS[unit]
+    else:
+        kind, per = None, None
+    count = (qty or 0.0) * (per if kind == "count" else 1.0)
+    each = float(TABLE.grams_each[food])
+    if unit in HEADS:
+        each = max(HEAD_MIN_G, 0.0 if np.isnan(each) else each)
+
+    grams: Optional[float]
+    if stated is not None:
+        amount, is_volume = stated
+        amount *= TABLE.density(food) if is_volume else 1.0
+        # Per piece for containers and pieces, otherwise the same amount in other units
+        grams = amount * max(count, 1.0) if kind in (None, "can", "box", "each", "count") else amount
+    elif qty is None:
+        grams = 0.0
+    elif kind in ("g", "box"):
+        grams = qty * per
+    elif kind == "ml":
+        grams = qty * per * TABLE.density(food)
+    elif kind == "can":
+        can = float(TABLE.grams_per_can[food])
+        grams = qty * (DEFAULT_CAN_G if np.isnan(can) else can)
+    elif not np.isnan(each):
+        grams = count * each * size
+    elif kind == "each" and per is not None:
+        grams = count * per * size
+    else:
+        grams = None
+    return (food, grams)
+
+
+def _estimate_batch(recipes: Sequence[Tuple[Sequence[str], Optional[int]]]) -> List[Optional[dict]]:
+    rows: List[int] = []
+    foods: List[int] = []
+    grams: List[float] = []
+    counted = [0] * len(recipes)
+    matched = [0] * len(recipes)
+    for r, (lines, _) in enumerate(recipes):
+        for line in lines:
+            parsed = parse_line(line)
+            if parsed is None:
+                continue
+            counted[r] += 1
+            food, g = parsed
+            if food >= 0 and g is not None:
+                matched[r] += 1
+                rows.append(r)
+                foods.append(food)
+                grams.append(g)
+
+    # recipes x foods, grams of each food in each recipe
+    amounts = np.zeros((len(recipes), len(TABLE.names)))
+    np.add.at(amounts, (np.array(rows, dtype=np.intp), np.array(foods, dtype=np.intp)), np.array(grams))
+    servings = np.array([s if s and s > 0 else 1 for _, s in recipes], dtype=float)
+    per_serving = np.round(amounts @ TABLE.per_gram / servings[:, None], 1)
+
+    counted_a = np.array(counted)
+    ok = (counted_a > 0) & (np.array(matched) >= counted_a * NUTRITION_MIN_COVERAGE)
+
+    out: List[Optional[dict]] = []
+    for (_, s), values, good in zip(recipes, per_serving.tolist(), ok.tolist()):
+        if not good:
+            out.append(None)
+            continue
+        facts = dict(zip(NUTRIENTS, values))
+        facts["calories"] = int(round(facts["calories"]))
+        if not s or s <= 0:
+            facts["serving_size"] = "whole recipe"
+        facts["estimated"] = True
+        out.append(facts)
+    return out
+
+
+def estimate_many(recipes: Sequence[Tuple[Sequence[str], Optional[int]]]) -> List[Optional[dict]]:
+    """
+    Per-serving NutritionFacts fields for each (ingredient lines, servings),
+    marked "estimated"; None where too few lines could be accounted for.
+    Recipes without servings are estimated as one serving.
+    """
+    out: List[Optional[dict]] = []
+    for start in range(0, len(recipes), BATCH):
+        out.extend(_estimate_batch(recipes[start : start + BATCH]))
+    return out
+
+
+def estimate(ingredients: Sequence[str], servings: Optional[int]) -> Optional[dict]:
+    return estimate_many([(ingredients, servings)])[0]
+
+
+def explain(ingredients: Sequence[str]) -> List[dict]:
+    """How each line was read, for checking an estimate."""
+    out = []
+    for line in ingredients:
+        parsed = parse_line(line)
+        if parsed is None:
+            out.append({"line": line, "food": None, "grams": None, "skipped": True})
+            continue
+        food, grams = parsed
+        out.append(
+            {
+                "line": line,
+                "food": TABLE.names[food] if food >= 0 else None,
+                "grams": round(grams, 1) if grams is not None else None,
+                "skipped": False,
+            }
+        )
+    return out
+
+
+class EstimateRequest(BaseModel):
+    ingredients: List[str] = []
+    servings: Optional[int] = None
+
+
+def register_nutrition_routes(app: FastAPI, engine, views) -> None:
+    @app.post("/api/nutrition/estimate")
+    def estimate_nutrition(body: EstimateRequest):
+        """Estimate for unsaved ingredient lines, with how each line was read."""
+        return {"nutrition": estimate(body.ingredients, body.servings), "lines": explain(body.ingredients)}
+
+    @app.post("/api/nutrition/backfill")
+    def backfill_nutrition(
+        redo: bool = Query(default=False, description="also recompute existing estimates"),
+    ):
+        """
+        Estimate nutrition for every recipe that has none (and, with redo,
+        refresh earlier estimates). Entered or scraped nutrition is never
+        touched. The estimates are computed before the write lock is taken;
+        recipes edited in the meantime (change_seq moved on) are left alone,
+        since the edit already brought their estimate up to date.
+        """
+        t0 = time.perf_counter()
+        where = "nutrition_json IS NULL"
+        if redo:
+            where += " OR (nutrition_json::jsonb ->> 'estimated') = 'true'"
+        with engine.connect() as conn:
+            rows = conn.execute(
+                text(f"SELECT id, ingredients, servings, nutrition_json, change_seq FROM recipes WHERE {where}")
+            ).mappings().all()
+        estimates = estimate_many([((r["ingredients"] or "").split("\n"), r["servings"]) for r in rows])
+        updates = []
+        for r, facts in zip(rows, estimates):
+            if facts is None:
+                continue
+            payload = json.dumps(facts)
+            if payload != r["nutrition_json"]:
+                updates.append((r["id"], r["change_seq"], payload))
+        updated = 0
+        with views.write("recipes") as conn:
+            for start in range(0, len(updates), BACKFILL_CHUNK):
+                chunk = updates[start : start + BACKFILL_CHUNK]
+                params = {}
+                for i, (rid, seq, payload) in enumerate(chunk):
+                    params[f"id_{i}"] = rid
+                    params[f"s_{i}"] = seq
+                    params[f"n_{i}"] = payload
+                values = ", ".join(f"(:id_{i}, CAST(:s_{i} AS BIGINT), :n_{i})" for i in range(len(chunk)))
+                updated += conn.execute(
+                    text(
+                        f"""
+                        UPDATE recipes AS r
+                        SET nutrition_json = v.n, change_seq = nextval('change_seq')
+                        FROM (VALUES {values}) AS v(id, seq, n)
+                        WHERE r.id = v.id AND r.change_seq = v.seq
+                        """
+                    ),
+                    params,
+                ).rowcount
+        return {
+            "scanned": len(rows),
+            "updated": updated,
+            "unestimated": sum(1 for e in estimates if e is None),
+            "seconds": round(time.perf_counter() - t0, 3),
+        }
+
+
+# ---------------- CLI ----------------
+def _synthetic_recipes(n: int, seed: int = 1) -> List[Tuple[List[str], int]]:
+    rng = random.Random(seed)
+    aliases = [" ".join(k) for k in TABLE.index]
+    units = ["", "cup", "cups", "tbsp", "tsp", "g", "oz", "lb", "large", "can", "cloves", "pinch"]
+    qtys = ["1", "2", "1/2", "1 1/2", "3", "1/4", "200", "2-3", "a"]
+    recipes = []
+    for _ in range(n):
+        lines = [
+            f"{rng.choice(qtys)} {rng.choice(units)} {rng.choice(aliases)}, chopped".replace("  ", " ")
+            for _ in range(rng.randint(5, 15))
+        ]
+        recipes.append((lines, rng.randint(1, 8)))
+    return recipes
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Estimate nutrition from ingredient lines")
+    ap.add_argument("lines", nargs="*", help="ingredient lines")
+    ap.add_argument("--servings", type=int, default=None)
+    ap.add_argument("--bench", type=int, metavar="N", help="time N synthetic recipes instead")
+    args = ap.parse_args(argv)
+
+    if args.bench:
+        recipes = _synthetic_recipes(args.bench)
+        lines = sum(len(r[0]) for r in recipes)
+        for label in ("cold", "warm"):
+            t0 = time.perf_counter()
+            results = estimate_many(recipes)
+            elapsed = time.perf_counter() - t0
+            print(
+                f"{label}: {len(recipes)} recipes, {lines} lines in {elapsed:.3f}s "
+                f"({len(recipes) / elapsed:.0f} recipes/s, {sum(r is not None for r in results)} estimated)"
+            )
+        return 0
+
+    for row in explain(args.lines):
+        if row["skipped"]:
+            print(f"  {'':>8}  {'':<24} {row['line']}")
+        else:
+            grams = f"{row['grams']:.0f} g" if row["grams"] is not None else "?"
+            print(f"  {grams:>8}  {row['food'] or '(no match)':<24} {row['line']}")
+    print(json.dumps(estimate(args.lines, args.servings), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
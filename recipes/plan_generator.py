@@ -0,0 +1,149 @@
+"""
+Search behind POST /api/planner/generate (the route is in meal_planner.py).
+
+A plan fills cells (person, day, slot) with candidate recipes so that each
+person's daily totals come close to their targets. The cost of a day is the
+sum of squared relative deviations from the targets that were given; for
+ceilings (sugar, sodium) only going over counts. A recipe may not come back
+for the same person within `no_repeat_days` days.
+
+The search is a randomised coordinate descent: start from a random valid
+plan, then keep replacing one cell with the best recipe for it given the
+rest of its day until nothing improves. Every candidate is scored at once:
+with nutrients scaled by the targets, the squared deviations expand into a
+constant, one matrix-vector product and a per-recipe term computed up
+front; only the ceiling columns are evaluated element-wise. Restarts run
+until the time budget is spent or a plan is good enough, and the cheapest
+plan wins.
+"""
+
+import os
+import time
+from typing import Tuple
+
+import numpy as np
+
+PLANNER_SEARCH_SECONDS = float(os.getenv("PLANNER_SEARCH_SECONDS", "0.25"))
+# Descent passes over all cells per restart; it usually settles in 3-4
+MAX_PASSES = 10
+MAX_RESTARTS = 64
+# Stop restarting once the average day is this close (about 1% off per target)
+GOOD_ENOUGH = 1e-3
+
+
+def day_cost(totals: np.ndarray, targets: np.ndarray, weights: np.ndarray, ceilings: np.ndarray) -> np.ndarray:
+    """Cost of daily totals (..., K) against targets (K,); weight 0 for nutrients without one."""
+    dev = (totals - targets) / targets
+    dev = np.where(ceilings, np.maximum(dev, 0.0), dev)
+    return (dev * dev * weights).sum(axis=-1)
+
+
+def search_plan(
+    nutrients: np.ndarray,
+    targets: np.ndarray,
+    ceilings: np.ndarray,
+    allowed: np.ndarray,
+    free: np.ndarray,
+    base: np.ndarray,
+    used: np.ndarray,
+    no_repeat_days: int,
+    seed=None,
+    budget: float = PLANNER_SEARCH_SECONDS,
+) -> Tuple[np.ndarray, float, int]:
+    """
+    nutrients  (R, K)  one planned meal of each candidate recipe
+    targets    (P, K)  per person and day; NaN where there is no target
+    ceilings   (K,)    nutrients where only exceeding the target counts
+    allowed    (S, R)  recipes that fit each slot
+    free       (P, D, S) cells to fill
+    base       (P, D, K) totals of meals already planned on those days
+    used       (P, D + 2 * pad, R) existing meals per recipe, with pad =
+               no_repeat_days - 1 extra days on both sides of the range
+
+    Returns (recipe index per cell, -1 where nothing is planned; total cost;
+    cells where the variety rule had to be broken because no candidate was
+    left).
+    """
+    rng = np.random.default_rng(seed)
+    n_persons, n_days, n_slots = free.shape
+    pad = max(no_repeat_days - 1, 0)
+    weights = np.where(np.isnan(targets) | (targets <= 0), 0.0, 1.0)
+    safe_targets = np.where(weights > 0, targets, 1.0)
+    cells = np.argwhere(free & allowed.any(axis=1)[None, None, :])
+
+    # Per person: nutrients relative to the targets, split into plain and ceiling columns
+    scaled = nutrients[None, :, :] / safe_targets[:, None, :]  # (P, R, K)
+    plain = ~ceilings
+    w_plain = weights[:, plain]
+    w_ceil = weights[:, ceilings]
+    z_plain = scaled[:, :, plain]
+    z_ceil = scaled[:, :, ceilings]
+    z_sq = (z_plain * z_plain * w_plain[:, None, :]).sum(axis=2)  # (P, R)
+
+    def candidate_costs(p, rest):
+        # Day cost with each recipe added to `rest`, up to a constant shared by all recipes
+        a = rest / safe_targets[p] - 1.0
+        cost = z_plain[p] @ (2.0 * w_plain[p] * a[plain]) + z_sq[p]
+        if w_ceil.shape[1]:
+            over = np.maximum(z_ceil[p] + a[ceilings], 0.0)
+            cost += (over * over * w_ceil[p]).sum(axis=1)
+        return cost
+
+    def run():
+        assign = np.full(free.shape, -1, dtype=np.intp)
+        totals = base.copy()
+        uses = used.copy()
+
+        def options(p, d, s, cur):
+            # Uses of each recipe by this person within the window around day d, this cell excluded
+            window = uses[p, d : d + 2 * pad + 1].sum(axis=0)
+            if cur >= 0:
+                window[cur] -= 1
+            ok = allowed[s] & (window == 0) if no_repeat_days > 0 else allowed[s].copy()
+            return ok if ok.any() else allowed[s]
+
+        def put(p, d, s, cur, new):
+            if cur >= 0:
+                totals[p, d] -= nutrients[cur]
+                uses[p, d + pad, cur] -= 1
+            assign[p, d, s] = new
+            totals[p, d] += nutrients[new]
+            uses[p, d + pad, new] += 1
+
+        for p, d, s in cells[rng.permutation(len(cells))]:
+            ok = options(p, d, s, -1)
+            put(p, d, s, -1, rng.choice(np.flatnonzero(ok)))
+
+        for _ in range(MAX_PASSES):
+            improved = False
+            for p, d, s in cells[rng.permutation(len(cells))]:
+                cur = assign[p, d, s]
+                rest = totals[p, d] - nutrients[cur]
+                cost = candidate_costs(p, rest)
+                cost[~options(p, d, s, cur)] = np.inf
+                best = int(np.argmin(cost))
+                if best != cur and cost[best] < cost[cur] - 1e-12:
+                    put(p, d, s, cur, best)
+                    improved = True
+            if not improved:
+                break
+        total = float(day_cost(totals, safe_targets[:, None, :], weights[:, None, :], ceilings).sum())
+        return assign, total, uses
+
+    deadline = time.perf_counter() + budget
+    best = None
+    for _ in range(MAX_RESTARTS):
+        assign, total, uses = run()
+        if best is None or total < best[1]:
+            best = (assign, total, uses)
+        if time.perf_counter() >= deadline or best[1] <= GOOD_ENOUGH * n_persons * n_days:
+            break
+    assign, total, uses = best
+
+    repeats = 0
+    if no_repeat_days > 0:
+        for p, d, s in cells:
+            r = assign[p, d, s]
+            if uses[p, d : d + 2 * pad + 1, r].sum() > 1:
+                repeats += 1
+    return assign, total, repeats
@@ -36,9 +36,11 @@ function escapeHtml(s) {
 }
 
 async function api(path, options) {
-  const res = await fetch(path, options);
+  // offline.js: local replica, cached responses and queued writes
+  const res = await (window.RecipesOffline ? RecipesOffline.fetch(path, options) : fetch(path, options));
   const data = await res.json().catch(() => ({}));
   if (!res.ok) throw new Error(data.detail || data.error || ("HTTP " + res.status));
+  if (data.queued) setStatus(`Offline • ${data.pending} change(s) waiting to sync`);
   return data;
 }
 
@@ -129,7 +131,7 @@ function renderNutrition(n) {
 
   return `
     <div style="margin-top:14px">
-      <div class="title" style="font-size:16px"><div>Nutrition Facts</div></div>
+      <div class="title" style="font-size:16px"><div>Nutrition Facts${n.estimated ? ' <span class="muted">(estimated from ingredients)</span>' : ""}</div></div>
       <table class="nutTable">${body}</table>
     </div>
   `;
@@ -479,5 +481,16 @@ searchEl.addEventListener("input", () => {
   window.__t = setTimeout(load, 250);
 });
 
+// Offline layer events (offline.js / sw.js)
+window.addEventListener("recipes-offline", (ev) => {
+  const msg = ev.detail || {};
+  if (msg.type === "recipes-changed") {
+    clearTimeout(window.__sync);
+    window.__sync = setTimeout(load, 100);
+  }
+  if (msg.type === "outbox" && msg.pending > 0) setStatus(`Offline • ${msg.pending} change(s) waiting to sync`);
+  if (msg.type === "outbox-failed") setStatus(`Sync failed: ${msg.method} ${msg.path} (${msg.detail || msg.status})`);
+});
+
 // boot
 load();
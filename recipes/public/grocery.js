@@ -51,7 +51,8 @@ function clampMultiplier(n) {
 }
 
 async function apiGet(url) {
-  const res = await fetch(url, { headers: { Accept: "application/json" } });
+  const options = { headers: { Accept: "application/json" } };
+  const res = await (window.RecipesOffline ? RecipesOffline.fetch(url, options) : fetch(url, options));
   if (!res.ok) {
     const text = await res.text().catch(() => "");
     throw new Error(`Request failed (${res.status}): ${text || url}`);
@@ -296,10 +297,14 @@ function setDefaultDates() {
   toDateEl.value = fmtYmd(end);
 }
 
+// Bumped per search so a slow answer can't replace a newer one
+let searchSeq = 0;
+
 async function searchRecipes() {
   const q = recipeSearchEl.value.trim();
-  recipeResultsEl.innerHTML = "";
+  const seq = ++searchSeq;
   if (!q) {
+    recipeResultsEl.innerHTML = "";
     setSearchStatus("Type something to search.");
     return;
   }
@@ -308,8 +313,10 @@ async function searchRecipes() {
   setSearchStatus("Searching…");
 
   try {
-    // ✅ YOUR API uses q=
-    const results = await apiGet(`/api/recipes?q=${encodeURIComponent(q)}`);
+    // Typeahead endpoint: ids and titles only, typo-tolerant
+    const results = await apiGet(`/api/recipes/suggest?q=${encodeURIComponent(q)}&limit=20`);
+    if (seq !== searchSeq) return;
+    recipeResultsEl.innerHTML = "";
 
     if (!Array.isArray(results) || results.length === 0) {
       setSearchStatus("No results.");
@@ -348,7 +355,7 @@ async function searchRecipes() {
       recipeResultsEl.appendChild(row);
     });
   } catch (e) {
-    setSearchStatus(e?.message || "Search failed.");
+    if (seq === searchSeq) setSearchStatus(e?.message || "Search failed.");
   } finally {
     btnSearch.disabled = false;
   }
@@ -511,6 +518,7 @@ btnSearch.addEventListener("click", searchRecipes);
 recipeSearchEl.addEventListener("keydown", (e) => {
   if (e.key === "Enter") searchRecipes();
 });
+recipeSearchEl.addEventListener("input", searchRecipes);
 
 btnClearSelected.addEventListener("click", () => {
   selectedRecipeMap.clear();
@@ -18,6 +18,13 @@ const fRecipeHint = document.getElementById("fRecipeHint");
 const fNotes = document.getElementById("fNotes");
 const btnAddMeal = document.getElementById("btnAddMeal");
 
+const gCalories = document.getElementById("gCalories");
+const gProtein = document.getElementById("gProtein");
+const gSlots = document.getElementById("gSlots");
+const gNoRepeat = document.getElementById("gNoRepeat");
+const gReplace = document.getElementById("gReplace");
+const btnGenerate = document.getElementById("btnGenerate");
+
 const editModal = document.getElementById("editModal");
 const btnEditClose = document.getElementById("btnEditClose");
 const btnEditSave = document.getElementById("btnEditSave");
@@ -41,16 +48,21 @@ let editingMealPerson = null;
 const DEFAULT_PERSON = "Household";
 const PERSON_STORAGE_KEY = "mealPlannerPerson";
 
-// Separate recipe lists for edit modal filtering
+// Suggestions currently shown in the edit modal's picker
 let editFilteredRecipes = [];
 
 const mealsRoot = document.getElementById("meals");
 
+// Titles of recipes seen so far (suggestions and planned meals)
 let recipesById = new Map();
 
-// keep full list for filtering
-let allRecipes = []; // [{id, title, ...}]
-let filteredRecipes = []; // same shape
+// Suggestions currently shown in the add picker: [{id, title}]
+let filteredRecipes = [];
+
+const SUGGEST_LIMIT = 20;
+// Bumped per keystroke so a slow answer can't replace a newer one
+let recipeQuerySeq = 0;
+let editQuerySeq = 0;
 
 function setStatus(t) {
   statusEl.textContent = t;
@@ -65,9 +77,11 @@ function escapeHtml(s) {
 }
 
 async function api(path, options) {
-  const res = await fetch(path, options);
+  // offline.js: local replica, cached responses and queued writes
+  const res = await (window.RecipesOffline ? RecipesOffline.fetch(path, options) : fetch(path, options));
   const data = await res.json().catch(() => ({}));
   if (!res.ok) throw new Error(data.detail || data.error || ("HTTP " + res.status));
+  if (data.queued) setStatus(`Offline • ${data.pending} change(s) waiting to sync`);
   return data;
 }
 
@@ -167,14 +181,14 @@ function setEditStatus(t) {
   if (editStatus) editStatus.textContent = t || "";
 }
 
-function renderRecipeOptionsInto(selectEl, hintEl, list, { keepSelected = true } = {}) {
+function renderRecipeOptionsInto(selectEl, hintEl, list, { keepSelected = true, emptyText = "No matches…" } = {}) {
   const prev = keepSelected ? selectEl.value : "";
   selectEl.innerHTML = "";
 
   if (!list.length) {
     selectEl.disabled = true;
-    selectEl.innerHTML = `<option value="">No matches…</option>`;
-    if (hintEl) hintEl.textContent = "0 matches";
+    selectEl.innerHTML = `<option value="">${emptyText}</option>`;
+    if (hintEl) hintEl.textContent = emptyText === "No matches…" ? "0 matches" : "";
     return;
   }
 
@@ -191,19 +205,22 @@ function renderRecipeOptionsInto(selectEl, hintEl, list, { keepSelected = true }
 
   if (!selectEl.value && selectEl.options.length > 0) selectEl.selectedIndex = 0;
 
-  if (hintEl) {
-    const total = allRecipes.length;
-    const shown = list.length;
-    hintEl.textContent = shown === total ? `${total} recipes` : `${shown} match(es)`;
-  }
+  if (hintEl) hintEl.textContent = `${list.length} match(es)`;
 }
 
-function applyEditRecipeFilter() {
-  const q = (eRecipeSearch?.value || "").trim().toLowerCase();
-  editFilteredRecipes = !q
-    ? allRecipes.slice()
-    : allRecipes.filter((r) => (r.title || "").toLowerCase().includes(q));
-
+async function applyEditRecipeFilter() {
+  const q = (eRecipeSearch?.value || "").trim();
+  const seq = ++editQuerySeq;
+  let list;
+  if (q) {
+    list = await suggestRecipes(q).catch(() => []);
+  } else {
+    // Empty search: just the meal's current recipe
+    const meal = mealsById.get(editingMealId);
+    list = meal ? [recipeItem(meal.recipe_id)] : [];
+  }
+  if (seq !== editQuerySeq) return;
+  editFilteredRecipes = list;
   renderRecipeOptionsInto(eRecipe, eRecipeHint, editFilteredRecipes, { keepSelected: true });
 }
 
@@ -302,14 +319,14 @@ function renderNutritionReportError(message, person) {
 // Recipe dropdown + search
 // ----------------------------
 
-function renderRecipeOptions(list, { keepSelected = true } = {}) {
+function renderRecipeOptions(list, { keepSelected = true, emptyText = "No matches…" } = {}) {
   const prev = keepSelected ? fRecipe.value : "";
   fRecipe.innerHTML = "";
 
   if (!list.length) {
     fRecipe.disabled = true;
-    fRecipe.innerHTML = `<option value="">No matches…</option>`;
-    if (fRecipeHint) fRecipeHint.textContent = "0 matches";
+    fRecipe.innerHTML = `<option value="">${emptyText}</option>`;
+    if (fRecipeHint) fRecipeHint.textContent = emptyText === "No matches…" ? "0 matches" : "";
     return;
   }
 
@@ -331,25 +348,33 @@ function renderRecipeOptions(list, { keepSelected = true } = {}) {
     fRecipe.selectedIndex = 0;
   }
 
-  if (fRecipeHint) {
-    const total = allRecipes.length;
-    const shown = list.length;
-    fRecipeHint.textContent =
-      shown === total ? `${total} recipes` : `${shown} match(es)`;
-  }
+  if (fRecipeHint) fRecipeHint.textContent = `${list.length} match(es)`;
+}
+
+// Best title matches from the server (typo-tolerant), remembered for meal titles
+async function suggestRecipes(q) {
+  const items = await api(`/api/recipes/suggest?q=${encodeURIComponent(q)}&limit=${SUGGEST_LIMIT}`);
+  items.forEach((r) => recipesById.set(r.id, r));
+  return items;
+}
+
+function recipeItem(id) {
+  return recipesById.get(id) || { id, title: `Recipe #${id}` };
 }
 
-function applyRecipeFilter() {
-  const q = (fRecipeSearch?.value || "").trim().toLowerCase();
+async function applyRecipeFilter() {
+  const q = (fRecipeSearch?.value || "").trim();
+  const seq = ++recipeQuerySeq;
 
   if (!q) {
-    filteredRecipes = allRecipes.slice();
-  } else {
-    filteredRecipes = allRecipes.filter((r) =>
-      (r.title || "").toLowerCase().includes(q)
-    );
+    filteredRecipes = [];
+    renderRecipeOptions(filteredRecipes, { emptyText: "Type to search recipes…" });
+    return;
   }
 
+  const list = await suggestRecipes(q).catch(() => []);
+  if (seq !== recipeQuerySeq) return;
+  filteredRecipes = list;
   renderRecipeOptions(filteredRecipes, { keepSelected: true });
 }
 
@@ -380,27 +405,6 @@ function wireRecipeSearch() {
   });
 }
 
-async function loadRecipes() {
-  // you already use /api/listRecipes — keep it
-  const items = await api("/api/listRecipes");
-
-  // store for filtering (sorted)
-  allRecipes = items
-    .slice()
-    .sort((a, b) => (a.title || "").localeCompare(b.title || ""));
-
-  filteredRecipes = allRecipes.slice();
-
-  recipesById = new Map(items.map((r) => [r.id, r]));
-
-  // initial render
-  renderRecipeOptions(filteredRecipes, { keepSelected: false });
-
-  // reset search box/hint
-  if (fRecipeSearch) fRecipeSearch.value = "";
-  if (fRecipeHint) fRecipeHint.textContent = `${allRecipes.length} recipes`;
-}
-
 // ----------------------------
 
 
@@ -424,8 +428,7 @@ function renderDayCard(day, meals) {
 
   const list = (meals || [])
     .map((m) => {
-      const r = recipesById.get(m.recipe_id);
-      const title = r ? r.title : `Recipe #${m.recipe_id}`;
+      const title = m.recipe_title || recipeItem(m.recipe_id).title;
       const notes = m.notes ? `<div class="muted" style="margin-top:4px">${escapeHtml(m.notes)}</div>` : "";
       return `
         <div style="padding:10px 0; border-top: 1px solid rgba(255,255,255,.08)">
@@ -486,13 +489,10 @@ function renderDayCard(day, meals) {
       if (eServings) eServings.value = String(meal.servings || 1);
       eNotes.value = meal.notes || "";
 
-      editFilteredRecipes = allRecipes.slice();
-      renderRecipeOptionsInto(eRecipe, eRecipeHint, editFilteredRecipes, { keepSelected: false });
-      eRecipe.value = String(meal.recipe_id);
-
-      // Reset Search
+      // Reset Search: the picker starts with the current recipe
       if (eRecipeSearch) eRecipeSearch.value = "";
-      applyEditRecipeFilter();
+      editFilteredRecipes = [recipeItem(meal.recipe_id)];
+      renderRecipeOptionsInto(eRecipe, eRecipeHint, editFilteredRecipes, { keepSelected: false });
       setEditStatus("");
       openModal();
       return;
@@ -591,6 +591,50 @@ async function addMeal() {
   }
 }
 
+async function generatePlan() {
+  const start = startEl.value;
+  const days = Math.max(1, Math.min(31, Number(daysEl.value || 7)));
+  const slots = (gSlots.value || "")
+    .split(",")
+    .map((s) => s.trim())
+    .filter(Boolean);
+  const targets = {};
+  if (Number(gCalories.value) > 0) targets.calories = Number(gCalories.value);
+  if (Number(gProtein.value) > 0) targets.protein_g = Number(gProtein.value);
+  if (!Object.keys(targets).length) {
+    alert("Enter a calorie or protein target.");
+    return;
+  }
+  if (gReplace.checked && !confirm("Replace the planned meals in these slots?")) return;
+
+  btnGenerate.disabled = true;
+  setStatus("Generating…");
+  try {
+    const plan = await api("/api/planner/generate", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        start,
+        end: addDays(start, days - 1),
+        persons: [getSelectedPerson()],
+        slots,
+        targets,
+        no_repeat_days: Number(gNoRepeat.value || 0),
+        replace: gReplace.checked,
+      }),
+    });
+    await loadMeals();
+    let msg = `Planned ${plan.meals.length} meal(s)`;
+    if (plan.unfilled) msg += ` • ${plan.unfilled} slot(s) without a recipe`;
+    if (plan.repeats) msg += ` • ${plan.repeats} repeat(s)`;
+    setStatus(msg);
+  } catch (e) {
+    setStatus("Error: " + e.message);
+  } finally {
+    btnGenerate.disabled = false;
+  }
+}
+
 async function boot() {
   const today = isoDate(new Date());
   startEl.value = today;
@@ -598,7 +642,7 @@ async function boot() {
 
   try {
     wireRecipeSearch();   // ✅ NEW
-    await loadRecipes();  // will render initial list
+    renderRecipeOptions([], { emptyText: "Type to search recipes…" });
     await loadPeople();
     await loadMeals();
   } catch (e) {
@@ -611,6 +655,7 @@ btnBack.addEventListener("click", () => {
   window.location.href = "/";
 });
 btnAddMeal.addEventListener("click", addMeal);
+btnGenerate.addEventListener("click", generatePlan);
 
 if (personSelect) {
   personSelect.addEventListener("change", () => {
@@ -0,0 +1,399 @@
+/* Offline layer for the recipes UI, shared by the pages and the service worker (sw.js).
+ *
+ * Everything lives in IndexedDB, which (unlike service workers and Cache Storage)
+ * also works when the app is opened over plain http on the LAN:
+ *   - recipes: a replica of all recipes, kept current with /api/sync deltas.
+ *     GET /api/recipes and /api/recipes/{id} are answered from it right away.
+ *   - responses: other GET /api/... responses, served stale-while-revalidate.
+ *   - outbox: recipe/meal writes made while the Pi is unreachable, replayed in order.
+ *
+ * When sw.js controls the page it runs this code and the page just calls fetch();
+ * otherwise RecipesOffline.fetch() runs the same code in the page.
+ */
+(function (global) {
+  const DB_NAME = "recipes-offline";
+  const DB_VERSION = 1;
+  const SYNC_INTERVAL_MS = 3000;   // background /api/sync at most this often
+  const LEASE_MS = 30000;          // outbox replay lease (one tab or worker at a time)
+  const QUEUED_WRITES = /^\/api\/(recipes|meals)(\/|$)/;
+  const PASSTHROUGH = /^\/api\/(sync|cache|scrape|crawl)(\/|$|\?)/;
+
+  const inWorker = typeof ServiceWorkerGlobalScope !== "undefined" && global instanceof ServiceWorkerGlobalScope;
+  const owner = Math.random().toString(36).slice(2);
+
+  // ---------- IndexedDB ----------
+  let dbPromise = null;
+  function openDb() {
+    if (!dbPromise) {
+      dbPromise = new Promise((resolve, reject) => {
+        const req = indexedDB.open(DB_NAME, DB_VERSION);
+        req.onupgradeneeded = () => {
+          const db = req.result;
+          db.createObjectStore("recipes", { keyPath: "id" });
+          db.createObjectStore("responses", { keyPath: "url" });
+          db.createObjectStore("outbox", { keyPath: "seq", autoIncrement: true });
+          db.createObjectStore("meta");
+        };
+        req.onsuccess = () => resolve(req.result);
+        req.onerror = () => reject(req.error);
+      });
+    }
+    return dbPromise;
+  }
+
+  // Run fn(stores...) in one transaction; resolves with fn's result once committed
+  async function tx(names, mode, fn) {
+    const db = await openDb();
+    return new Promise((resolve, reject) => {
+      const t = db.transaction(names, mode);
+      let result;
+      t.oncomplete = () => resolve(result);
+      t.onerror = () => reject(t.error);
+      t.onabort = () => reject(t.error);
+      Promise.resolve()
+        .then(() => fn(...[].concat(names).map(n => t.objectStore(n))))
+        .then(r => { result = r; }, e => { try { t.abort(); } catch (_) { /* already finished */ } reject(e); });
+    });
+  }
+
+  function req(r) {
+    return new Promise((resolve, reject) => {
+      r.onsuccess = () => resolve(r.result);
+      r.onerror = () => reject(r.error);
+    });
+  }
+
+  const getMeta = (key) => tx("meta", "readonly", s => req(s.get(key)));
+  const setMeta = (key, value) => tx("meta", "readwrite", s => { s.put(value, key); });
+
+  // ---------- notifications ----------
+  async function notify(msg) {
+    if (inWorker) {
+      const clients = await global.clients.matchAll({ includeUncontrolled: true });
+      clients.forEach(c => c.postMessage(msg));
+    } else {
+      global.dispatchEvent(new CustomEvent("recipes-offline", { detail: msg }));
+    }
+  }
+
+  function json(data, status = 200, source = null) {
+    const headers = { "Content-Type": "application/json" };
+    if (source) headers["X-Offline-Source"] = source;
+    return new Response(JSON.stringify(data), { status, headers });
+  }
+
+  // ---------- recipe replica ----------
+  let syncing = null;
+  let lastSync = 0;
+
+  async function syncReplica() {
+    if (syncing) return syncing;
+    syncing = (async () => {
+      let token = (await getMeta("token")) || 0;
+      let changed = false;
+      let snapshot = false;
+      for (;;) {
+        // While paging through a snapshot the tokens sit below the server's horizon; say so, or it restarts
+        const res = await fetch(`/api/sync?since=${token}` + (snapshot ? "&snapshot=true" : ""));
+        if (!res.ok) throw new Error("HTTP " + res.status);
+        const d = await res.json();
+        await tx(["recipes", "meta"], "readwrite", (recipes, meta) => {
+          if (d.full) recipes.clear();
+          d.recipes.forEach(r => recipes.put(r));
+          d.deleted.recipes.forEach(id => recipes.delete(id));
+          meta.put(d.token, "token");
+        });
+        changed = changed || d.full || d.recipes.length > 0 || d.deleted.recipes.length > 0;
+        token = d.token;
+        snapshot = d.snapshot;
+        if (!d.more) break;
+      }
+      lastSync = Date.now();
+      return changed;
+    })().finally(() => { syncing = null; });
+    return syncing;
+  }
+
+  // Refresh in the background; tell the pages if anything changed
+  function revalidateReplica() {
+    if (Date.now() - lastSync < SYNC_INTERVAL_MS) return;
+    lastSync = Date.now();
+    syncReplica().then(changed => { if (changed) notify({ type: "recipes-changed" }); }).catch(() => {});
+  }
+
+  function matches(r, q, tag) {
+    // Same rules as list_recipes on the server
+    const tags = (r.tags || []).join(",").toLowerCase();
+    if (q && !(r.title.toLowerCase().includes(q) || (r.description || "").toLowerCase().includes(q) || tags.includes(q))) return false;
+    if (tag && !tags.includes(tag)) return false;
+    return true;
+  }
+
+  async function fromReplica(url) {
+    if ((await getMeta("token")) === undefined) return null;
+    const m = url.pathname.match(/^\/api\/recipes\/(-?\d+)$/);
+    if (m) {
+      const r = await tx("recipes", "readonly", s => req(s.get(Number(m[1]))));
+      return r ? json(r, 200, "replica") : null;
+    }
+    const q = (url.searchParams.get("q") || "").toLowerCase();
+    const tag = (url.searchParams.get("tag") || "").toLowerCase();
+    const all = await tx("recipes", "readonly", s => req(s.getAll()));
+    const items = all.filter(r => matches(r, q, tag));
+    items.sort((a, b) => (a.updated_at < b.updated_at ? 1 : a.updated_at > b.updated_at ? -1 : 0));
+    return json(items, 200, "replica");
+  }
+
+  // Offline stand-in for /api/recipes/suggest: substring match on title and tags, title prefixes first
+  async function suggestFromReplica(url) {
+    if ((await getMeta("token")) === undefined) return null;
+    const q = (url.searchParams.get("q") || "").trim().toLowerCase();
+    const limit = Number(url.searchParams.get("limit") || 10);
+    if (!q) return json([], 200, "replica");
+    const all = await tx("recipes", "readonly", s => req(s.getAll()));
+    const rank = r => {
+      const title = (r.title || "").toLowerCase();
+      if (title.startsWith(q)) return 0;
+      if (title.includes(q)) return 1;
+      return (r.tags || []).join(" ").toLowerCase().includes(q) ? 2 : -1;
+    };
+    const items = all
+      .map(r => [rank(r), r])
+      .filter(([k]) => k >= 0)
+      .sort((a, b) => a[0] - b[0] || (a[1].title || "").localeCompare(b[1].title || ""))
+      .slice(0, limit)
+      .map(([, r]) => ({ id: r.id, title: r.title }));
+    return json(items, 200, "replica");
+  }
+
+  // ---------- stale-while-revalidate ----------
+  async function revalidate(key, request, cached) {
+    const res = await fetch(request);
+    const body = await res.text();
+    if (res.ok) {
+      await tx("responses", "readwrite", s => { s.put({ url: key, body, stored_at: Date.now() }); });
+      if (cached && cached.body !== body) notify({ type: "api-updated", url: key });
+    }
+    return new Response(body, { status: res.status, headers: { "Content-Type": res.headers.get("Content-Type") || "application/json" } });
+  }
+
+  async function staleWhileRevalidate(request, url) {
+    const key = url.pathname + url.search;
+    const cached = await tx("responses", "readonly", s => req(s.get(key)));
+    if (cached) {
+      revalidate(key, request, cached).catch(() => {});
+      return new Response(cached.body, { status: 200, headers: { "Content-Type": "application/json", "X-Offline-Source": "stale" } });
+    }
+    return revalidate(key, request, null);
+  }
+
+  // ---------- writes and the outbox ----------
+  async function pendingCount() {
+    return tx("outbox", "readonly", s => req(s.count()));
+  }
+
+  async function afterWrite() {
+    // Server-side views changed: drop cached responses, pull the recipe delta
+    await tx("responses", "readwrite", s => { s.clear(); });
+    // A sync already in flight may have started before this write committed
+    if (syncing) await syncing.catch(() => {});
+    await syncReplica().catch(() => {});
+  }
+
+  // Show a queued recipe write in the replica until it reaches the server
+  async function applyLocally(entry) {
+    const m = entry.path.match(/^\/api\/recipes(?:\/(-?\d+))?$/);
+    if (!m || (await getMeta("token")) === undefined) return null;
+    const body = entry.body ? JSON.parse(entry.body) : {};
+    const now = new Date().toISOString();
+    return tx("recipes", "readwrite", async (s) => {
+      if (entry.method === "POST" && !m[1]) {
+        const r = { ingredients: [], steps: [], tags: [], ...body, id: entry.tempId, pending: true, created_at: now, updated_at: now };
+        s.put(r);
+        return r;
+      }
+      const id = Number(m[1]);
+      if (entry.method === "DELETE") { s.delete(id); return { ok: true }; }
+      const existing = await req(s.get(id));
+      if (!existing) return null;
+      const r = { ...existing, ...Object.fromEntries(Object.entries(body).filter(([, v]) => v !== null && v !== undefined)), pending: true, updated_at: now };
+      s.put(r);
+      return r;
+    });
+  }
+
+  async function enqueue(request, url) {
+    const entry = {
+      method: request.method,
+      path: url.pathname + url.search,
+      body: request.method === "DELETE" ? null : await request.clone().text(),
+      queued_at: Date.now(),
+    };
+    if (entry.method === "POST" && url.pathname === "/api/recipes") entry.tempId = -Date.now();
+    await tx("outbox", "readwrite", s => { s.add(entry); });
+    if (inWorker && global.registration.sync) global.registration.sync.register("recipes-outbox").catch(() => {});
+    const local = await applyLocally(entry).catch(() => null);
+    const pending = await pendingCount();
+    notify({ type: "outbox", pending });
+    if (local) notify({ type: "recipes-changed" });
+    return json({ ...(local || {}), queued: true, pending, detail: "Saved offline; it will be sent when the server is reachable" }, 202, "outbox");
+  }
+
+  async function acquireLease() {
+    return tx("meta", "readwrite", async (s) => {
+      const lease = await req(s.get("lease"));
+      if (lease && lease.owner !== owner && lease.expires > Date.now()) return false;
+      s.put({ owner, expires: Date.now() + LEASE_MS }, "lease");
+      return true;
+    });
+  }
+
+  async function releaseLease() {
+    await tx("meta", "readwrite", async (s) => {
+      const lease = await req(s.get("lease"));
+      if (lease && lease.owner === owner) s.delete("lease");
+    });
+  }
+
+  // Send queued writes in order. Stops at the first network failure; entries the
+  // server rejects are dropped and reported. Returns the number still queued.
+  async function replay() {
+    if (!(await acquireLease())) return pendingCount();
+    let sent = 0;
+    let rejected = 0;
+    try {
+      const ids = (await getMeta("tempIds")) || {};
+      for (;;) {
+        const entry = await tx("outbox", "readonly", s => req(s.openCursor())).then(c => c && c.value);
+        if (!entry) break;
+        // Recipes created offline get their real id on replay; later entries refer to the temporary one
+        let path = entry.path.replace(/^\/api\/recipes\/(-\d+)/, (all, t) => (ids[t] ? `/api/recipes/${ids[t]}` : all));
+        let body = entry.body;
+        if (body && path.startsWith("/api/meals")) {
+          const b = JSON.parse(body);
+          if (ids[b.recipe_id]) { b.recipe_id = ids[b.recipe_id]; body = JSON.stringify(b); }
+        }
+        let res;
+        try {
+          res = await fetch(path, { method: entry.method, headers: body ? { "Content-Type": "application/json" } : {}, body });
+        } catch (e) {
+          break; // still offline
+        }
+        if (res.status >= 500) break;
+        if (res.ok && entry.tempId) {
+          ids[entry.tempId] = (await res.json()).id;
+          await setMeta("tempIds", ids);
+        }
+        if (!res.ok) {
+          rejected += 1;
+          const data = await res.json().catch(() => ({}));
+          notify({ type: "outbox-failed", method: entry.method, path, status: res.status, detail: data.detail || "" });
+        }
+        await tx("outbox", "readwrite", s => { s.delete(entry.seq); });
+        sent += 1;
+      }
+      const pending = await pendingCount();
+      if (sent > 0) {
+        if (pending === 0) {
+          await setMeta("tempIds", {});
+          await tx("recipes", "readwrite", async (s) => {
+            (await req(s.getAll())).filter(r => r.pending).forEach(r => s.delete(r.id));
+          });
+          // A rejected write leaves its optimistic change behind: start the replica over
+          if (rejected > 0) await setMeta("token", 0);
+          await syncReplica().catch(() => {});
+        }
+        await tx("responses", "readwrite", s => { s.clear(); });
+        notify({ type: "recipes-changed" });
+      }
+      notify({ type: "outbox", pending });
+      return pending;
+    } finally {
+      await releaseLease();
+    }
+  }
+
+  async function write(request, url) {
+    if (!QUEUED_WRITES.test(url.pathname)) {
+      // Online-only writes (plan generation, nutrition backfill) still change server-side views
+      const res = await fetch(request);
+      if (res.ok) await afterWrite();
+      return res;
+    }
+    // Keep writes in order: anything made after a queued one waits behind it
+    if ((await pendingCount()) > 0 && (await replay()) > 0) return enqueue(request, url);
+    let res;
+    try {
+      res = await fetch(request.clone());
+    } catch (e) {
+      return enqueue(request, url);
+    }
+    if (res.ok) await afterWrite();
+    return res;
+  }
+
+  // ---------- entry point ----------
+  async function handle(request) {
+    const url = new URL(request.url, global.location.href);
+    if (PASSTHROUGH.test(url.pathname)) return fetch(request);
+    if (request.method !== "GET") return write(request, url);
+
+    // NDJSON streams are big exports: straight to the server, never into IndexedDB
+    if (url.searchParams.has("stream") || (request.headers.get("Accept") || "").includes("application/x-ndjson")) {
+      return fetch(request);
+    }
+
+    if (url.pathname === "/api/recipes/suggest") {
+      // A new URL per keystroke: go to the server, not the response cache
+      try {
+        return await fetch(request);
+      } catch (e) {
+        const local = await suggestFromReplica(url).catch(() => null);
+        return local || json({ detail: "Offline and not cached yet" }, 503, "offline");
+      }
+    }
+
+    if (/^\/api\/recipes(\/-?\d+)?$/.test(url.pathname)) {
+      const local = await fromReplica(url).catch(() => null);
+      if (local) {
+        revalidateReplica();
+        return local;
+      }
+      syncReplica().catch(() => {});
+    }
+    try {
+      return await staleWhileRevalidate(request, url);
+    } catch (e) {
+      return json({ detail: "Offline and not cached yet" }, 503, "offline");
+    }
+  }
+
+  global.RecipesOffline = {
+    handle,
+    replay,
+    syncReplica,
+    pendingCount,
+    // For the pages: the service worker handles API calls when it controls the page
+    fetch(path, options) {
+      if (!inWorker && global.navigator.serviceWorker && global.navigator.serviceWorker.controller) {
+        return fetch(path, options);
+      }
+      return handle(new Request(path, options));
+    },
+  };
+
+  // ---------- page wiring ----------
+  if (!inWorker) {
+    const sw = global.navigator.serviceWorker;
+    if (sw && global.isSecureContext) {
+      sw.register("/sw.js").catch(() => {});
+      sw.addEventListener("message", ev => global.dispatchEvent(new CustomEvent("recipes-offline", { detail: ev.data })));
+    }
+    const kick = () => {
+      if (sw && sw.controller) sw.controller.postMessage({ type: "replay" });
+      else replay().catch(() => {});
+    };
+    global.addEventListener("online", kick);
+    global.addEventListener("load", kick);
+  }
+})(self);
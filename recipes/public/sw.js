@@ -0,0 +1,62 @@
+/* Service worker for the recipes UI: offline app shell, plus the API layer in offline.js.
+ * Browsers only run it on https or localhost; over plain http the pages use offline.js directly.
+ */
+importScripts("/offline.js");
+
+const SHELL_CACHE = "recipes-shell-v1";
+const SHELL_FILES = [
+  "/",
+  "/index.html",
+  "/app.js",
+  "/styles.css",
+  "/offline.js",
+  "/meal-planner.html",
+  "/meal-planner.js",
+  "/grocery-list.html",
+  "/grocery.js",
+];
+
+self.addEventListener("install", (event) => {
+  event.waitUntil(caches.open(SHELL_CACHE).then(c => c.addAll(SHELL_FILES)).then(() => self.skipWaiting()));
+});
+
+self.addEventListener("activate", (event) => {
+  event.waitUntil(
+    caches.keys()
+      .then(keys => Promise.all(keys.filter(k => k !== SHELL_CACHE).map(k => caches.delete(k))))
+      .then(() => self.clients.claim())
+  );
+});
+
+// Pages and scripts: cached copy first, refreshed in the background for the next load
+async function shell(request) {
+  const cache = await caches.open(SHELL_CACHE);
+  const cached = await cache.match(request, { ignoreSearch: true });
+  const network = fetch(request).then((res) => {
+    if (res.ok) cache.put(request, res.clone());
+    return res;
+  });
+  if (cached) {
+    network.catch(() => {});
+    return cached;
+  }
+  return network;
+}
+
+self.addEventListener("fetch", (event) => {
+  const url = new URL(event.request.url);
+  if (url.origin !== self.location.origin) return;
+  if (url.pathname.startsWith("/api/")) {
+    event.respondWith(RecipesOffline.handle(event.request));
+  } else if (event.request.method === "GET") {
+    event.respondWith(shell(event.request));
+  }
+});
+
+self.addEventListener("sync", (event) => {
+  if (event.tag === "recipes-outbox") event.waitUntil(RecipesOffline.replay());
+});
+
+self.addEventListener("message", (event) => {
+  if (event.data && event.data.type === "replay") event.waitUntil(RecipesOffline.replay());
+});
@@ -1,16 +1,217 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, HttpUrl
-from main import scrape_recipe
+import asyncio
+import json
+import os
+import re
+import time
+from typing import Dict, Optional, Tuple
+
+import httpx
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, HttpUrl
+from crawl import CRAWL_CONCURRENCY, crawl_site
+from fetch import PageTooLarge, fetch_html_async, new_async_client
+from main import HEAVY_MODULES, RecipeData, extract_recipe_timed, warm_up
+from metrics import LabelLimiter, Registry, server_timing
+from pool import ParsePool, PoolSaturated
+from profiling import install_profiling
+from strategy import STRATEGY_JSONLD, STRATEGY_NONE, STRATEGY_SCRAPERS, StrategyMemo, domain_of
+
+PARSE_WORKERS = int(os.getenv("SCRAPER_PARSE_WORKERS", str(os.cpu_count() or 1)))
+MAX_PENDING = int(os.getenv("SCRAPER_MAX_PENDING", str(PARSE_WORKERS * 4)))
+# How long a crawl page waits for room in a saturated pool, and how often it looks
+CRAWL_ADMIT_SECONDS = 60.0
+CRAWL_ADMIT_RETRY_SECONDS = 0.25
 
 app = FastAPI(title="Recipe Scraper", version="1.0")
+install_profiling(app, "recipe-scraper")
+
+# The forkserver imports the extraction stack once; every worker forks from it warm
+pool = ParsePool(workers=PARSE_WORKERS, max_pending=MAX_PENDING, preload=("main", *HEAVY_MODULES))
+memo = StrategyMemo()
+http: Optional[httpx.AsyncClient] = None
+
+# ---------------- Metrics ----------------
+registry = Registry()
+domain_label = LabelLimiter(limit=int(os.getenv("SCRAPER_METRICS_MAX_DOMAINS", "200")))
+
+STAGE_SECONDS = registry.histogram(
+    "scraper_stage_seconds", "Time spent per scrape stage", ("stage", "domain", "path")
+)
+SCRAPE_SECONDS = registry.histogram(
+    "scraper_request_seconds", "End-to-end scrape time", ("domain", "path")
+)
+STRATEGY_HITS = registry.counter(
+    "scraper_strategy_cache_hits_total", "Scrapes routed by the per-domain strategy memo", ("domain",)
+)
+FALLBACKS = registry.counter(
+    "scraper_fallbacks_total", "Scrapes where recipe-scrapers failed and JSON-LD was used", ("domain",)
+)
+FAILURES = registry.counter(
+    "scraper_failures_total", "Failed scrapes by reason", ("domain", "reason")
+)
+POOL_GAUGE = registry.gauge("scraper_pool", "Parse pool state", ("stat",))
+
+
+def _failure_reason(e: Exception) -> str:
+    if isinstance(e, PoolSaturated):
+        return "saturated"
+    if isinstance(e, PageTooLarge):
+        return "too_large"
+    if isinstance(e, httpx.HTTPStatusError):
+        return "http_status"
+    if isinstance(e, httpx.RequestError):
+        return "network"
+    return "extract"
+
+
+def _record(domain: str, path: str, timings: Dict[str, float]) -> None:
+    for stage, secs in timings.items():
+        if stage != "total":
+            STAGE_SECONDS.observe(secs, stage, domain, path)
+    SCRAPE_SECONDS.observe(timings.get("total", 0.0), domain, path)
+
 
 class ScrapeRequest(BaseModel):
     url: HttpUrl
 
+class CrawlRequest(BaseModel):
+    url: HttpUrl  # site root, sitemap (.xml/.xml.gz) or recipe index page
+    include: Optional[str] = None  # regex; only matching URLs are crawled
+    exclude: Optional[str] = None
+    limit: Optional[int] = Field(default=None, ge=1)
+    full: bool = False  # ignore lastmod state and refetch everything
+    concurrency: Optional[int] = Field(default=None, ge=1)
+    # {page url: sitemap lastmod} the caller has already imported; unchanged pages are not fetched
+    known: Dict[str, Optional[str]] = {}
+
+@app.on_event("startup")
+async def startup():
+    global http
+    http = new_async_client()
+    memo.load()
+    pool.start()
+    # Boot stays lean: the heavy imports happen in the background, /readyz flips when done
+    app.state.warm_task = asyncio.create_task(pool.warm(warm_up))
+
+@app.on_event("shutdown")
+async def shutdown():
+    if http is not None:
+        await http.aclose()
+    pool.shutdown()
+    memo.save()
+
+async def _scrape(url: str, timings: Dict[str, float]) -> Tuple[RecipeData, str]:
+    """Fetch + parse one page, recording memo, metrics and per-stage timings."""
+    domain = domain_label(domain_of(url))
+    strategy = memo.choose(url)
+    if strategy is not None:
+        STRATEGY_HITS.inc(domain)
+
+    t0 = time.perf_counter()
+    try:
+        html = await fetch_html_async(
+            http, url, stop_at_jsonld=strategy == STRATEGY_JSONLD, timings=timings
+        )
+        t_pool = time.perf_counter()
+        recipe, used, worker_timings = await pool.run(extract_recipe_timed, url, html, strategy)
+        # Whatever the worker did not spend parsing was queueing + IPC
+        timings["queue"] = max(0.0, time.perf_counter() - t_pool - sum(worker_timings.values()))
+        timings.update(worker_timings)
+    except Exception as e:
+        timings["total"] = time.perf_counter() - t0
+        FAILURES.inc(domain, _failure_reason(e))
+        _record(domain, "error", timings)
+        memo.record_failure(url)
+        raise
+
+    timings["total"] = time.perf_counter() - t0
+    memo.record(url, strategy, used)
+    if strategy in (None, STRATEGY_SCRAPERS) and used != STRATEGY_SCRAPERS:
+        FALLBACKS.inc(domain)
+    if used == STRATEGY_NONE:
+        FAILURES.inc(domain, "no_recipe")
+    _record(domain, used, timings)
+    return recipe, used
+
 @app.post("/api/scrape")
-def scrape(req: ScrapeRequest):
+async def scrape(req: ScrapeRequest, response: Response):
+    url = str(req.url)
+    timings: Dict[str, float] = {}
     try:
-        recipe = scrape_recipe(str(req.url))
-        return recipe.model_dump()
+        async with pool.admit():
+            recipe, _ = await _scrape(url, timings)
+    except PoolSaturated as e:
+        FAILURES.inc(domain_label(domain_of(url)), _failure_reason(e))
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(
+            status_code=500, detail=str(e), headers={"Server-Timing": server_timing(timings)}
+        )
+
+    response.headers["Server-Timing"] = server_timing(timings)
+    return recipe.model_dump()
+
+@app.post("/api/crawl")
+async def crawl(req: CrawlRequest):
+    # Checked here: once the stream has started, errors can only be reported as events
+    for name in ("include", "exclude"):
+        try:
+            re.compile(getattr(req, name) or "")
+        except re.error as e:
+            raise HTTPException(status_code=400, detail=f"Invalid {name} pattern: {e}")
+
+    async def scrape_page(page_url: str):
+        # Admitted like any scrape, so crawls count against SCRAPER_MAX_PENDING; while interactive scrapes
+        # fill the pool the crawl waits for room (a page that never gets any becomes an error event)
+        deadline = time.monotonic() + CRAWL_ADMIT_SECONDS
+        while True:
+            try:
+                async with pool.admit():
+                    return await _scrape(page_url, {})
+            except PoolSaturated:
+                if time.monotonic() >= deadline:
+                    raise
+                await asyncio.sleep(CRAWL_ADMIT_RETRY_SECONDS)
+
+    async def events():
+        try:
+            async for event in crawl_site(
+                http,
+                str(req.url),
+                scrape_page,
+                include=req.include,
+                exclude=req.exclude,
+                limit=req.limit,
+                full=req.full,
+                concurrency=max(1, min(req.concurrency or CRAWL_CONCURRENCY, PARSE_WORKERS)),
+                known=req.known,
+            ):
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        except Exception as e:
+            # No summary will follow; tell the client why the stream ends here
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+
+    # One JSON event per line, streamed as pages complete
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.get("/readyz")
+def readyz():
+    if not pool.ready:
+        raise HTTPException(status_code=503, detail=pool.warm_error or "warming up")
+    return {"ready": True, "warm_seconds": round(pool.warm_seconds or 0.0, 3)}
+
+@app.get("/api/pool")
+def pool_stats():
+    return pool.stats()
+
+@app.get("/api/strategies")
+def strategies():
+    return memo.domains
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    for stat, value in pool.stats().items():
+        if isinstance(value, (int, float)):
+            POOL_GAUGE.set(value, stat)
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,231 @@
+"""
+Offline parse benchmark and regression check for the scraper.
+
+Replays the saved pages in fixtures/pages through scrape_recipe with an
+injected fetcher (no network), compares every result with its golden JSON
+and reports pages/sec, time per pipeline stage and peak memory.
+
+    python bench.py                   # check + benchmark
+    python bench.py --repeat 50       # more iterations for steadier numbers
+    python bench.py --strategy jsonld # measure the memoized JSON-LD fast path
+    python bench.py --update-golden   # rewrite golden files after an intended change
+    python bench.py --no-startup      # skip the import-time profile
+
+The startup section runs `python -X importtime` in fresh interpreters for
+the lean API boot (`import app`) and for the worker warm-up
+(`main.warm_up()`), so regressions in cold-start cost show up here too.
+
+Exits non-zero when any page or helper case differs from its golden output.
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from fetch import CHUNK_SIZE, BodyReader
+from main import _clean_lines, _iso8601_duration_to_minutes, _yield_text, extract_recipe, scrape_recipe
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_FIXTURES = HERE / "fixtures"
+SHARED_PYTHON = HERE.parent.parent / "_shared" / "python"
+
+STARTUP_PHASES = {
+    "boot": "import app",
+    "warm": "import main; main.warm_up()",
+}
+_IMPORTTIME = re.compile(r"^import time:\s+(\d+)\s+\|\s+\d+\s+\|\s*(\S+)")
+
+
+class Page:
+    def __init__(self, html_path: Path):
+        self.name = html_path.stem
+        self.html_path = html_path
+        self.golden_path = html_path.with_suffix(".json")
+        self.golden: Optional[dict] = None
+        if self.golden_path.exists():
+            self.golden = json.loads(self.golden_path.read_text(encoding="utf-8"))
+        self.url = (self.golden or {}).get("url") or f"https://fixtures.invalid/{self.name}/"
+        self.body = html_path.read_bytes()
+
+
+def replay_fetcher(pages: Dict[str, Page]):
+    # Same chunked BodyReader the live fetchers use, fed from disk
+    def fetch(url: str, timeout: int = 20, stop_at_jsonld: bool = False) -> str:
+        body = pages[url].body
+        reader = BodyReader(stop_at_jsonld=stop_at_jsonld)
+        for i in range(0, len(body), CHUNK_SIZE):
+            if reader.feed(body[i : i + CHUNK_SIZE]):
+                break
+        return reader.text()
+
+    return fetch
+
+
+def check_pages(pages: List[Page], fetcher, strategy: Optional[str], update: bool) -> List[str]:
+    failures = []
+    for p in pages:
+        html = fetcher(p.url, stop_at_jsonld=strategy == "jsonld")
+        recipe, used = extract_recipe(p.url, html, strategy=strategy)
+        actual = {"url": p.url, "path": used, "recipe": recipe.model_dump()}
+        if update:
+            p.golden_path.write_text(json.dumps(actual, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+            continue
+        if p.golden is None:
+            failures.append(f"{p.name}: no golden file (run with --update-golden)")
+            continue
+        expected = p.golden
+        # The JSON-LD fast path is allowed to skip recipe-scrapers
+        if strategy is None and expected.get("path") != used:
+            failures.append(f"{p.name}: path {used!r} != golden {expected.get('path')!r}")
+        for key, want in expected.get("recipe", {}).items():
+            got = actual["recipe"].get(key)
+            if got != want:
+                failures.append(f"{p.name}: {key} = {got!r}, golden {want!r}")
+    return failures
+
+
+def check_helpers(fixtures: Path) -> List[str]:
+    path = fixtures / "helpers.json"
+    if not path.exists():
+        return []
+    cases = json.loads(path.read_text(encoding="utf-8"))
+    failures = []
+    for raw, want in cases.get("iso8601_duration_to_minutes", []):
+        got = _iso8601_duration_to_minutes(raw)
+        if got != want:
+            failures.append(f"_iso8601_duration_to_minutes({raw!r}) = {got!r}, golden {want!r}")
+    for raw, want in cases.get("clean_lines", []):
+        got = _clean_lines(raw)
+        if got != want:
+            failures.append(f"_clean_lines({raw!r}) = {got!r}, golden {want!r}")
+    for raw, want in cases.get("yield_text", []):
+        got = _yield_text(raw)
+        if got != want:
+            failures.append(f"_yield_text({raw!r}) = {got!r}, golden {want!r}")
+    return failures
+
+
+def run_benchmark(pages: List[Page], fetcher, strategy: Optional[str], repeat: int) -> dict:
+    stages: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for p in pages:
+            scrape_recipe(p.url, strategy=strategy, fetcher=fetcher, timings=stages)
+    elapsed = time.perf_counter() - t0
+    n = repeat * len(pages)
+
+    # Separate pass: tracemalloc slows everything down, so keep it out of the timings
+    peaks = {}
+    tracemalloc.start()
+    for p in pages:
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        scrape_recipe(p.url, strategy=strategy, fetcher=fetcher)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks[p.name] = peak - base
+    tracemalloc.stop()
+
+    return {
+        "pages": n,
+        "seconds": elapsed,
+        "pages_per_second": n / elapsed if elapsed else 0.0,
+        "stage_ms_per_page": {k: v * 1000 / n for k, v in sorted(stages.items())},
+        "peak_bytes": peaks,
+    }
+
+
+def import_profile(code: str, top: int = 8) -> dict:
+    """Wall time and heaviest packages imported by `code` in a fresh interpreter."""
+    env = dict(os.environ)
+    if SHARED_PYTHON.is_dir():
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(SHARED_PYTHON), env.get("PYTHONPATH")]))
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=HERE,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - t0
+    # Self time summed per top-level package (fastapi, pydantic, recipe_scrapers, ...)
+    packages: Dict[str, float] = {}
+    for line in proc.stderr.splitlines():
+        m = _IMPORTTIME.match(line)
+        if m:
+            root = m.group(2).split(".")[0]
+            packages[root] = packages.get(root, 0.0) + int(m.group(1)) / 1e6
+    ranked = sorted(packages.items(), key=lambda x: x[1], reverse=True)
+    return {
+        "ok": proc.returncode == 0,
+        "wall_seconds": wall,
+        "import_seconds": sum(packages.values()),
+        "top": dict(ranked[:top]),
+    }
+
+
+def print_report(result: dict) -> None:
+    print(f"pages: {result['pages']}  time: {result['seconds']:.3f}s  throughput: {result['pages_per_second']:.1f} pages/s")
+    print("stage time per page:")
+    for stage, ms in result["stage_ms_per_page"].items():
+        print(f"  {stage:<16} {ms:8.3f} ms")
+    print("peak memory per page:")
+    for name, peak in result["peak_bytes"].items():
+        print(f"  {name:<24} {peak / 1024:8.1f} KiB")
+    for phase, prof in result.get("startup", {}).items():
+        status = "" if prof["ok"] else "  (FAILED)"
+        print(
+            f"startup {phase} ({STARTUP_PHASES[phase]}): {prof['wall_seconds'] * 1000:.0f} ms wall, "
+            f"{prof['import_seconds'] * 1000:.0f} ms importing{status}"
+        )
+        for mod, secs in prof["top"].items():
+            print(f"  {mod:<28} {secs * 1000:8.1f} ms")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("fixtures", nargs="?", default=str(DEFAULT_FIXTURES), help="fixtures directory")
+    ap.add_argument("--repeat", type=int, default=20, help="passes over the corpus")
+    ap.add_argument("--strategy", choices=["probe", "jsonld"], default="probe")
+    ap.add_argument("--update-golden", action="store_true")
+    ap.add_argument("--json", action="store_true", help="print the report as JSON")
+    ap.add_argument("--no-startup", action="store_true", help="skip the import-time profile")
+    args = ap.parse_args(argv)
+
+    fixtures = Path(args.fixtures)
+    pages = [Page(p) for p in sorted((fixtures / "pages").glob("*.html"))]
+    if not pages:
+        print(f"No fixtures in {fixtures / 'pages'}", file=sys.stderr)
+        return 2
+    by_url = {p.url: p for p in pages}
+    fetcher = replay_fetcher(by_url)
+    strategy = None if args.strategy == "probe" else args.strategy
+
+    failures = check_pages(pages, fetcher, strategy, args.update_golden) + check_helpers(fixtures)
+    if args.update_golden:
+        print(f"Updated {len(pages)} golden files")
+        return 0
+
+    result = run_benchmark(pages, fetcher, strategy, max(1, args.repeat))
+    if not args.no_startup:
+        result["startup"] = {phase: import_profile(code) for phase, code in STARTUP_PHASES.items()}
+    result["failures"] = failures
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+        for f in failures:
+            print(f"FAIL {f}")
+        print("golden: " + ("OK" if not failures else f"{len(failures)} mismatches"))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
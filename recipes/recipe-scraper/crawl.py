@@ -0,0 +1,375 @@
+"""
+Whole-site crawl: discover recipe pages from sitemaps (or an index page),
+fetch them politely and stream the extracted recipes as events.
+
+Re-crawls are incremental: pages whose sitemap <lastmod> matches the one
+recorded for them are not fetched again. The caller passes what it has
+recorded (`known`, as the recipes service does from its database); the
+standalone CLI keeps a per-host file instead. A page only counts as done
+once its event has been taken by the consumer.
+
+Standalone use against any site, e.g. the stand-in in fixtures/site:
+
+    python -m http.server 8900 -d fixtures/site
+    python crawl.py http://localhost:8900/ --state-dir /tmp/crawl
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+import zlib
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+from urllib.robotparser import RobotFileParser
+
+import httpx
+
+from fetch import USER_AGENT, BodyReader, check_content_length
+from strategy import STRATEGY_NONE
+
+CRAWL_STATE_DIR = os.getenv("SCRAPER_CRAWL_STATE_DIR", "/app/data/crawl")
+CRAWL_CONCURRENCY = int(os.getenv("SCRAPER_CRAWL_CONCURRENCY", "2"))
+CRAWL_DELAY_SECONDS = float(os.getenv("SCRAPER_CRAWL_DELAY", "1.0"))
+SITEMAP_MAX_BYTES = 50 * 1024 * 1024  # sitemaps.org limit for one file
+MAX_SITEMAPS = 200
+
+# Paths that are never recipe pages on typical food blogs
+_SKIP_PATH = re.compile(
+    r"/(tag|tags|category|categories|author|page|feed|wp-content|wp-json|search|cart|account|login)(/|$)"
+    r"|\.(jpe?g|png|gif|webp|svg|pdf|xml|gz|css|js|json|txt)$",
+    re.I,
+)
+_HREF = re.compile(r"""href\s*=\s*["']([^"'#]+)""", re.I)
+
+ScrapeFn = Callable[[str], Awaitable[Tuple[Any, str]]]
+
+
+class CrawlState:
+    """Per-host record of crawled pages: {url: {"lastmod", "recipe", "crawled_at"}}."""
+
+    def __init__(self, host: str, state_dir: Optional[str] = CRAWL_STATE_DIR):
+        self.path = os.path.join(state_dir, f"{host}.json") if state_dir else None
+        self.pages: Dict[str, Dict[str, Any]] = {}
+
+    def load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            return
+        if isinstance(data, dict):
+            self.pages = data
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.pages, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def is_current(self, url: str, lastmod: Optional[str]) -> bool:
+        seen = self.pages.get(url)
+        if not seen:
+            return False
+        # Without a lastmod there is no change signal; treat a seen page as current
+        return lastmod is None or seen.get("lastmod") == lastmod
+
+    def mark(self, url: str, lastmod: Optional[str], recipe: bool) -> None:
+        self.pages[url] = {"lastmod": lastmod, "recipe": recipe, "crawled_at": int(time.time())}
+
+    @classmethod
+    def from_known(cls, known: Dict[str, Optional[str]]) -> "CrawlState":
+        """In-memory state from {url: lastmod} recorded by the caller; never saved."""
+        state = cls("", None)
+        state.pages = {u: {"lastmod": lm} for u, lm in known.items()}
+        return state
+
+
+class _Throttle:
+    """Spaces request starts to the same host at least `delay` seconds apart."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            if self._next > now:
+                await asyncio.sleep(self._next - now)
+                now = self._next
+            self._next = now + self.delay
+
+
+async def _fetch_bytes(client: httpx.AsyncClient, url: str, max_bytes: int) -> Optional[bytes]:
+    async with client.stream("GET", url) as r:
+        if r.status_code >= 400:
+            return None
+        check_content_length(r.headers.get("Content-Length"), max_bytes)
+        reader = BodyReader(max_bytes=max_bytes)
+        async for chunk in r.aiter_bytes():
+            reader.feed(chunk)
+        return bytes(reader.buf)
+
+
+async def _load_robots(client: httpx.AsyncClient, origin: str) -> RobotFileParser:
+    rp = RobotFileParser()
+    try:
+        body = await _fetch_bytes(client, f"{origin}/robots.txt", 512 * 1024)
+    except Exception:
+        body = None
+    rp.parse(body.decode("utf-8", "replace").splitlines() if body else [])
+    return rp
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_sitemap(body: bytes, base: str) -> Tuple[List[Tuple[str, Optional[str]]], List[str]]:
+    """Returns ([(page url, lastmod)], [child sitemap urls]) for a urlset or sitemapindex."""
+    if body[:2] == b"\x1f\x8b":
+        d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        body = d.decompress(body, SITEMAP_MAX_BYTES)
+        if d.unconsumed_tail:
+            raise ValueError("Sitemap exceeds size limit")
+    root = ET.fromstring(body)
+    is_index = _local(root.tag) == "sitemapindex"
+    pages: List[Tuple[str, Optional[str]]] = []
+    children: List[str] = []
+    for node in root:
+        loc = lastmod = None
+        for child in node:
+            name = _local(child.tag)
+            if name == "loc":
+                loc = (child.text or "").strip()
+            elif name == "lastmod":
+                lastmod = (child.text or "").strip() or None
+        if not loc:
+            continue
+        loc = urljoin(base, loc)
+        if is_index:
+            children.append(loc)
+        else:
+            pages.append((loc, lastmod))
+    return pages, children
+
+
+async def discover(
+    client: httpx.AsyncClient, url: str, robots: RobotFileParser
+) -> Tuple[List[Tuple[str, Optional[str]]], str]:
+    """Candidate pages for url (a site, a sitemap or an index page) and where they came from."""
+    parts = urlsplit(url)
+    origin = f"{parts.scheme}://{parts.netloc}"
+
+    if re.search(r"\.xml(\.gz)?$", parts.path, re.I):
+        queue = [url]
+    else:
+        queue = [urljoin(origin, s) for s in (robots.site_maps() or [])]
+        if not queue:
+            queue = [f"{origin}/sitemap.xml", f"{origin}/sitemap_index.xml"]
+
+    pages: Dict[str, Optional[str]] = {}
+    seen = set()
+    while queue and len(seen) < MAX_SITEMAPS:
+        sm = queue.pop(0)
+        if sm in seen:
+            continue
+        seen.add(sm)
+        try:
+            body = await _fetch_bytes(client, sm, SITEMAP_MAX_BYTES)
+            if not body:
+                continue
+            entries, children = parse_sitemap(body, sm)
+        except Exception:
+            continue
+        queue.extend(children)
+        for loc, lastmod in entries:
+            pages[loc] = lastmod
+    if pages:
+        return list(pages.items()), "sitemap"
+
+    # No sitemap: treat the given page as a recipe index and follow its same-host links
+    try:
+        body = await _fetch_bytes(client, url, SITEMAP_MAX_BYTES)
+    except Exception:
+        body = None
+    links: Dict[str, None] = {}
+    for href in _HREF.findall((body or b"").decode("utf-8", "replace")):
+        link = urljoin(url, href.strip())
+        if urlsplit(link).netloc == parts.netloc and link != url:
+            links[link] = None
+    return [(link, None) for link in links], "index"
+
+
+def _wanted(url: str, include: Optional[re.Pattern], exclude: Optional[re.Pattern]) -> bool:
+    if exclude is not None and exclude.search(url):
+        return False
+    if include is not None:
+        return bool(include.search(url))
+    path = urlsplit(url).path or "/"
+    return path != "/" and not _SKIP_PATH.search(path)
+
+
+async def crawl_site(
+    client: httpx.AsyncClient,
+    url: str,
+    scrape: ScrapeFn,
+    include: Optional[str] = None,
+    exclude: Optional[str] = None,
+    limit: Optional[int] = None,
+    full: bool = False,
+    concurrency: int = CRAWL_CONCURRENCY,
+    delay: float = CRAWL_DELAY_SECONDS,
+    state_dir: Optional[str] = CRAWL_STATE_DIR,
+    known: Optional[Dict[str, Optional[str]]] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yields events as the crawl progresses:
+
+      {"type": "discovered", ...}          once, after sitemap/index discovery
+      {"type": "recipe", "url", "lastmod", "path", "recipe"}
+      {"type": "skipped", "url", "lastmod", "reason"} page had no recipe
+      {"type": "error", "url", "error"}
+      {"type": "summary", ...}             once, at the end
+
+    scrape(url) must return (RecipeData, extraction path). include/exclude
+    must be valid regexes (callers check them before streaming starts).
+    With `known` ({url: lastmod} the caller has recorded) it is used
+    instead of the state file in state_dir, and recording what was
+    delivered is up to the caller.
+    """
+    parts = urlsplit(url)
+    origin = f"{parts.scheme}://{parts.netloc}"
+    robots = await _load_robots(client, origin)
+    throttle = _Throttle(max(delay, float(robots.crawl_delay(USER_AGENT) or 0)))
+
+    if known is not None:
+        state = CrawlState.from_known(known)
+    else:
+        state = CrawlState(parts.hostname or "unknown", state_dir)
+        state.load()
+
+    entries, source = await discover(client, url, robots)
+    inc = re.compile(include) if include else None
+    exc = re.compile(exclude) if exclude else None
+    wanted = [(u, lm) for u, lm in entries if _wanted(u, inc, exc)]
+    candidates = [(u, lm) for u, lm in wanted if robots.can_fetch(USER_AGENT, u)]
+    changed = [(u, lm) for u, lm in candidates if full or not state.is_current(u, lm)]
+    todo = changed[: max(0, limit)] if limit is not None else changed
+
+    summary = {
+        "type": "summary",
+        "source": source,
+        "discovered": len(entries),
+        "candidates": len(candidates),
+        "disallowed": len(wanted) - len(candidates),
+        "unchanged": len(candidates) - len(changed),
+        "fetched": 0,
+        "recipes": 0,
+        "skipped": 0,
+        "errors": 0,
+    }
+    yield {"type": "discovered", "source": source, "pages": len(entries), "to_fetch": len(todo)}
+
+    async def crawl_page(page_url: str, lastmod: Optional[str]) -> Dict[str, Any]:
+        await throttle.wait()
+        try:
+            recipe, used = await scrape(page_url)
+        except Exception as e:
+            return {"type": "error", "url": page_url, "error": str(e)}
+        if used == STRATEGY_NONE:
+            return {"type": "skipped", "url": page_url, "lastmod": lastmod, "reason": "no_recipe"}
+        return {
+            "type": "recipe",
+            "url": page_url,
+            "lastmod": lastmod,
+            "path": used,
+            "recipe": recipe.model_dump(),
+        }
+
+    pending: asyncio.Queue = asyncio.Queue()
+    for item in todo:
+        pending.put_nowait(item)
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def worker() -> None:
+        while True:
+            try:
+                page_url, lastmod = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await results.put(await crawl_page(page_url, lastmod))
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, len(todo))))]
+    try:
+        for _ in range(len(todo)):
+            event = await results.get()
+            if event["type"] == "recipe":
+                summary["fetched"] += 1
+                summary["recipes"] += 1
+            elif event["type"] == "error":
+                summary["errors"] += 1
+            else:
+                summary["fetched"] += 1
+                summary["skipped"] += 1
+            yield event
+            # Only now has the consumer taken it; pages still queued when it stops are fetched again next time
+            if event["type"] != "error":
+                state.mark(event["url"], event["lastmod"], event["type"] == "recipe")
+    finally:
+        for w in workers:
+            w.cancel()
+        state.save()
+    yield summary
+
+
+async def _main(argv=None) -> int:
+    import argparse
+
+    from fetch import fetch_html_async, new_async_client
+    from main import extract_recipe
+
+    ap = argparse.ArgumentParser(description="Crawl a recipe site and print NDJSON events")
+    ap.add_argument("url", help="site, sitemap or recipe index URL")
+    ap.add_argument("--include", help="only crawl URLs matching this regex")
+    ap.add_argument("--exclude", help="skip URLs matching this regex")
+    ap.add_argument("--limit", type=int)
+    ap.add_argument("--full", action="store_true", help="ignore lastmod state and refetch everything")
+    ap.add_argument("--concurrency", type=int, default=CRAWL_CONCURRENCY)
+    ap.add_argument("--delay", type=float, default=CRAWL_DELAY_SECONDS)
+    ap.add_argument("--state-dir", default=CRAWL_STATE_DIR)
+    args = ap.parse_args(argv)
+
+    async with new_async_client() as client:
+
+        async def scrape(page_url: str):
+            html = await fetch_html_async(client, page_url)
+            return extract_recipe(page_url, html)
+
+        async for event in crawl_site(
+            client,
+            args.url,
+            scrape,
+            include=args.include,
+            exclude=args.exclude,
+            limit=args.limit,
+            full=args.full,
+            concurrency=args.concurrency,
+            delay=args.delay,
+            state_dir=args.state_dir,
+        ):
+            print(json.dumps(event, ensure_ascii=False), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(_main()))
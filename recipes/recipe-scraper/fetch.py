@@ -0,0 +1,185 @@
+import os
+import re
+import time
+from typing import Dict, Optional
+
+import httpx
+
+USER_AGENT = "Mozilla/5.0 (compatible; RecipeScraper/1.0)"
+
+# Hard cap on the decoded body we are willing to hold for a single page.
+MAX_HTML_BYTES = int(os.getenv("SCRAPER_MAX_HTML_BYTES", str(8 * 1024 * 1024)))
+CHUNK_SIZE = 64 * 1024
+
+# Connection pool: number of hosts kept warm, and keep-alive sockets per host.
+POOL_HOSTS = int(os.getenv("SCRAPER_POOL_HOSTS", "32"))
+POOL_PER_HOST = int(os.getenv("SCRAPER_POOL_PER_HOST", "4"))
+
+
+class PageTooLarge(ValueError):
+    pass
+
+
+_JSONLD_OPEN = re.compile(rb"<script[^>]*application/ld\+json[^>]*>", re.I)
+_SCRIPT_CLOSE = re.compile(rb"</script\s*>", re.I)
+_RECIPE_TYPE = re.compile(rb'"@type"\s*:\s*(?:\[[^\]]*)?"Recipe"')
+_META_CHARSET = re.compile(rb"<meta[^>]+charset=[\"']?([\w.:-]+)", re.I)
+_HEADER_CHARSET = re.compile(r"charset=[\"']?([\w.:-]+)", re.I)
+
+
+class BodyReader:
+    """
+    Incrementally collects a (already decompressed) response body.
+
+    Enforces max_bytes and, when stop_at_jsonld is set, reports completion as
+    soon as a full <script type="application/ld+json"> block describing a
+    Recipe has arrived, so the caller can stop reading the rest of the page.
+    """
+
+    def __init__(self, max_bytes: int = MAX_HTML_BYTES, stop_at_jsonld: bool = False):
+        self.buf = bytearray()
+        self.max_bytes = max_bytes
+        self.stop_at_jsonld = stop_at_jsonld
+        self.stopped_early = False
+        self._scan = 0
+
+    def feed(self, chunk: bytes) -> bool:
+        """Append a chunk. Returns True once no more data is needed."""
+        if not chunk:
+            return False
+        if len(self.buf) + len(chunk) > self.max_bytes:
+            raise PageTooLarge(f"Page exceeds {self.max_bytes} bytes")
+        self.buf += chunk
+        if self.stop_at_jsonld and self._recipe_block_seen():
+            self.stopped_early = True
+            return True
+        return False
+
+    def _recipe_block_seen(self) -> bool:
+        while True:
+            start = _JSONLD_OPEN.search(self.buf, self._scan)
+            if not start:
+                # An opening tag may be split across chunks; rescan its tail next time.
+                self._scan = max(self._scan, len(self.buf) - 256)
+                return False
+            end = _SCRIPT_CLOSE.search(self.buf, start.end())
+            if not end:
+                self._scan = start.start()
+                return False
+            if _RECIPE_TYPE.search(self.buf, start.end(), end.start()):
+                return True
+            self._scan = end.end()
+
+    def text(self, content_type: Optional[str] = None) -> str:
+        encoding = None
+        if content_type:
+            m = _HEADER_CHARSET.search(content_type)
+            if m:
+                encoding = m.group(1)
+        if not encoding:
+            m = _META_CHARSET.search(self.buf, 0, 4096)
+            if m:
+                encoding = m.group(1).decode("ascii", "ignore")
+        try:
+            return self.buf.decode(encoding or "utf-8", errors="replace")
+        except LookupError:
+            return self.buf.decode("utf-8", errors="replace")
+
+
+def check_content_length(value: Optional[str], max_bytes: int) -> None:
+    # Content-Length is the compressed size, so anything above the cap can only grow.
+    if value and value.isdigit() and int(value) > max_bytes:
+        raise PageTooLarge(f"Page exceeds {max_bytes} bytes (Content-Length {value})")
+
+
+_session = None
+
+
+def _get_session():
+    # Only the sync path (CLI / bench) needs requests; the API uses httpx
+    global _session
+    if _session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        s = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_PER_HOST)
+        s.mount("http://", adapter)
+        s.mount("https://", adapter)
+        s.headers["User-Agent"] = USER_AGENT
+        _session = s
+    return _session
+
+
+def fetch_html(
+    url: str,
+    timeout: int = 20,
+    max_bytes: int = MAX_HTML_BYTES,
+    stop_at_jsonld: bool = False,
+) -> str:
+    with _get_session().get(url, timeout=timeout, stream=True) as r:
+        r.raise_for_status()
+        check_content_length(r.headers.get("Content-Length"), max_bytes)
+        reader = BodyReader(max_bytes=max_bytes, stop_at_jsonld=stop_at_jsonld)
+        # iter_content decompresses gzip/deflate chunk by chunk
+        for chunk in r.iter_content(CHUNK_SIZE):
+            if reader.feed(chunk):
+                break
+        return reader.text(r.headers.get("Content-Type"))
+
+
+def new_async_client(timeout: float = 20) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=timeout,
+        follow_redirects=True,
+        headers={"User-Agent": USER_AGENT},
+        limits=httpx.Limits(
+            max_connections=POOL_HOSTS * POOL_PER_HOST,
+            max_keepalive_connections=POOL_HOSTS,
+        ),
+    )
+
+
+# httpcore trace steps -> timing stages (connect includes DNS resolution)
+_TRACE_STAGES = {
+    "connect_tcp": "connect",
+    "start_tls": "tls",
+    "receive_response_headers": "wait",
+}
+
+
+def _tracer(timings: Dict[str, float]):
+    started: Dict[str, float] = {}
+
+    async def trace(event: str, info: dict) -> None:
+        step, _, phase = event.rpartition(".")
+        stage = _TRACE_STAGES.get(step.rpartition(".")[2])
+        if stage is None:
+            return
+        if phase == "started":
+            started[step] = time.perf_counter()
+        elif phase in ("complete", "failed") and step in started:
+            timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started.pop(step)
+
+    return trace
+
+
+async def fetch_html_async(
+    client: httpx.AsyncClient,
+    url: str,
+    max_bytes: int = MAX_HTML_BYTES,
+    stop_at_jsonld: bool = False,
+    timings: Optional[Dict[str, float]] = None,
+) -> str:
+    extensions = {"trace": _tracer(timings)} if timings is not None else None
+    async with client.stream("GET", url, extensions=extensions) as r:
+        t0 = time.perf_counter()
+        r.raise_for_status()
+        check_content_length(r.headers.get("Content-Length"), max_bytes)
+        reader = BodyReader(max_bytes=max_bytes, stop_at_jsonld=stop_at_jsonld)
+        async for chunk in r.aiter_bytes(CHUNK_SIZE):
+            if reader.feed(chunk):
+                break
+        if timings is not None:
+            timings["download"] = timings.get("download", 0.0) + time.perf_counter() - t0
+        return reader.text(r.headers.get("Content-Type"))
@@ -1,11 +1,17 @@
 import re
-import requests
-from bs4 import BeautifulSoup
-from recipe_scrapers import scrape_me
-from recipe_scrapers._exceptions import WebsiteNotImplementedError
-from typing import Optional, Dict, Any, List
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Callable, List, Tuple
 from pydantic import BaseModel, field_validator
 
+from fetch import fetch_html
+from strategy import STRATEGY_JSONLD, STRATEGY_NONE, STRATEGY_SCRAPERS
+
+# bs4/lxml and recipe_scrapers (which registers hundreds of site scrapers)
+# are imported on first use, so the API process boots without them and
+# only the parse workers pay for them (see warm_up).
+HEAVY_MODULES = ("bs4", "lxml.etree", "recipe_scrapers")
+
 def _image_to_url(image_field: Any) -> Optional[str]:
     if not image_field:
         return None
@@ -49,6 +55,8 @@ def _safe_call(fn, default=None):
         return default
 
 def _extract_jsonld_recipe(html: str) -> Dict[str, Any]:
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html, "lxml")
     scripts = soup.find_all("script", attrs={"type": "application/ld+json"})
     import json
@@ -89,6 +97,14 @@ def _iso8601_duration_to_minutes(val: Optional[str]) -> Optional[int]:
     mins = int(m.group(3)) if m.group(3) else 0
     return days * 24 * 60 + hours * 60 + mins
 
+def _yield_text(val: Any) -> Optional[str]:
+    # recipeYield may be a number, a string or a list of alternatives (["4", "4 servings"]); keep the first
+    if isinstance(val, list):
+        val = next((v for v in val if v is not None and str(v).strip()), None)
+    if val is None or not str(val).strip():
+        return None
+    return str(val).strip()
+
 class RecipeData(BaseModel):
     url: str
     title: Optional[str] = None
@@ -108,33 +124,36 @@ class RecipeData(BaseModel):
     def normalize_image(cls, v: Any) -> Optional[str]:
         return _image_to_url(v)
 
-def scrape_recipe(url: str, timeout: int = 20) -> RecipeData:
-    headers = {"User-Agent": "Mozilla/5.0 (compatible; RecipeScraper/1.0)"}
-    r = requests.get(url, headers=headers, timeout=timeout)
-    r.raise_for_status()
-    html = r.text
-
-    # Best path: recipe-scrapers
+@contextmanager
+def _stage(timings: Optional[Dict[str, float]], name: str):
+    # Accumulates wall time per pipeline stage when the caller passes a dict
+    if timings is None:
+        yield
+        return
+    t0 = time.perf_counter()
     try:
-        scraper = scrape_me(url, html=html)
-        return RecipeData(
-            url=url,
-            title=_safe_call(scraper.title),
-            author=_safe_call(scraper.author),
-            canonical_url=_safe_call(scraper.canonical_url),
-            total_time_minutes=_safe_call(scraper.total_time),
-            yields=_safe_call(scraper.yields),
-            image=_safe_call(scraper.image),
-            ingredients=_clean_lines(_safe_call(scraper.ingredients, default=[]) or []),
-            instructions=_clean_lines(_safe_call(scraper.instructions_list, default=[]) or []),
-            nutrition=_safe_call(scraper.nutrients, default={}) or {},
-        )
-    except WebsiteNotImplementedError:
-        pass
-    except Exception:
-        pass
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - t0
 
-    # Fallback: JSON-LD
+def _fields_from_scraper(url: str, html: str) -> Dict[str, Any]:
+    from recipe_scrapers import scrape_me
+
+    scraper = scrape_me(url, html=html)
+    return dict(
+        url=url,
+        title=_safe_call(scraper.title),
+        author=_safe_call(scraper.author),
+        canonical_url=_safe_call(scraper.canonical_url),
+        total_time_minutes=_safe_call(scraper.total_time),
+        yields=_safe_call(scraper.yields),
+        image=_safe_call(scraper.image),
+        ingredients=_clean_lines(_safe_call(scraper.ingredients, default=[]) or []),
+        instructions=_clean_lines(_safe_call(scraper.instructions_list, default=[]) or []),
+        nutrition=_safe_call(scraper.nutrients, default={}) or {},
+    )
+
+def _fields_from_jsonld(url: str, html: str) -> Dict[str, Any]:
     recipe = _extract_jsonld_recipe(html)
 
     ingredients = recipe.get("recipeIngredient") or []
@@ -156,7 +175,7 @@ def scrape_recipe(url: str, timeout: int = 20) -> RecipeData:
     if isinstance(nutrition, dict):
         nutrition.pop("@type", None)
 
-    return RecipeData(
+    return dict(
         url=url,
         title=recipe.get("name"),
         author=(recipe.get("author", {}).get("name") if isinstance(recipe.get("author"), dict) else None),
@@ -164,181 +183,77 @@ def scrape_recipe(url: str, timeout: int = 20) -> RecipeData:
         prep_time_minutes=_iso8601_duration_to_minutes(recipe.get("prepTime")),
         cook_time_minutes=_iso8601_duration_to_minutes(recipe.get("cookTime")),
         total_time_minutes=_iso8601_duration_to_minutes(recipe.get("totalTime")),
-        yields=str(recipe.get("recipeYield")) if recipe.get("recipeYield") is not None else None,
+        yields=_yield_text(recipe.get("recipeYield")),
         image=recipe.get("image"),
         ingredients=_clean_lines(ingredients if isinstance(ingredients, list) else []),
         instructions=_clean_lines(instructions),
         nutrition=nutrition if isinstance(nutrition, dict) else {},
     )
-import re
-import requests
-from bs4 import BeautifulSoup
-from recipe_scrapers import scrape_me
-from recipe_scrapers._exceptions import WebsiteNotImplementedError
-from typing import Optional, Dict, Any, List
-from pydantic import BaseModel, field_validator
-
-def _image_to_url(image_field: Any) -> Optional[str]:
-    if not image_field:
-        return None
-    if isinstance(image_field, str):
-        s = image_field.strip()
-        return s or None
-    if isinstance(image_field, list):
-        for item in image_field:
-            u = _image_to_url(item)
-            if u:
-                return u
-        return None
-    if isinstance(image_field, dict):
-        for key in ("url", "contentUrl", "thumbnailUrl"):
-            v = image_field.get(key)
-            if isinstance(v, str) and v.strip():
-                return v.strip()
-        return _image_to_url(image_field.get("image"))
-    return None
-
-def _clean_lines(lines: List[str]) -> List[str]:
-    out = []
-    for line in lines or []:
-        if not line:
-            continue
-        s = re.sub(r"\s+", " ", str(line)).strip()
-        if s:
-            out.append(s)
-    seen = set()
-    deduped = []
-    for s in out:
-        if s not in seen:
-            seen.add(s)
-            deduped.append(s)
-    return deduped
 
-def _safe_call(fn, default=None):
-    try:
-        return fn()
-    except Exception:
-        return default
+def extract_recipe(
+    url: str,
+    html: str,
+    strategy: Optional[str] = None,
+    timings: Optional[Dict[str, float]] = None,
+) -> Tuple[RecipeData, str]:
+    """
+    Returns the recipe and the extraction path that produced it.
+
+    strategy=None probes recipe-scrapers then JSON-LD; STRATEGY_JSONLD skips
+    straight to the JSON-LD fallback. If timings is given, seconds spent per
+    stage are added to it.
+    """
+    from recipe_scrapers._exceptions import WebsiteNotImplementedError
 
-def _extract_jsonld_recipe(html: str) -> Dict[str, Any]:
-    soup = BeautifulSoup(html, "lxml")
-    scripts = soup.find_all("script", attrs={"type": "application/ld+json"})
-    import json
-    for sc in scripts:
-        if not sc.string:
-            continue
+    # Best path: recipe-scrapers
+    if strategy != STRATEGY_JSONLD:
         try:
-            data = json.loads(sc.string)
+            with _stage(timings, "recipe_scrapers"):
+                fields = _fields_from_scraper(url, html)
+            with _stage(timings, "validate"):
+                return RecipeData(**fields), STRATEGY_SCRAPERS
+        except WebsiteNotImplementedError:
+            pass
         except Exception:
-            continue
-
-        candidates = []
-        if isinstance(data, dict):
-            if isinstance(data.get("@graph"), list):
-                candidates.extend(data["@graph"])
-            else:
-                candidates.append(data)
-        elif isinstance(data, list):
-            candidates.extend(data)
-
-        for item in candidates:
-            if not isinstance(item, dict):
-                continue
-            t = item.get("@type")
-            if t == "Recipe" or (isinstance(t, list) and "Recipe" in t):
-                return item
-    return {}
-
-def _iso8601_duration_to_minutes(val: Optional[str]) -> Optional[int]:
-    if not val or not isinstance(val, str):
-        return None
-    pattern = r"^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?)?$"
-    m = re.match(pattern, val.strip().upper())
-    if not m:
-        return None
-    days = int(m.group(1)) if m.group(1) else 0
-    hours = int(m.group(2)) if m.group(2) else 0
-    mins = int(m.group(3)) if m.group(3) else 0
-    return days * 24 * 60 + hours * 60 + mins
-
-class RecipeData(BaseModel):
-    url: str
-    title: Optional[str] = None
-    author: Optional[str] = None
-    canonical_url: Optional[str] = None
-    total_time_minutes: Optional[int] = None
-    prep_time_minutes: Optional[int] = None
-    cook_time_minutes: Optional[int] = None
-    yields: Optional[str] = None
-    image: Optional[str] = None
-    ingredients: List[str] = []
-    instructions: List[str] = []
-    nutrition: Dict[str, Any] = {}
-
-    @field_validator("image", mode="before")
-    @classmethod
-    def normalize_image(cls, v: Any) -> Optional[str]:
-        return _image_to_url(v)
-
-def scrape_recipe(url: str, timeout: int = 20) -> RecipeData:
-    headers = {"User-Agent": "Mozilla/5.0 (compatible; RecipeScraper/1.0)"}
-    r = requests.get(url, headers=headers, timeout=timeout)
-    r.raise_for_status()
-    html = r.text
-
-    # Best path: recipe-scrapers
-    try:
-        scraper = scrape_me(url, html=html)
-        return RecipeData(
-            url=url,
-            title=_safe_call(scraper.title),
-            author=_safe_call(scraper.author),
-            canonical_url=_safe_call(scraper.canonical_url),
-            total_time_minutes=_safe_call(scraper.total_time),
-            yields=_safe_call(scraper.yields),
-            image=_safe_call(scraper.image),
-            ingredients=_clean_lines(_safe_call(scraper.ingredients, default=[]) or []),
-            instructions=_clean_lines(_safe_call(scraper.instructions_list, default=[]) or []),
-            nutrition=_safe_call(scraper.nutrients, default={}) or {},
-        )
-    except WebsiteNotImplementedError:
-        pass
-    except Exception:
-        pass
+            pass
 
     # Fallback: JSON-LD
-    recipe = _extract_jsonld_recipe(html)
-
-    ingredients = recipe.get("recipeIngredient") or []
-    if isinstance(ingredients, str):
-        ingredients = [ingredients]
-
-    instructions_raw = recipe.get("recipeInstructions") or []
-    instructions: List[str] = []
-    if isinstance(instructions_raw, str):
-        instructions = [instructions_raw]
-    elif isinstance(instructions_raw, list):
-        for step in instructions_raw:
-            if isinstance(step, str):
-                instructions.append(step)
-            elif isinstance(step, dict) and step.get("text"):
-                instructions.append(step["text"])
-
-    nutrition = recipe.get("nutrition") or {}
-    if isinstance(nutrition, dict):
-        nutrition.pop("@type", None)
-
-    return RecipeData(
-        url=url,
-        title=recipe.get("name"),
-        author=(recipe.get("author", {}).get("name") if isinstance(recipe.get("author"), dict) else None),
-        canonical_url=recipe.get("mainEntityOfPage") if isinstance(recipe.get("mainEntityOfPage"), str) else None,
-        prep_time_minutes=_iso8601_duration_to_minutes(recipe.get("prepTime")),
-        cook_time_minutes=_iso8601_duration_to_minutes(recipe.get("cookTime")),
-        total_time_minutes=_iso8601_duration_to_minutes(recipe.get("totalTime")),
-        yields=str(recipe.get("recipeYield")) if recipe.get("recipeYield") is not None else None,
-        image=recipe.get("image"),
-        ingredients=_clean_lines(ingredients if isinstance(ingredients, list) else []),
-        instructions=_clean_lines(instructions),
-        nutrition=nutrition if isinstance(nutrition, dict) else {},
-    )
+    with _stage(timings, "jsonld"):
+        fields = _fields_from_jsonld(url, html)
+    with _stage(timings, "validate"):
+        recipe = RecipeData(**fields)
+    used = STRATEGY_JSONLD if (recipe.title or recipe.ingredients) else STRATEGY_NONE
+    return recipe, used
+
+def extract_recipe_timed(
+    url: str, html: str, strategy: Optional[str] = None
+) -> Tuple[RecipeData, str, Dict[str, float]]:
+    # Process-pool entry point: timings cannot be passed back through a shared dict
+    timings: Dict[str, float] = {}
+    recipe, used = extract_recipe(url, html, strategy=strategy, timings=timings)
+    return recipe, used, timings
+
+def scrape_recipe(
+    url: str,
+    timeout: int = 20,
+    strategy: Optional[str] = None,
+    fetcher: Callable[..., str] = fetch_html,
+    timings: Optional[Dict[str, float]] = None,
+) -> RecipeData:
+    # On JSON-LD domains the fetcher can stop as soon as the recipe block has arrived
+    with _stage(timings, "fetch"):
+        html = fetcher(url, timeout=timeout, stop_at_jsonld=strategy == STRATEGY_JSONLD)
+    recipe, _ = extract_recipe(url, html, strategy=strategy, timings=timings)
+    return recipe
+
+_WARM_UP_PAGE = (
+    '<html><head><script type="application/ld+json">'
+    '{"@type":"Recipe","name":"warm-up","recipeIngredient":["1 egg"],"totalTime":"PT1M"}'
+    "</script></head><body></body></html>"
+)
+
+def warm_up() -> float:
+    """Import the extraction stack and run one tiny page through it; returns seconds taken."""
+    t0 = time.perf_counter()
+    extract_recipe("https://warm-up.invalid/recipe", _WARM_UP_PAGE)
+    return time.perf_counter() - t0
@@ -0,0 +1,148 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Optional, Tuple
+
+
+class PoolSaturated(RuntimeError):
+    pass
+
+
+def _timed_call(fn: Callable, *args) -> Tuple[Any, float]:
+    # Runs inside the worker process; reports how long the worker was busy.
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - t0
+
+
+class ParsePool:
+    """
+    Process pool for CPU-bound parsing, with admission control.
+
+    Every scrape is admitted before it starts fetching; once max_pending
+    scrapes are in flight, admit() raises PoolSaturated so the API can
+    answer 429 instead of queueing unbounded work (and memory).
+    """
+
+    def __init__(self, workers: int, max_pending: int, preload: Tuple[str, ...] = ()):
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.preload = list(preload)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._started = time.monotonic()
+
+        self.pending = 0  # admitted scrapes (fetching or parsing)
+        self.submitted = 0  # jobs handed to the executor and not finished
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.busy_seconds = 0.0
+
+        self.ready = False
+        self.warm_seconds: Optional[float] = None
+        self.warm_error: Optional[str] = None
+        self.restarts = 0
+        self._warm_fn: Optional[Callable] = None
+        self._warm_task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        # forkserver: workers fork from a clean server that already imported
+        # the heavy parsing modules, instead of from the threaded event loop.
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(self.preload)
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+        self._started = time.monotonic()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def warm(self, fn: Callable) -> None:
+        """Spawn every worker (and the forkserver) by running fn once per worker."""
+        if self._executor is None:
+            raise RuntimeError("Parse pool is not started")
+        self._warm_fn = fn
+        executor = self._executor
+        loop = asyncio.get_running_loop()
+        t0 = time.perf_counter()
+        try:
+            await asyncio.gather(
+                *(loop.run_in_executor(executor, fn) for _ in range(self.workers))
+            )
+        except Exception as e:
+            self.warm_error = str(e) or e.__class__.__name__
+            return
+        if executor is not self._executor:
+            return  # replaced meanwhile; the new pool's warm-up reports instead
+        self.warm_seconds = time.perf_counter() - t0
+        self.warm_error = None
+        self.ready = True
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        # Every job that was in flight sees the same BrokenProcessPool; only the first replaces the
+        # pool, or the later ones would cancel jobs already running on its replacement.
+        if broken is not self._executor:
+            return
+        self.shutdown()
+        self.start()
+        self.restarts += 1
+        self.ready = False
+        if self._warm_fn is not None:
+            self._warm_task = asyncio.get_running_loop().create_task(self.warm(self._warm_fn))
+
+    @asynccontextmanager
+    async def admit(self):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PoolSaturated(f"{self.pending} scrapes in flight")
+        self.pending += 1
+        try:
+            yield
+        finally:
+            self.pending -= 1
+
+    async def run(self, fn: Callable, *args) -> Any:
+        if self._executor is None:
+            raise RuntimeError("Parse pool is not started")
+        loop = asyncio.get_running_loop()
+        executor = self._executor
+        self.submitted += 1
+        try:
+            result, busy = await loop.run_in_executor(executor, _timed_call, fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM on a huge page); replace the pool for later jobs.
+            self.failed += 1
+            self._restart(executor)
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.submitted -= 1
+        self.completed += 1
+        self.busy_seconds += busy
+        return result
+
+    def stats(self) -> dict:
+        running = min(self.submitted, self.workers)
+        uptime = max(time.monotonic() - self._started, 1e-9)
+        return {
+            "ready": self.ready,
+            "workers": self.workers,
+            "cpu_count": os.cpu_count(),
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "running": running,
+            "queue_depth": self.submitted - running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "restarts": self.restarts,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "utilization": round(min(1.0, self.busy_seconds / (uptime * self.workers)), 4),
+        }
@@ -0,0 +1,118 @@
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+STRATEGY_SCRAPERS = "recipe_scrapers"
+STRATEGY_JSONLD = "jsonld"
+STRATEGY_NONE = "none"  # nothing usable was extracted
+
+STRATEGY_PATH = os.getenv("SCRAPER_STRATEGY_PATH", "/app/data/strategies.json")
+REPROBE_EVERY = int(os.getenv("SCRAPER_REPROBE_EVERY", "50"))
+REPROBE_SECONDS = int(os.getenv("SCRAPER_REPROBE_SECONDS", str(7 * 24 * 3600)))
+SAVE_INTERVAL_SECONDS = 30
+
+
+def domain_of(url: str) -> str:
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class StrategyMemo:
+    """
+    Remembers which extraction path worked for each domain.
+
+    Domains where recipe-scrapers has no scraper (or keeps failing) are
+    routed straight to the JSON-LD path, which also lets the fetcher stop
+    early. Every REPROBE_EVERY requests, or after REPROBE_SECONDS, a domain
+    goes through the full chain again in case support was added or the
+    site changed.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = STRATEGY_PATH,
+        reprobe_every: int = REPROBE_EVERY,
+        reprobe_seconds: int = REPROBE_SECONDS,
+    ):
+        self.path = path
+        self.reprobe_every = max(1, reprobe_every)
+        self.reprobe_seconds = reprobe_seconds
+        self.domains: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self._last_save = 0.0
+
+    def _entry(self, domain: str) -> Dict[str, Any]:
+        e = self.domains.get(domain)
+        if e is None:
+            e = {
+                "strategy": None,
+                "hits": {},
+                "scraper_errors": 0,
+                "failures": 0,
+                "since_probe": 0,
+                "last_probe": 0.0,
+            }
+            self.domains[domain] = e
+        return e
+
+    def choose(self, url: str) -> Optional[str]:
+        """Strategy to use for url, or None to probe the full chain."""
+        e = self.domains.get(domain_of(url))
+        if not e or not e["strategy"]:
+            return None
+        if e["since_probe"] >= self.reprobe_every:
+            return None
+        if time.time() - e["last_probe"] >= self.reprobe_seconds:
+            return None
+        return e["strategy"]
+
+    def record(self, url: str, chosen: Optional[str], used: str) -> None:
+        e = self._entry(domain_of(url))
+        e["hits"][used] = e["hits"].get(used, 0) + 1
+        if chosen is None:
+            e["since_probe"] = 0
+            e["last_probe"] = time.time()
+        else:
+            e["since_probe"] += 1
+
+        if used == STRATEGY_NONE:
+            e["failures"] += 1
+        else:
+            e["strategy"] = used
+        if chosen in (None, STRATEGY_SCRAPERS) and used != STRATEGY_SCRAPERS:
+            e["scraper_errors"] += 1
+        self._touch()
+
+    def record_failure(self, url: str) -> None:
+        self._entry(domain_of(url))["failures"] += 1
+        self._touch()
+
+    def _touch(self) -> None:
+        self._dirty = True
+        if time.monotonic() - self._last_save >= SAVE_INTERVAL_SECONDS:
+            self.save()
+
+    def load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            # A corrupt memo only costs some re-probing
+            return
+        if isinstance(data, dict):
+            self.domains = {k: v for k, v in data.items() if isinstance(v, dict)}
+
+    def save(self) -> None:
+        self._last_save = time.monotonic()
+        if not self.path or not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.domains, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+        self._dirty = False
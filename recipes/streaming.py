@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Callable, Iterator, Mapping, Optional
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import text
+
+NDJSON = "application/x-ndjson"
+# Rows fetched from the server-side cursor (and written out) at a time
+STREAM_BATCH = int(os.getenv("STREAM_BATCH", "500"))
+
+
+def wants_stream(request: Request, stream: Optional[bool]) -> bool:
+    """`?stream=1`, or an Accept header asking for NDJSON."""
+    return bool(stream) or NDJSON in request.headers.get("accept", "")
+
+
+def stream_rows(engine, sql: str, params: dict, to_json: Callable[[Mapping[str, Any]], str]) -> StreamingResponse:
+    """
+    Stream the rows of `sql` as NDJSON, one object per line.
+
+    Rows come through a server-side cursor STREAM_BATCH at a time and each
+    batch is written out as soon as it is serialised, so memory stays flat
+    however many rows match and the first bytes leave right away. The whole
+    listing is one statement, so it is a consistent snapshot even while
+    writes go on. Streams bypass the view cache: caching would mean keeping
+    the full result in memory again.
+    """
+
+    def lines() -> Iterator[bytes]:
+        # Runs in the threadpool; closing the generator (client gone) releases the cursor and connection
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, max_row_buffer=STREAM_BATCH).execute(text(sql), params)
+            for rows in result.mappings().partitions(STREAM_BATCH):
+                yield "".join(to_json(r) + "\n" for r in rows).encode()
+
+    return StreamingResponse(lines(), media_type=NDJSON)
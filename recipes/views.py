@@ -0,0 +1,230 @@
+import json
+import os
+import select
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+from sqlalchemy import text
+
+CHANNEL = "recipes_changes"
+# Held by every write transaction; see write()
+WRITE_LOCK_KEY = 0x7265636971
+VIEW_CACHE_SIZE = int(os.getenv("VIEW_CACHE_SIZE", "512"))
+# Pause between reconnect attempts of the listener; views are not cached meanwhile
+LISTEN_RECONNECT_SECONDS = float(os.getenv("LISTEN_RECONNECT_SECONDS", "2"))
+# An idle LISTEN connection is pinged this often, so a dead one is noticed
+LISTEN_PING_SECONDS = 15.0
+
+
+def create_view_versions(conn) -> None:
+    """Schema migration 7: one version number per cache topic, bumped by every write."""
+    conn.execute(
+        text(
+            """
+            CREATE TABLE IF NOT EXISTS view_versions (
+              topic TEXT PRIMARY KEY,
+              version BIGINT NOT NULL DEFAULT 0
+            )
+            """
+        )
+    )
+
+
+class ViewCache:
+    """
+    Per-process cache of read views (recipe lists, meal ranges, reports),
+    kept correct across uvicorn workers.
+
+    Every view is stored under the topics it depends on ("recipes", "meals"),
+    together with the topics' versions in view_versions as read before it
+    was computed. Write paths go through write(), which bumps those versions
+    in the same transaction, so once a write has returned every worker sees
+    the new versions; a hit is served only while its versions are current.
+    That costs one primary-key lookup per hit, far less than any cached view.
+
+    write() also sends a NOTIFY (delivered on commit) and a listener thread
+    in each worker drops the entries other workers' writes made stale, so
+    dead views don't take up the cache until they are next read. While the
+    listener is not connected, get() bypasses the cache and everything
+    cached is dropped on reconnect.
+    """
+
+    def __init__(self, engine, max_entries: int = VIEW_CACHE_SIZE):
+        self.engine = engine
+        self.max_entries = max_entries
+        self.origin = uuid.uuid4().hex[:12]
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.invalidations = 0
+        self.notifications = 0
+        self.listening = False
+        self.last_error: Optional[str] = None
+
+        self._entries: Dict[Hashable, Tuple[Any, frozenset, Dict[str, int]]] = {}
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0  # bumped by clear()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------- reads ----------
+    def versions(self, topics: Iterable[str]) -> Dict[str, int]:
+        """Committed versions of `topics`; 0 for one never written."""
+        topics = sorted(topics)
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                text("SELECT topic, version FROM view_versions WHERE topic = ANY(:topics)"), {"topics": topics}
+            ).all()
+        found = dict(rows)
+        return {t: found.get(t, 0) for t in topics}
+
+    def get(self, topics: Iterable[str], key: Hashable, compute: Callable[[], Any]) -> Any:
+        topics = frozenset(topics)
+        if not self.listening:
+            self.bypassed += 1
+            return compute()
+        # Read before computing: a write committed in between makes the entry
+        # look stale on its next hit, never the other way round
+        versions = self.versions(topics)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] == versions:
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                # Written by another worker whose NOTIFY has not arrived yet
+                del self._entries[key]
+            self.misses += 1
+            generations = {t: self._generations.get(t, 0) for t in topics}
+            epoch = self._epoch
+
+        value = compute()
+
+        with self._lock:
+            # Only keep the result if nothing it depends on changed while it was computed
+            unchanged = epoch == self._epoch and all(self._generations.get(t, 0) == g for t, g in generations.items())
+            if self.listening and unchanged:
+                if len(self._entries) >= self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+                self._entries[key] = (value, topics, versions)
+        return value
+
+    # ---------- writes ----------
+    @contextmanager
+    def write(self, *topics: str):
+        """engine.begin() that makes every worker's cached views of `topics` stale on commit."""
+        with self.engine.begin() as conn:
+            # Writers take turns, so change_seq values (see sync.py) commit in increasing
+            # order and a sync token never skips a row that was still uncommitted
+            conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": WRITE_LOCK_KEY})
+            yield conn
+            conn.execute(
+                text(
+                    """
+                    INSERT INTO view_versions (topic, version)
+                    SELECT t, 1 FROM unnest(CAST(:topics AS TEXT[])) AS t
+                    ON CONFLICT (topic) DO UPDATE SET version = view_versions.version + 1
+                    """
+                ),
+                {"topics": sorted(topics)},
+            )
+            conn.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": CHANNEL, "payload": json.dumps({"origin": self.origin, "topics": list(topics)})},
+            )
+        self.invalidate(*topics)
+
+    def invalidate(self, *topics: str) -> None:
+        with self._lock:
+            self.invalidations += 1
+            for t in topics:
+                self._generations[t] = self._generations.get(t, 0) + 1
+            dropped = [k for k, (_, deps, _) in self._entries.items() if deps.intersection(topics)]
+            for k in dropped:
+                del self._entries[k]
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += 1
+            self._epoch += 1
+            self._entries.clear()
+
+    # ---------- listener ----------
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, name="view-cache-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _listen(self) -> None:
+        while not self._stop.is_set():
+            raw = None
+            try:
+                # A dedicated connection, taken out of the pool for good
+                raw = self.engine.raw_connection()
+                pg = raw.driver_connection
+                raw.detach()
+                pg.autocommit = True
+                with pg.cursor() as cur:
+                    cur.execute(f"LISTEN {CHANNEL}")
+                # Anything may have changed while nobody was listening
+                self.clear()
+                self.listening = True
+                self.last_error = None
+                idle = 0.0
+                while not self._stop.is_set():
+                    if select.select([pg], [], [], 1.0) == ([], [], []):
+                        idle += 1.0
+                        if idle >= LISTEN_PING_SECONDS:
+                            idle = 0.0
+                            with pg.cursor() as cur:
+                                cur.execute("SELECT 1")
+                        continue
+                    idle = 0.0
+                    pg.poll()
+                    while pg.notifies:
+                        self._handle(pg.notifies.pop(0).payload)
+            except Exception as e:
+                self.last_error = repr(e)
+            finally:
+                self.listening = False
+                if raw is not None:
+                    try:
+                        raw.close()
+                    except Exception:
+                        pass
+            self._stop.wait(LISTEN_RECONNECT_SECONDS)
+
+    def _handle(self, payload: str) -> None:
+        self.notifications += 1
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            self.clear()
+            return
+        if data.get("origin") == self.origin:
+            return  # already dropped locally right after the commit
+        self.invalidate(*data.get("topics", []))
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = len(self._entries)
+        return {
+            "pid": os.getpid(),
+            "listening": self.listening,
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "invalidations": self.invalidations,
+            "notifications": self.notifications,
+            "last_error": self.last_error,
+        }